@@ -1,12 +1,17 @@
 """Authentication helper functions."""
 
 import jwt
-import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from fastapi import HTTPException, Depends, Header
+from fastapi import HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
+from typing import Any, Dict, Optional
 from config import config
+from services.pubsub import pubsub, user_channel
 
 security = HTTPBearer(auto_error=False)  # Don't auto-raise error, we'll handle it
 SECRET_KEY = config.SECRET_KEY
@@ -16,8 +21,92 @@ ALGORITHM = "HS256"
 BYPASS_AUTH = False  # Set to False to enable authentication
 
 
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user behind a request"""
+    user_id: int
+    username: str
+    expires_at: float
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens -> Principal, each kept until its exp
+
+    A token string that decoded and verified once maps to the same claims
+    until it expires, so repeat requests skip the signature check. Revoking a
+    user's tokens (forget_user) reaches every API worker over pub/sub.
+    """
+
+    def __init__(self, max_tokens: int = config.AUTH_TOKEN_CACHE_SIZE):
+        self.max_tokens = max_tokens
+        self._principals: "OrderedDict[str, Principal]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            principal = self._principals.get(token)
+            if principal is None:
+                self.misses += 1
+                return None
+            if time.time() >= principal.expires_at:
+                del self._principals[token]
+                self.misses += 1
+                return None
+            self._principals.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal):
+        self._ensure_subscribed()
+        with self._lock:
+            self._principals[token] = principal
+            self._principals.move_to_end(token)
+            if len(self._principals) > self.max_tokens:
+                self._principals.popitem(last=False)
+
+    def forget_user(self, user_id: int):
+        """Drop every cached token of a user here and on every other API worker (e.g. the account was deleted)"""
+        self._drop(user_id)
+        pubsub.publish(user_channel(user_id), {"type": "revoke"})
+
+    def _drop(self, user_id: int):
+        with self._lock:
+            for token in [t for t, p in self._principals.items() if p.user_id == user_id]:
+                del self._principals[token]
+
+    def _ensure_subscribed(self):
+        if not self._subscribed:
+            self._subscribed = True
+            pubsub.subscribe(self._on_message)
+
+    def _on_message(self, channel: str, message: Dict[str, Any]):
+        if channel.startswith("user:") and message.get("type") == "revoke":
+            self._drop(int(channel[5:]))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "tokens": len(self._principals),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+token_cache = TokenCache()
+
+
 def create_access_token(data: dict) -> str:
-    """Create a JWT access token (valid for 24 hours)."""
+    """
+    Create a JWT access token (valid for 24 hours).
+
+    data should carry "sub" (username) and "user_id" so requests never need
+    to look the user up.
+    """
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=24)
     to_encode.update({"exp": expire})
@@ -25,54 +114,67 @@ def create_access_token(data: dict) -> str:
     return encoded_jwt
 
 
-def verify_token(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    authorization: Optional[str] = Header(None)
-) -> str:
-    """Verify and decode JWT token from request."""
-    print(f"AUTH: verify_token called", flush=True)
-    import sys
-    sys.stdout.flush()
-    # Development bypass - return a default username
-    if BYPASS_AUTH:
-        # Check if it's the dev bypass token in the credentials
-        if credentials and credentials.credentials == "dev-bypass-token":
-            return "dev_user"  # Return a default username for bypass mode
-        # Check if it's the dev bypass token in the authorization header
-        if authorization and authorization.startswith("Bearer dev-bypass-token"):
-            return "dev_user"  # Return a default username for bypass mode
-        # If no token provided, still allow access in bypass mode
-        if not credentials:
-            return "dev_user"
-    
-    # Normal authentication flow
-    if not credentials:
-        print(f"AUTH: No credentials provided", flush=True)
-        sys.stdout.flush()
-        raise HTTPException(status_code=401, detail="Authentication required")
-    
+def decode_token(token: str) -> Principal:
+    """
+    Verify a JWT and return its Principal, from the token cache when possible
+
+    Raises:
+        HTTPException: 401 if the token is invalid, expired or its user is gone
+    """
+    return token_cache.get(token) or _verify(token)
+
+
+def _verify(token: str) -> Principal:
+    """
+    Decode a JWT that is not in the token cache and cache its Principal
+
+    Tokens issued before user_id was added to the claims are resolved by
+    username once and then cached like any other.
+    """
     try:
-        print(f"AUTH: Decoding token...", flush=True)
-        sys.stdout.flush()
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            print(f"AUTH: No username in token", flush=True)
-            sys.stdout.flush()
-            raise HTTPException(status_code=401, detail="Invalid token")
-        print(f"AUTH: Token valid, username: {username}", flush=True)
-        sys.stdout.flush()
-        return username
-    except jwt.PyJWTError as e:
-        print(f"AUTH: JWT error: {e}", flush=True)
-        sys.stdout.flush()
-        # In bypass mode, if token is invalid, still allow access
-        if BYPASS_AUTH:
-            return "dev_user"
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token has expired")
+    except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    username = payload.get("sub")
+    if username is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("user_id")
+    if user_id is None:
+        from services.context_service import context_service
+        user_id = context_service.get_user_id(username)
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+    principal = Principal(int(user_id), username, float(payload["exp"]))
+    token_cache.put(token, principal)
+    return principal
+
+
+async def get_current_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> Principal:
+    """
+    Authentication dependency: the Principal of the request's bearer token.
+
+    FastAPI resolves it once per request however many dependencies use it,
+    and it is kept on request.state.principal for middleware. A cached
+    token is checked on the event loop; anything else is verified in the
+    threadpool since legacy tokens may need a database lookup.
+    """
+    # Development bypass - act as a default user
+    if BYPASS_AUTH and (not credentials or credentials.credentials == "dev-bypass-token"):
+        from services.context_service import context_service
+        principal = Principal(context_service.get_user_id("dev_user") or 0, "dev_user", float("inf"))
+    elif not credentials:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    else:
+        token = credentials.credentials
+        principal = token_cache.get(token) or await run_in_threadpool(_verify, token)
 
-def hash_password(password: str) -> str:
-    """Hash a password using SHA-256."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    request.state.principal = principal
+    return principal
 
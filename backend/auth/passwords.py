@@ -0,0 +1,176 @@
+"""
+Password hashing for HomeNetAI
+Salted scrypt hashes computed in a bounded process pool, with rehash-on-login
+for legacy SHA-256 hashes and hashes made with older parameters
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from config import config
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class PasswordQueueFull(Exception):
+    """Raised when too many password hashes are already waiting for a worker"""
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt needs 128 * n * r * p bytes; leave headroom over OpenSSL's 32 MiB default
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p, dklen=KEY_BYTES)
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password: str, n: int = config.PASSWORD_SCRYPT_N,
+                  r: int = config.PASSWORD_SCRYPT_R, p: int = config.PASSWORD_SCRYPT_P) -> str:
+    """
+    Hash a password with a random salt (blocking, use password_hasher from async code)
+
+    Returns:
+        "scrypt$n$r$p$salt$key" with salt and key base64 encoded
+    """
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f"{SCHEME}${n}${r}${p}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password: str, stored_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password against a stored hash (blocking)
+
+    Args:
+        password: Plain-text password
+        stored_hash: An scrypt hash, or a legacy unsalted SHA-256 hex digest
+
+    Returns:
+        (matches, new_hash) where new_hash is set when the password matched a
+        legacy hash or one made with other parameters and should be stored
+    """
+    parts = (stored_hash or "").split("$")
+    if len(parts) == 6 and parts[0] == SCHEME:
+        try:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            salt, key = _unb64(parts[4]), _unb64(parts[5])
+        except ValueError:
+            return False, None
+        if not hmac.compare_digest(_scrypt(password, salt, n, r, p), key):
+            return False, None
+        if (n, r, p) != (config.PASSWORD_SCRYPT_N, config.PASSWORD_SCRYPT_R, config.PASSWORD_SCRYPT_P):
+            return True, hash_password(password)
+        return True, None
+
+    # Legacy hashes were hashlib.sha256(password).hexdigest()
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    if stored_hash and hmac.compare_digest(legacy, stored_hash):
+        return True, hash_password(password)
+    # Pay for a full scrypt anyway, so a wrong password doesn't reveal that the
+    # account still has a legacy hash by failing fast
+    _scrypt(password, bytes(SALT_BYTES), config.PASSWORD_SCRYPT_N, config.PASSWORD_SCRYPT_R, config.PASSWORD_SCRYPT_P)
+    return False, None
+
+
+# Verified when the username does not exist, so unknown users take as long as known ones
+_DUMMY_HASH = f"{SCHEME}${config.PASSWORD_SCRYPT_N}${config.PASSWORD_SCRYPT_R}${config.PASSWORD_SCRYPT_P}$" \
+              f"{_b64(bytes(SALT_BYTES))}${_b64(bytes(KEY_BYTES))}"
+
+
+class PasswordHasher:
+    """
+    Runs hash_password/verify_password in a process pool
+
+    scrypt is deliberately CPU and memory heavy, so it runs in
+    PASSWORD_HASH_WORKERS processes instead of on the event loop or in the
+    GIL-bound threadpool. At most PASSWORD_HASH_QUEUE calls may be queued or
+    running; beyond that PasswordQueueFull is raised so a login flood is shed
+    instead of queueing without limit.
+    """
+
+    def __init__(self, workers: int = config.PASSWORD_HASH_WORKERS,
+                 max_queue: int = config.PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        """Hash a new password"""
+        result = await self._run(hash_password, password)
+        self.hashed += 1
+        return result
+
+    async def verify(self, password: str, stored_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password against a stored hash (None for an unknown user)
+
+        Returns:
+            (matches, new_hash) - store new_hash when it is set
+        """
+        matches, new_hash = await self._run(verify_password, password, stored_hash or _DUMMY_HASH)
+        self.verified += 1
+        if stored_hash is None:
+            return False, None
+        if new_hash:
+            self.rehashed += 1
+        return matches, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise PasswordQueueFull("Too many sign-in attempts in progress, try again shortly")
+            self.pending += 1
+            if self._pool is None:
+                # spawn: the API process is threaded by now, and forking a threaded process is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            pool = self._pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+# Global password hasher
+password_hasher = PasswordHasher()
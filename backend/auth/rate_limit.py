@@ -0,0 +1,214 @@
+"""
+Login rate limiting for HomeNetAI
+Sliding-window attempt counters per username and per client IP, checked
+before a login touches the database or the password hasher
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+import psycopg2
+
+from config import config
+
+
+class LoginThrottled(Exception):
+    """Raised when a login attempt is over the limit; retry_after is in seconds"""
+
+    def __init__(self, retry_after: float, scope: str):
+        super().__init__("Too many login attempts, try again later")
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.scope = scope
+
+
+class MemoryStore:
+    """
+    Attempt timestamps per key in this process
+
+    Keys are kept in LRU order and the least recently used are dropped past
+    max_keys, so a spray of usernames cannot grow it without bound.
+    """
+
+    def __init__(self, max_keys: int = config.LOGIN_RATE_LIMIT_KEYS):
+        self.max_keys = max_keys
+        self._attempts: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: int) -> float:
+        """
+        Record an attempt unless key already has limit attempts in the last window seconds
+
+        Returns:
+            0 if the attempt was recorded, otherwise seconds until one expires
+        """
+        now = time.time()
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts is None:
+                attempts = self._attempts[key] = deque()
+            self._attempts.move_to_end(key)
+            while attempts and attempts[0] <= now - window:
+                attempts.popleft()
+            if len(attempts) >= limit:
+                return attempts[0] + window - now if attempts else float(window)
+            attempts.append(now)
+            if len(self._attempts) > self.max_keys:
+                self._attempts.popitem(last=False)
+            return 0.0
+
+    def reset(self, key: str):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._attempts)
+
+
+class PostgresStore:
+    """
+    Attempt timestamps in the login_attempts table, shared by every API worker
+
+    Each hit takes a transaction-scoped advisory lock on its key so concurrent
+    workers cannot both slip under the limit. Rows past the window are pruned
+    for the key on every hit and for all keys every PRUNE_EVERY hits.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, connection_string: str = None):
+        self.connection_string = connection_string or config.DATABASE_URL
+        self._hits = 0
+
+    def hit(self, key: str, limit: int, window: int) -> float:
+        conn = psycopg2.connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (key,))
+            cursor.execute("""
+                DELETE FROM login_attempts
+                WHERE key = %s AND attempted_at <= clock_timestamp() - make_interval(secs => %s)
+            """, (key, window))
+            cursor.execute("""
+                SELECT COUNT(*), EXTRACT(EPOCH FROM MIN(attempted_at) + make_interval(secs => %s) - clock_timestamp())
+                FROM login_attempts WHERE key = %s
+            """, (window, key))
+            count, retry_after = cursor.fetchone()
+            if count >= limit:
+                conn.commit()
+                return float(retry_after) if retry_after is not None else float(window)
+            cursor.execute("INSERT INTO login_attempts (key, attempted_at) VALUES (%s, clock_timestamp())", (key,))
+
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                cursor.execute("""
+                    DELETE FROM login_attempts
+                    WHERE attempted_at <= clock_timestamp() - make_interval(secs => %s)
+                """, (config.LOGIN_RATE_LIMIT_WINDOW_SECONDS,))
+            conn.commit()
+            cursor.close()
+            return 0.0
+        finally:
+            conn.close()
+
+    def reset(self, key: str):
+        conn = psycopg2.connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM login_attempts WHERE key = %s", (key,))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class LoginRateLimiter:
+    """
+    Sliding-window limits on login attempts
+
+    Every attempt counts against its client IP (LOGIN_RATE_LIMIT_PER_IP) and
+    its username (LOGIN_RATE_LIMIT_PER_USERNAME) over the last
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS. A successful login clears the username's
+    count so normal use never accumulates; the IP count only ages out.
+    An attempt is not recorded against the limit that rejected it, so a
+    blocked client is let back in as soon as its oldest attempt leaves the
+    window.
+    """
+
+    STORES = {"memory": MemoryStore, "postgres": PostgresStore}
+
+    def __init__(self, store=None,
+                 per_username: int = config.LOGIN_RATE_LIMIT_PER_USERNAME,
+                 per_ip: int = config.LOGIN_RATE_LIMIT_PER_IP,
+                 window: int = config.LOGIN_RATE_LIMIT_WINDOW_SECONDS):
+        if store is None:
+            if config.LOGIN_RATE_LIMIT_BACKEND not in self.STORES:
+                raise ValueError(f"Unknown LOGIN_RATE_LIMIT_BACKEND: {config.LOGIN_RATE_LIMIT_BACKEND}")
+            store = self.STORES[config.LOGIN_RATE_LIMIT_BACKEND]()
+        self.store = store
+        self.per_username = per_username
+        self.per_ip = per_ip
+        self.window = window
+        self.allowed = 0
+        self.rejected_ip = 0
+        self.rejected_username = 0
+        self.errors = 0
+
+    def check(self, username: str, client_ip: Optional[str]):
+        """
+        Count a login attempt
+
+        Raises:
+            LoginThrottled: if the client IP or the username is over its limit
+        """
+        try:
+            retry_after = self.store.hit(self._ip_key(client_ip), self.per_ip, self.window)
+            if retry_after > 0:
+                self.rejected_ip += 1
+                raise LoginThrottled(retry_after, "ip")
+            retry_after = self.store.hit(self._username_key(username), self.per_username, self.window)
+            if retry_after > 0:
+                self.rejected_username += 1
+                raise LoginThrottled(retry_after, "username")
+        except LoginThrottled:
+            raise
+        except Exception as e:
+            # A broken shared store must not lock everyone out
+            self.errors += 1
+            print(f"Login rate limit store error: {e}")
+        self.allowed += 1
+
+    def succeeded(self, username: str):
+        """Clear the username's attempts after a successful login"""
+        try:
+            self.store.reset(self._username_key(username))
+        except Exception as e:
+            self.errors += 1
+            print(f"Login rate limit store error: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": type(self.store).__name__,
+            "keys": self.store.size(),
+            "allowed": self.allowed,
+            "rejected_ip": self.rejected_ip,
+            "rejected_username": self.rejected_username,
+            "errors": self.errors,
+        }
+
+    @staticmethod
+    def _username_key(username: str) -> str:
+        return f"login:user:{username.strip().lower()}"
+
+    @staticmethod
+    def _ip_key(client_ip: Optional[str]) -> str:
+        return f"login:ip:{client_ip or 'unknown'}"
+
+
+# Global login rate limiter
+login_limiter = LoginRateLimiter()
@@ -0,0 +1,353 @@
+"""
+Forecast Backtest and Benchmark
+Rolling-origin accuracy (MAE/RMSE), per-call latency and memory for the
+analytics forecasters, with optional regression gating
+
+Usage:
+    python benchmarks/backtest_forecasts.py                       # offline, in-memory histories
+    python benchmarks/backtest_forecasts.py --backend postgres    # seed and read a local Postgres
+    python benchmarks/backtest_forecasts.py --output results.json
+    python benchmarks/backtest_forecasts.py --baseline results.json --tolerance 0.1
+
+The in-memory backend needs no database: histories come straight from the
+synthetic generator in seed_weather_data.py. The postgres backend seeds a
+temporary user, reads the histories back with the production dedupe query,
+times AnalyticsService.get_trends/get_forecast end to end, and cleans up.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# Add backend and parent directories to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+from seed_weather_data import generate_hourly_history, insert_history
+from services.forecast_models import SeasonalForecaster, fit_linear_trend
+
+BENCH_USER = "bench_forecast_backtest"
+METRICS = ["temperature", "humidity", "precipitation", "wind_speed"]
+MODELS = ["seasonal", "linear", "persistence"]
+
+
+# ---- history sources ---------------------------------------------------
+
+def memory_histories(n_locations: int, days: int, seed: int) -> Dict[int, Dict[str, np.ndarray]]:
+    """Generate histories in memory, keyed by a synthetic location id"""
+    end = datetime.now()
+    histories = {}
+    for i in range(n_locations):
+        history = generate_hourly_history(25 + 40 * i / max(n_locations - 1, 1), end, days * 24, seed + i)
+        histories[i + 1] = {
+            "epoch_hours": history["timestamp"].astype(np.int64),
+            **{m: history[m].astype(float) for m in METRICS}
+        }
+    return histories
+
+
+def postgres_histories(cursor, n_locations: int, days: int, seed: int) -> Dict[int, Dict[str, np.ndarray]]:
+    """Seed a benchmark user in Postgres and read the histories back"""
+    cleanup(cursor)
+    cursor.execute("""
+        INSERT INTO users (username, email, password_hash)
+        VALUES (%s, %s, 'x') RETURNING id
+    """, (BENCH_USER, f"{BENCH_USER}@example.com"))
+    user_id = cursor.fetchone()[0]
+
+    end = datetime.now()
+    location_ids = []
+    for i in range(n_locations):
+        latitude = 25 + 40 * i / max(n_locations - 1, 1)
+        cursor.execute("""
+            INSERT INTO user_locations (user_id, name, latitude, longitude)
+            VALUES (%s, %s, %s, -100) RETURNING id
+        """, (user_id, f"Backtest {i}", latitude))
+        location_id = cursor.fetchone()[0]
+        insert_history(cursor, location_id, generate_hourly_history(latitude, end, days * 24, seed + i))
+        location_ids.append(location_id)
+
+    histories = {}
+    for location_id in location_ids:
+        cursor.execute("""
+            SELECT DISTINCT ON (timestamp) (EXTRACT(EPOCH FROM timestamp) / 3600)::bigint,
+                   temperature::float8, humidity::float8, precipitation::float8, wind_speed::float8
+            FROM weather_data
+            WHERE location_id = %s
+            ORDER BY timestamp, created_at DESC
+        """, (location_id,))
+        data = np.array(cursor.fetchall(), dtype=float)
+        histories[location_id] = {
+            "epoch_hours": data[:, 0].astype(np.int64),
+            **{m: data[:, i + 1] for i, m in enumerate(METRICS)}
+        }
+    return histories
+
+
+def cleanup(cursor):
+    """Remove the benchmark user, its locations and their weather rows"""
+    cursor.execute("""
+        DELETE FROM weather_data WHERE location_id IN (
+            SELECT l.id FROM user_locations l JOIN users u ON u.id = l.user_id
+            WHERE u.username = %s
+        )
+    """, (BENCH_USER,))
+    cursor.execute("DELETE FROM users WHERE username = %s", (BENCH_USER,))
+
+
+# ---- backtest ----------------------------------------------------------
+
+class Timer:
+    """Collects per-call wall times by name"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def time(self, name: str, fn: Callable, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.samples.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "calls": len(values),
+                "mean_us": float(np.mean(values) * 1e6),
+                "p95_us": float(np.percentile(values, 95) * 1e6),
+            }
+            for name, values in self.samples.items()
+        }
+
+
+def backtest_location(history: Dict[str, np.ndarray], train_days: int, trend_days: int,
+                      horizon: int, origins: int, step: int, timer: Timer) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Rolling-origin backtest for one location
+
+    The first origin leaves `origins * step + horizon` hours for evaluation. At
+    every origin each model sees only data before it and predicts `horizon`
+    hours; the seasonal model is fit once and then updated incrementally, as it
+    is in production.
+
+    Returns:
+        errors[model][metric] -> array of (origins, horizon) forecast errors
+    """
+    epoch_hours = history["epoch_hours"]
+    n = len(epoch_hours)
+    first_origin = n - origins * step - horizon
+    if first_origin < train_days * 24:
+        raise ValueError("History too short for the requested training window and origins")
+
+    errors = {model: {m: np.full((origins, horizon), np.nan) for m in METRICS} for model in MODELS}
+    seasonal = {}
+
+    for k in range(origins):
+        origin = first_origin + k * step
+        target_hours = epoch_hours[origin:origin + horizon]
+
+        for metric in METRICS:
+            values = history[metric]
+            actual = values[origin:origin + horizon]
+
+            # Seasonal model: full fit at the first origin, incremental after that
+            if metric not in seasonal:
+                seasonal[metric] = timer.time(
+                    "seasonal.fit", SeasonalForecaster(metric).fit,
+                    epoch_hours[origin - train_days * 24:origin], values[origin - train_days * 24:origin]
+                )
+            else:
+                timer.time("seasonal.update", seasonal[metric].update,
+                           epoch_hours[origin - step:origin], values[origin - step:origin])
+            predicted = timer.time("seasonal.predict", seasonal[metric].predict, int(target_hours[0]), horizon)
+            errors["seasonal"][metric][k] = predicted - actual
+
+            # Linear trend over the last trend_days, as get_forecast's fallback uses
+            window = slice(origin - trend_days * 24, origin)
+            hours = (epoch_hours[window] - epoch_hours[window][0]).astype(float)
+            fit = timer.time("linear.fit_predict", fit_linear_trend,
+                             hours, values[window], horizon)
+            errors["linear"][metric][k] = fit["predictions"] - actual
+
+            errors["persistence"][metric][k] = values[origin - 1] - actual
+
+    return errors
+
+
+def measure_memory(history: Dict[str, np.ndarray], train_days: int, trend_days: int, horizon: int) -> Dict[str, float]:
+    """Peak traced allocation (KiB) of one fit + predict per model"""
+    end = len(history["epoch_hours"])
+    epoch_hours = history["epoch_hours"]
+    values = history["temperature"]
+    calls = {
+        "seasonal": lambda: SeasonalForecaster("temperature").fit(
+            epoch_hours[end - train_days * 24:], values[end - train_days * 24:]
+        ).predict(int(epoch_hours[-1]) + 1, horizon),
+        "linear": lambda: fit_linear_trend(
+            np.arange(trend_days * 24, dtype=float), values[end - trend_days * 24:], horizon
+        ),
+    }
+
+    peaks = {}
+    for name, call in calls.items():
+        tracemalloc.start()
+        call()
+        peaks[name] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return peaks
+
+
+def summarize(all_errors: List[Dict[str, Dict[str, np.ndarray]]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """MAE/RMSE per model and metric, overall and at the final horizon step"""
+    accuracy = {}
+    for model in MODELS:
+        accuracy[model] = {}
+        for metric in METRICS:
+            errors = np.concatenate([e[model][metric] for e in all_errors])
+            accuracy[model][metric] = {
+                "mae": float(np.nanmean(np.abs(errors))),
+                "rmse": float(np.sqrt(np.nanmean(errors ** 2))),
+                "mae_last_step": float(np.nanmean(np.abs(errors[:, -1]))),
+            }
+    return accuracy
+
+
+def time_service(location_ids: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    """End-to-end AnalyticsService latency against Postgres"""
+    from services.analytics_service import analytics_service
+    from services.forecasting_service import forecasting_service
+
+    timer = Timer()
+    for _ in range(repeat):
+        for location_id in location_ids:
+            timer.time("service.get_trends", analytics_service.get_trends, location_id, "temperature", 7)
+            timer.time("service.get_forecast_linear", analytics_service.get_forecast, location_id, 24)
+
+    timer.time("service.train", forecasting_service.train_all, True, location_ids)
+    for _ in range(repeat):
+        for location_id in location_ids:
+            timer.time("service.get_forecast_seasonal", analytics_service.get_forecast, location_id, 24)
+    forecasting_service.shutdown()
+    return timer.summary()
+
+
+# ---- gating ------------------------------------------------------------
+
+def compare(results: Dict, baseline: Dict, tolerance: float, latency_tolerance: float) -> List[str]:
+    """List regressions of MAE or p95 latency beyond the tolerances"""
+    failures = []
+    for model, metrics in results["accuracy"].items():
+        for metric, scores in metrics.items():
+            reference = baseline.get("accuracy", {}).get(model, {}).get(metric)
+            if reference and scores["mae"] > reference["mae"] * (1 + tolerance):
+                failures.append(f"{model}/{metric} MAE {scores['mae']:.3f} > baseline {reference['mae']:.3f}")
+
+    for name, stats in results["latency"].items():
+        reference = baseline.get("latency", {}).get(name)
+        if reference and stats["p95_us"] > reference["p95_us"] * (1 + latency_tolerance):
+            failures.append(f"{name} p95 {stats['p95_us']:.0f}us > baseline {reference['p95_us']:.0f}us")
+    return failures
+
+
+def print_report(results: Dict):
+    print(f"\nAccuracy ({results['config']['locations']} locations x {results['config']['origins']} origins, "
+          f"{results['config']['horizon']}h horizon)")
+    print(f"{'model':<12} {'metric':<14} {'MAE':>8} {'RMSE':>8} {'MAE@h':>8}")
+    for model, metrics in results["accuracy"].items():
+        for metric, scores in metrics.items():
+            print(f"{model:<12} {metric:<14} {scores['mae']:>8.3f} {scores['rmse']:>8.3f} {scores['mae_last_step']:>8.3f}")
+
+    print(f"\n{'call':<34} {'calls':>6} {'mean us':>10} {'p95 us':>10}")
+    for name, stats in results["latency"].items():
+        print(f"{name:<34} {stats['calls']:>6} {stats['mean_us']:>10.1f} {stats['p95_us']:>10.1f}")
+
+    print("\nPeak memory per fit+predict: " +
+          ", ".join(f"{name} {kib:.1f} KiB" for name, kib in results["memory_kib"].items()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Backtest and benchmark analytics forecasts")
+    parser.add_argument("--backend", choices=["memory", "postgres"], default="memory")
+    parser.add_argument("--locations", type=int, default=5)
+    parser.add_argument("--days", type=int, default=120, help="Days of synthetic history per location")
+    parser.add_argument("--train-days", type=int, default=90)
+    parser.add_argument("--trend-days", type=int, default=7)
+    parser.add_argument("--horizon", type=int, default=24)
+    parser.add_argument("--origins", type=int, default=28)
+    parser.add_argument("--step", type=int, default=24, help="Hours between forecast origins")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Service call repetitions (postgres only)")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Fail if results regress against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative MAE increase")
+    parser.add_argument("--latency-tolerance", type=float, default=0.50, help="Allowed relative p95 increase")
+    args = parser.parse_args()
+
+    conn = None
+    cursor = None
+    try:
+        if args.backend == "postgres":
+            import psycopg2
+            from config import config
+            conn = psycopg2.connect(config.DATABASE_URL)
+            cursor = conn.cursor()
+            histories = postgres_histories(cursor, args.locations, args.days, args.seed)
+            conn.commit()
+        else:
+            histories = memory_histories(args.locations, args.days, args.seed)
+
+        timer = Timer()
+        all_errors = [
+            backtest_location(history, args.train_days, args.trend_days, args.horizon,
+                              args.origins, args.step, timer)
+            for history in histories.values()
+        ]
+        latency = timer.summary()
+        if args.backend == "postgres":
+            latency.update(time_service(list(histories), args.repeat))
+
+        results = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "generated_at": datetime.now().isoformat(),
+            "accuracy": summarize(all_errors),
+            "latency": latency,
+            "memory_kib": measure_memory(next(iter(histories.values())), args.train_days,
+                                         args.trend_days, args.horizon),
+        }
+        results["config"]["locations"] = len(histories)
+    finally:
+        if cursor:
+            cleanup(cursor)
+            conn.commit()
+            cursor.close()
+        if conn:
+            conn.close()
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance, args.latency_tolerance)
+        if failures:
+            print("\nRegressions:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Batch Analytics Benchmark
+Compares per-location summary/anomaly calls with one /analytics/batch style call
+
+Usage: python benchmarks/bench_analytics_batch.py [--days 30] [--repeat 3]
+Seeds a temporary user with synthetic hourly data and removes it afterwards.
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+# Add backend and parent directories to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+from config import config
+from services.analytics_service import analytics_service
+
+BENCH_USER = "bench_analytics_batch"
+LOCATION_COUNTS = (1, 10, 100)
+
+
+def cleanup(cursor):
+    """Remove the benchmark user, its locations and their weather rows"""
+    cursor.execute("""
+        DELETE FROM weather_data WHERE location_id IN (
+            SELECT l.id FROM user_locations l JOIN users u ON u.id = l.user_id
+            WHERE u.username = %s
+        )
+    """, (BENCH_USER,))
+    cursor.execute("DELETE FROM users WHERE username = %s", (BENCH_USER,))
+
+
+def seed(cursor, n_locations: int, days: int):
+    """Create the benchmark user with n_locations of hourly weather history"""
+    cleanup(cursor)
+    cursor.execute("""
+        INSERT INTO users (username, email, password_hash)
+        VALUES (%s, %s, 'x') RETURNING id
+    """, (BENCH_USER, f"{BENCH_USER}@example.com"))
+    user_id = cursor.fetchone()[0]
+
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    location_ids = []
+    for i in range(n_locations):
+        cursor.execute("""
+            INSERT INTO user_locations (user_id, name, latitude, longitude)
+            VALUES (%s, %s, %s, %s) RETURNING id
+        """, (user_id, f"Bench {i}", 40 + i * 0.01, -111 - i * 0.01))
+        location_id = cursor.fetchone()[0]
+        location_ids.append(location_id)
+
+        rows = []
+        for h in range(days * 24):
+            ts = now - timedelta(hours=h)
+            temp = 55 + 15 * math.sin((ts.hour - 9) * math.pi / 12) + random.gauss(0, 3)
+            rows.append((location_id, ts, round(temp, 2), round(random.uniform(20, 80), 2),
+                         round(max(0.0, random.gauss(0, 0.05)), 2), round(random.uniform(0, 20), 2),
+                         round(max(0.0, 8 * math.sin((ts.hour - 6) * math.pi / 12)), 2)))
+        execute_values(cursor, """
+            INSERT INTO weather_data (location_id, timestamp, temperature, humidity,
+                                      precipitation, wind_speed, uv_index)
+            VALUES %s
+        """, rows)
+    return user_id, location_ids
+
+
+def time_it(fn, repeat: int) -> float:
+    """Best wall time of fn over repeat runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(days: int, repeat: int):
+    conn = psycopg2.connect(config.DATABASE_URL)
+    cursor = conn.cursor()
+    try:
+        print(f"{'locations':>10} {'per-location ms':>16} {'batch ms':>10} {'speedup':>8}")
+        for n in LOCATION_COUNTS:
+            user_id, location_ids = seed(cursor, n, days)
+            conn.commit()
+
+            def per_location():
+                for location_id in location_ids:
+                    analytics_service.get_summary_statistics(location_id, days)
+                    analytics_service.get_anomalies(location_id, days)
+
+            def batch():
+                analytics_service.get_batch_analytics(user_id, location_ids, days)
+
+            loop_ms = time_it(per_location, repeat)
+            batch_ms = time_it(batch, repeat)
+            print(f"{n:>10} {loop_ms:>16.1f} {batch_ms:>10.1f} {loop_ms / batch_ms:>7.1f}x")
+    finally:
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch vs per-location analytics")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.days, args.repeat)
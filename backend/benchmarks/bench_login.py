@@ -0,0 +1,162 @@
+"""
+Login Throughput Benchmark
+Concurrent /auth/login requests with scrypt in the process pool vs on the event loop
+
+Usage: python benchmarks/bench_login.py [--users 20] [--logins 200] [--concurrency 16]
+Seeds temporary users (one legacy SHA-256 hash to check rehash-on-login) and
+removes them afterwards. While the logins run, /health is polled to show how
+long the event loop is blocked: with inline hashing every other request waits
+behind the KDF, with the pool it stays responsive. The throttled row is the
+same burst over the login rate limit: rejected before any database or hash work.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import psycopg2
+
+# Add backend and parent directories to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+from config import config
+from auth.passwords import PasswordHasher, hash_password, password_hasher
+from auth.rate_limit import LoginRateLimiter, MemoryStore
+from routes import auth as auth_routes
+
+BENCH_PREFIX = "bench_login_"
+PASSWORD = "correct horse battery staple"
+
+
+class InlineHasher(PasswordHasher):
+    """The naive alternative: run the KDF directly on the event loop"""
+
+    async def _run(self, fn, *args):
+        return fn(*args)
+
+
+def cleanup(cursor):
+    cursor.execute("DELETE FROM users WHERE username LIKE %s", (BENCH_PREFIX + "%",))
+
+
+def seed(cursor, n_users: int):
+    """Create n_users sharing one scrypt hash, plus one with a legacy SHA-256 hash"""
+    cleanup(cursor)
+    stored = hash_password(PASSWORD)
+    for i in range(n_users):
+        cursor.execute("""
+            INSERT INTO users (username, email, password_hash)
+            VALUES (%s, %s, %s)
+        """, (f"{BENCH_PREFIX}{i}", f"{BENCH_PREFIX}{i}@example.com", stored))
+    cursor.execute("""
+        INSERT INTO users (username, email, password_hash)
+        VALUES (%s, %s, %s)
+    """, (f"{BENCH_PREFIX}legacy", f"{BENCH_PREFIX}legacy@example.com",
+          hashlib.sha256(PASSWORD.encode()).hexdigest()))
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def burst(n_users: int, n_logins: int, concurrency: int, expected: int = 200) -> dict:
+    """Fire n_logins logins, concurrency at a time, while polling /health"""
+    from main import app
+    transport = httpx.ASGITransport(app=app)
+    login_times, health_times = [], []
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def login(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/auth/login", json={
+                    "username": f"{BENCH_PREFIX}{i % n_users}", "password": PASSWORD
+                })
+                login_times.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == expected, response.text
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health_times.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(n_logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    return {
+        "rate": n_logins / elapsed,
+        "p50": statistics.median(login_times),
+        "p95": percentile(login_times, 0.95),
+        "health_p95": percentile(health_times, 0.95),
+        "health_max": max(health_times) if health_times else 0.0,
+    }
+
+
+async def burst_legacy():
+    """Log in the legacy user once so its hash is upgraded"""
+    from main import app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        response = await client.post("/auth/login", json={"username": f"{BENCH_PREFIX}legacy", "password": PASSWORD})
+        assert response.status_code == 200, response.text
+
+
+def run(n_users: int, n_logins: int, concurrency: int):
+    start = time.perf_counter()
+    hash_password(PASSWORD)
+    print(f"scrypt N={config.PASSWORD_SCRYPT_N} r={config.PASSWORD_SCRYPT_R} p={config.PASSWORD_SCRYPT_P}: "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms per hash, {config.PASSWORD_HASH_WORKERS} workers")
+
+    conn = psycopg2.connect(config.DATABASE_URL)
+    cursor = conn.cursor()
+    try:
+        seed(cursor, n_users)
+        conn.commit()
+
+        # Every benchmark login comes from one client, so lift the limits for the timed runs
+        unlimited = n_logins + 1
+
+        print(f"\n{'hashing':>9} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'/health p95':>12} {'/health max':>12}")
+        for name, hasher, limit, expected in (("inline", InlineHasher(), unlimited, 200),
+                                              ("pool", password_hasher, unlimited, 200),
+                                              ("throttled", password_hasher, 0, 429)):
+            auth_routes.password_hasher = hasher
+            auth_routes.login_limiter = LoginRateLimiter(store=MemoryStore(), per_username=limit, per_ip=limit)
+            result = asyncio.run(burst(n_users, n_logins, concurrency, expected))
+            print(f"{name:>9} {result['rate']:>9.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+                  f"{result['health_p95']:>12.1f} {result['health_max']:>12.1f}")
+
+        auth_routes.login_limiter = LoginRateLimiter(store=MemoryStore(), per_username=1, per_ip=1)
+        asyncio.run(burst_legacy())
+        cursor.execute("SELECT password_hash FROM users WHERE username = %s", (f"{BENCH_PREFIX}legacy",))
+        print(f"\nlegacy hash after login: {cursor.fetchone()[0].split('$')[0]}")
+    finally:
+        password_hasher.shutdown()
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark login throughput with the password process pool")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    run(args.users, args.logins, args.concurrency)
@@ -0,0 +1,129 @@
+"""
+Metrics Benchmark
+Cost of recording a metric, of rendering /metrics, and of the route latency
+histogram on every request
+
+Usage: python benchmarks/bench_metrics.py [--ops 200000] [--requests 5000] [--routes 50]
+The "primitives" rows time single calls in a tight loop. "render" fills
+--routes route series and times a full scrape. The "request" rows drive a
+one-route app through RequestLogMiddleware (logging sampled at 1%, as on
+/health) with the route histogram switched off and on.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add backend and parent directories to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+from fastapi import FastAPI
+
+from observability import metrics, request_log
+from observability.request_log import RequestLogMiddleware, setup_logging
+from benchmarks.bench_request_logging import call
+
+
+class _NoHistogram:
+    """Stands in for http_request_seconds to time requests without it"""
+
+    def labels(self, *values):
+        return self
+
+    def observe(self, value):
+        pass
+
+
+def per_op(fn, n_ops: int) -> float:
+    """Mean microseconds per call of fn"""
+    start = time.perf_counter()
+    for _ in range(n_ops):
+        fn()
+    return (time.perf_counter() - start) / n_ops * 1e6
+
+
+def primitives(n_ops: int):
+    counter = metrics.Counter("bench_ops_total", "Benchmark counter", ("kind",))
+    histogram = metrics.Histogram("bench_op_seconds", "Benchmark histogram", ("kind",))
+    child = histogram.labels("child")
+
+    def upstream():
+        with metrics.upstream_call("bench"):
+            pass
+
+    rows = {
+        "counter.labels().inc()": lambda: counter.labels("a").inc(),
+        "histogram.observe() (child)": lambda: child.observe(0.042),
+        "histogram.labels().observe()": lambda: histogram.labels("a").observe(0.042),
+        "upstream_call block": upstream,
+    }
+    print(f"{'primitive':>30} {'us/op':>8}")
+    for name, fn in rows.items():
+        print(f"{name:>30} {per_op(fn, n_ops):>8.3f}")
+
+
+def render(n_routes: int):
+    for i in range(n_routes):
+        for status in ("2xx", "4xx"):
+            metrics.http_request_seconds.labels("GET", f"/bench/{i}", status).observe(0.01 * (i % 7))
+    times = []
+    for _ in range(50):
+        start = time.perf_counter()
+        body = metrics.render()
+        times.append((time.perf_counter() - start) * 1000)
+    print(f"\nrender: {len(body.splitlines())} lines, {len(body) / 1024:.0f} KiB, "
+          f"{statistics.median(times):.2f} ms per scrape")
+
+
+async def measure(app, n_requests: int) -> float:
+    for _ in range(100):
+        await call(app)
+    times = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        await call(app)
+        times.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(times)
+
+
+def requests(n_requests: int):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(RequestLogMiddleware, sample_rate=0.01, sample_rates="")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = open(os.path.join(tmp, "bench.log"), "w")
+        setup_logging(stream=sink)
+        histogram = request_log.http_request_seconds
+        try:
+            request_log.http_request_seconds = _NoHistogram()
+            without = asyncio.run(measure(app, n_requests))
+        finally:
+            request_log.http_request_seconds = histogram
+        with_metrics = asyncio.run(measure(app, n_requests))
+        sink.close()
+
+    print(f"\n{'request':>30} {'p50 us':>8}")
+    print(f"{'without route histogram':>30} {without:>8.1f}")
+    print(f"{'with route histogram':>30} {with_metrics:>8.1f}")
+    print(f"{'overhead':>30} {with_metrics - without:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark metrics overhead")
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--routes", type=int, default=50)
+    args = parser.parse_args()
+    primitives(args.ops)
+    render(args.routes)
+    requests(args.requests)
@@ -0,0 +1,132 @@
+"""
+Request Logging Benchmark
+Per-request overhead of the old print+flush middleware vs RequestLogMiddleware
+
+Usage: python benchmarks/bench_request_logging.py [--requests 5000] [--concurrency 50]
+Drives a one-route app with raw ASGI calls (no HTTP client or server in the
+way) and writes all log output to a temporary file. "print" is the previous
+main.py middleware; "json" logs every request through the queue; "sampled"
+keeps 1% of successful requests, as /health does by default.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from fastapi import FastAPI
+
+# Add backend and parent directories to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+from observability.request_log import RequestLogMiddleware, log_stats, setup_logging
+
+
+def make_app(variant: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if variant == "print":
+        @app.middleware("http")
+        async def log_requests(request, call_next):
+            import time
+            start_time = time.time()
+            print(f"REQUEST: {request.method} {request.url.path}", flush=True)
+            import sys
+            sys.stdout.flush()
+            response = await call_next(request)
+            process_time = time.time() - start_time
+            print(f"RESPONSE: {request.method} {request.url.path} - {response.status_code} - {process_time:.2f}s", flush=True)
+            sys.stdout.flush()
+            return response
+    elif variant == "json":
+        app.add_middleware(RequestLogMiddleware, sample_rate=1.0, sample_rates="")
+    elif variant == "sampled":
+        app.add_middleware(RequestLogMiddleware, sample_rate=0.01, sample_rates="")
+    return app
+
+
+async def call(app):
+    """One GET /ping straight through the ASGI interface"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/ping", "raw_path": b"/ping",
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    request = {"type": "http.request", "body": b"", "more_body": False}
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal request
+        if request:
+            message, request = request, None
+            return message
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+    assert done.is_set()
+
+
+async def measure(app, n_requests: int, concurrency: int) -> dict:
+    times = []
+    for _ in range(100):
+        await call(app)
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        await call(app)
+        times.append((time.perf_counter() - start) * 1e6)
+
+    start = time.perf_counter()
+    for _ in range(n_requests // concurrency):
+        await asyncio.gather(*(call(app) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    times.sort()
+    return {
+        "p50": statistics.median(times),
+        "p99": times[int(len(times) * 0.99)],
+        "rate": (n_requests // concurrency) * concurrency / elapsed,
+    }
+
+
+def run(n_requests: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = open(os.path.join(tmp, "bench.log"), "w")
+        setup_logging(stream=sink)
+        real_stdout = sys.stdout
+        results = {}
+        try:
+            sys.stdout = sink
+            for variant in ("none", "print", "json", "sampled"):
+                results[variant] = asyncio.run(measure(make_app(variant), n_requests, concurrency))
+        finally:
+            sys.stdout = real_stdout
+
+        baseline = results["none"]["p50"]
+        print(f"{'logging':>8} {'p50 us':>8} {'p99 us':>8} {'overhead us':>12} {'req/s':>8}")
+        for variant, result in results.items():
+            print(f"{variant:>8} {result['p50']:>8.1f} {result['p99']:>8.1f} "
+                  f"{result['p50'] - baseline:>12.1f} {result['rate']:>8.0f}")
+        print(f"\nqueue: {log_stats()}")
+        sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark request logging overhead")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    run(args.requests, args.concurrency)
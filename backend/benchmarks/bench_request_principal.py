@@ -0,0 +1,150 @@
+"""
+Request Principal Benchmark
+Compares resolving the user per query by username with the request-scoped
+principal (cached token -> user_id) on the hot list endpoints
+
+Usage: python benchmarks/bench_request_principal.py [--locations 10] [--devices 20] [--requests 500]
+Seeds a temporary user with locations and devices and removes it afterwards.
+The "per-query" column replays what each request used to do: decode the JWT,
+then run the list query joined to users on username. The "principal" column
+takes the cached Principal and queries by user_id. The "endpoint" rows time
+the real routes through the ASGI app.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import jwt
+import psycopg2
+
+# Add backend and parent directories to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+from config import config
+from auth.helpers import ALGORITHM, SECRET_KEY, create_access_token, decode_token
+from database.database import HomeNetDatabase
+
+BENCH_USER = "bench_request_principal"
+DEVICE_TYPES = ("thermostat", "light", "plug", "lock", "blind", "camera")
+db = HomeNetDatabase()
+
+# (name, query by username, query by user_id)
+QUERIES = (
+    ("locations",
+     """SELECT l.id, l.name, l.latitude, l.longitude, l.created_at
+        FROM user_locations l JOIN users u ON l.user_id = u.id
+        WHERE u.username = %s ORDER BY l.created_at DESC""",
+     """SELECT id, name, latitude, longitude, created_at
+        FROM user_locations WHERE user_id = %s ORDER BY created_at DESC"""),
+    ("devices",
+     """SELECT d.id, d.name, d.type, d.room, d.status, d.value
+        FROM devices d JOIN users u ON d.user_id = u.id
+        WHERE u.username = %s ORDER BY d.room, d.name""",
+     """SELECT id, name, type, room, status, value
+        FROM devices WHERE user_id = %s ORDER BY room, name"""),
+)
+
+
+def cleanup(cursor):
+    """Remove the benchmark user; locations and devices cascade"""
+    cursor.execute("DELETE FROM users WHERE username = %s", (BENCH_USER,))
+
+
+def seed(cursor, n_locations: int, n_devices: int) -> int:
+    """Create the benchmark user with n_locations locations and n_devices devices"""
+    cleanup(cursor)
+    cursor.execute("""
+        INSERT INTO users (username, email, password_hash)
+        VALUES (%s, %s, 'x') RETURNING id
+    """, (BENCH_USER, f"{BENCH_USER}@example.com"))
+    user_id = cursor.fetchone()[0]
+    for i in range(n_locations):
+        cursor.execute("""
+            INSERT INTO user_locations (user_id, name, latitude, longitude)
+            VALUES (%s, %s, %s, %s)
+        """, (user_id, f"Bench {i}", 40 + i * 0.01, -111 - i * 0.01))
+    for i in range(n_devices):
+        cursor.execute("""
+            INSERT INTO devices (user_id, name, type, room, status)
+            VALUES (%s, %s, %s, %s, 'off')
+        """, (user_id, f"Device {i}", DEVICE_TYPES[i % len(DEVICE_TYPES)], f"Room {i % 4}"))
+    return user_id
+
+
+def latencies(fn, n: int) -> list:
+    """Wall time of n calls of fn, in milliseconds"""
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summary(times: list) -> tuple:
+    times = sorted(times)
+    return statistics.median(times), times[min(len(times) - 1, int(len(times) * 0.95))]
+
+
+def run_query(sql: str, param):
+    """Run one query on a fresh connection, like a route handler does"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, (param,))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run(n_locations: int, n_devices: int, n_requests: int):
+    conn = psycopg2.connect(config.DATABASE_URL)
+    cursor = conn.cursor()
+    try:
+        user_id = seed(cursor, n_locations, n_devices)
+        conn.commit()
+        token = create_access_token({"sub": BENCH_USER, "user_id": user_id})
+        decode_token(token)
+
+        print(f"{'query':>10} {'per-query p50':>14} {'p95':>7} {'principal p50':>14} {'p95':>7} {'speedup':>8}")
+        for name, by_username, by_user_id in QUERIES:
+            def per_query():
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                run_query(by_username, payload["sub"])
+
+            def principal():
+                run_query(by_user_id, decode_token(token).user_id)
+
+            old_p50, old_p95 = summary(latencies(per_query, n_requests))
+            new_p50, new_p95 = summary(latencies(principal, n_requests))
+            print(f"{name:>10} {old_p50:>14.2f} {old_p95:>7.2f} {new_p50:>14.2f} {new_p95:>7.2f} "
+                  f"{old_p50 / new_p50:>7.2f}x")
+
+        from fastapi.testclient import TestClient
+        from main import app
+        client = TestClient(app)
+        headers = {"Authorization": f"Bearer {token}"}
+        print(f"\n{'endpoint':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for path in ("/locations", "/devices"):
+            client.get(path, headers=headers)
+            p50, p95 = summary(latencies(lambda: client.get(path, headers=headers), n_requests))
+            print(f"{path:>10} {p50:>8.2f} {p95:>8.2f}")
+    finally:
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark username lookups vs the request principal")
+    parser.add_argument("--locations", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    run(args.locations, args.devices, args.requests)
@@ -6,17 +6,12 @@ Creates an admin user in the database.
 import psycopg2
 import sys
 import os
-import hashlib
 from datetime import datetime, timezone
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from config import config
-
-
-def hash_password(password: str) -> str:
-    """Hash a password using SHA-256."""
-    return hashlib.sha256(password.encode()).hexdigest()
+from auth.passwords import hash_password
 
 
 def create_admin_user():
@@ -33,7 +33,7 @@ def clear_database():
         # Clear user_locations first (parent of weather_data and daily_weather)
         try:
             cursor.execute("TRUNCATE TABLE user_locations CASCADE")
-            print("  ✓ Cleared user_locations (and weather_data, daily_weather)")
+            print("  ✓ Cleared user_locations (and weather_data, weather_rollups, forecast_models, alerts, daily_weather)")
         except Exception as e:
             if "does not exist" not in str(e):
                 print(f"  ⚠ Warning: user_locations - {e}")
@@ -41,7 +41,7 @@ def clear_database():
         # Clear users (parent of user_locations and devices)
         try:
             cursor.execute("TRUNCATE TABLE users CASCADE")
-            print("  ✓ Cleared users (and devices, user_locations)")
+            print("  ✓ Cleared users (and devices, user_locations, user_preferences, conversations)")
         except Exception as e:
             if "does not exist" not in str(e):
                 print(f"  ⚠ Warning: users - {e}")
@@ -89,8 +89,14 @@ if __name__ == "__main__":
     print("   - users")
     print("   - user_locations")
     print("   - weather_data")
+    print("   - weather_rollups")
+    print("   - forecast_models")
+    print("   - alerts")
     print("   - daily_weather")
     print("   - devices")
+    print("   - user_preferences")
+    print("   - conversations")
+    print("   - conversation_messages")
     print()
     
     response = input("Are you sure you want to continue? (yes/no): ")
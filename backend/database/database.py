@@ -5,13 +5,31 @@ Handles all PostgreSQL database operations.
 
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
 import os
+import time
 from datetime import datetime
 from typing import List, Dict, Any
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from config import config
+from database import partitions
+from observability import metrics
+
+
+class TrackedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that reports how long it was held open when closed."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._opened_at = time.perf_counter()
+    
+    def close(self):
+        if not self.closed:
+            metrics.db_connections_closed.inc()
+            metrics.db_connection_held_seconds.observe(time.perf_counter() - self._opened_at)
+        super().close()
 
 
 class HomeNetDatabase:
@@ -40,6 +58,16 @@ class HomeNetDatabase:
             
             # Execute schema - PostgreSQL allows multiple statements
             cursor.execute(schema)
+            
+            # weather_data is partitioned by month; make sure the current window exists
+            if partitions.is_partitioned(cursor):
+                partitions.ensure_partitions(
+                    cursor,
+                    partitions.months_to_keep(config.WEATHER_RETENTION_DAYS),
+                    config.WEATHER_PARTITIONS_AHEAD
+                )
+            else:
+                print("weather_data is not partitioned - run database/migrate_weather_partitions.py")
             conn.commit()
             print(f"Database initialized successfully: {self.connection_string.split('@')[1] if '@' in self.connection_string else 'database'}")
         except psycopg2.OperationalError as e:
@@ -80,11 +108,75 @@ class HomeNetDatabase:
     # Connection Management
     def get_connection(self):
         """Get a new database connection."""
+        start = time.perf_counter()
         try:
-            return psycopg2.connect(self.connection_string)
+            conn = psycopg2.connect(self.connection_string, connection_factory=TrackedConnection)
         except psycopg2.OperationalError as e:
+            metrics.db_connect_errors.inc()
             print(f"Failed to connect to database: {e}")
             raise
+        metrics.db_connect_seconds.observe(time.perf_counter() - start)
+        metrics.db_connections_opened.inc()
+        return conn
+    
+    def execute_query(self, query: str, params: tuple = None, name: str = "unnamed") -> List[Dict]:
+        """Run one statement and commit, returning any result rows as dicts.
+        
+        The time taken, connection included, is recorded under name in
+        homenet_db_query_duration_seconds.
+        """
+        conn = None
+        cursor = None
+        start = time.perf_counter()
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(query, params)
+            rows = [dict(row) for row in cursor.fetchall()] if cursor.description else []
+            conn.commit()
+            return rows
+        except Exception:
+            metrics.db_query_errors.labels(name).inc()
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+            metrics.db_query_seconds.labels(name).observe(time.perf_counter() - start)
+    
+    # Partition Maintenance
+    @metrics.time_query("maintain_weather_partitions")
+    def maintain_weather_partitions(self) -> Dict[str, List[str]]:
+        """Create upcoming weather_data partitions, compact closed months and apply retention."""
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            if not partitions.is_partitioned(cursor):
+                return {}
+            
+            summary = partitions.maintain(
+                cursor,
+                config.WEATHER_RETENTION_DAYS,
+                config.WEATHER_PARTITIONS_AHEAD
+            )
+            conn.commit()
+            return summary
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            print(f"Error maintaining weather partitions: {e}")
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
     
     # Location Management
     def _get_or_create_location(self, cursor, location_name: str, latitude: float, 
@@ -107,13 +199,14 @@ class HomeNetDatabase:
             return cursor.fetchone()[0]
     
     # Weather Data Insertion
+    @metrics.time_query("insert_weather_data")
     def insert_weather_data(self, location_name: str, weather_data: Dict[str, Any], 
                            latitude: float, longitude: float, user_id: int):
         """Insert weather data for a user location."""
         conn = None
         cursor = None
         try:
-            conn = psycopg2.connect(self.connection_string)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             location_id = self._get_or_create_location(
@@ -210,12 +303,13 @@ class HomeNetDatabase:
             ))
     
     # Weather Data Retrieval
+    @metrics.time_query("get_weather_data")
     def get_weather_data(self, location_id: int, days: int = 7) -> List[Dict]:
         """Get recent weather data for a location."""
         conn = None
         cursor = None
         try:
-            conn = psycopg2.connect(self.connection_string)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -236,12 +330,13 @@ class HomeNetDatabase:
             if conn:
                 conn.close()
     
+    @metrics.time_query("get_daily_forecast")
     def get_daily_forecast(self, location_id: int) -> List[Dict]:
         """Get 7-day forecast for a location."""
         conn = None
         cursor = None
         try:
-            conn = psycopg2.connect(self.connection_string)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
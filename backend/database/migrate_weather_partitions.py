@@ -0,0 +1,115 @@
+"""
+Weather Data Partition Migration
+Converts the legacy single-table weather_data into the monthly partitioned layout.
+"""
+
+import psycopg2
+import sys
+import os
+from datetime import date
+
+# Add backend and parent directories to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+from config import config
+from database import partitions
+
+LEGACY_TABLE = "weather_data_legacy"
+COLUMNS = """id, location_id, timestamp, temperature, apparent_temperature, humidity,
+             precipitation, precipitation_probability, wind_speed, wind_direction,
+             cloud_cover, uv_index, weather_code, created_at"""
+
+
+def _months_between(earlier: date, later: date) -> int:
+    return (later.year - earlier.year) * 12 + (later.month - earlier.month)
+
+
+def migrate(drop_legacy: bool = False) -> bool:
+    """
+    Move weather_data into a partitioned table in a single transaction.
+
+    The old table is renamed to weather_data_legacy, the partitioned table is
+    created from schema.sql, partitions covering the legacy rows are created and
+    rows are copied month by month with their original ids.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = psycopg2.connect(config.DATABASE_URL)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT to_regclass(%s)", (partitions.PARENT_TABLE,))
+        if cursor.fetchone()[0] is None:
+            print("weather_data does not exist yet - it will be created partitioned on startup.")
+            return True
+
+        if partitions.is_partitioned(cursor):
+            print("weather_data is already partitioned. Nothing to do.")
+            return True
+
+        print("Renaming legacy table...")
+        cursor.execute(f"ALTER TABLE weather_data RENAME TO {LEGACY_TABLE}")
+        cursor.execute("ALTER INDEX IF EXISTS weather_data_pkey RENAME TO weather_data_legacy_pkey")
+        cursor.execute("ALTER INDEX IF EXISTS idx_weather_location_time RENAME TO idx_weather_legacy_location_time")
+        cursor.execute("ALTER SEQUENCE IF EXISTS weather_data_id_seq RENAME TO weather_data_legacy_id_seq")
+
+        print("Creating partitioned weather_data from schema.sql...")
+        schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
+        with open(schema_path, 'r') as f:
+            cursor.execute(f.read())
+
+        cursor.execute(f"SELECT MIN(timestamp), MAX(timestamp), MAX(id) FROM {LEGACY_TABLE}")
+        oldest, newest, max_id = cursor.fetchone()
+
+        today = date.today()
+        months_back = partitions.months_to_keep(config.WEATHER_RETENTION_DAYS, today)
+        months_ahead = config.WEATHER_PARTITIONS_AHEAD
+        if oldest is not None:
+            months_back = max(months_back, _months_between(oldest.date(), today))
+            months_ahead = max(months_ahead, _months_between(today, newest.date()))
+
+        created = partitions.ensure_partitions(cursor, months_back, months_ahead, today)
+        print(f"Created {len(created)} monthly partitions")
+
+        total = 0
+        for name, start, end in partitions.list_partitions(cursor):
+            cursor.execute(f"""
+                INSERT INTO weather_data ({COLUMNS})
+                SELECT {COLUMNS} FROM {LEGACY_TABLE}
+                WHERE timestamp >= %s AND timestamp < %s
+            """, (start, end))
+            if cursor.rowcount:
+                print(f"  {name}: {cursor.rowcount} rows")
+                total += cursor.rowcount
+
+        if max_id is not None:
+            cursor.execute("SELECT setval(pg_get_serial_sequence('weather_data', 'id'), %s)", (max_id,))
+
+        if drop_legacy:
+            cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+            print("Dropped legacy table")
+        else:
+            print(f"Legacy rows kept in {LEGACY_TABLE} - drop it once you have verified the migration")
+
+        conn.commit()
+        print(f"\nMigrated {total} weather rows into partitioned weather_data")
+        return True
+
+    except Exception as e:
+        print(f"Migration failed, no changes were made: {e}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    print("HomeNetAI Weather Data Partition Migration")
+    print("=" * 50)
+    success = migrate(drop_legacy="--drop-legacy" in sys.argv)
+    sys.exit(0 if success else 1)
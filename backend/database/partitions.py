@@ -0,0 +1,258 @@
+"""
+Weather Data Partition Management
+Keeps weather_data split into monthly range partitions, compacts closed months,
+and rolls expired months up into weather_rollups before dropping them.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2 import sql
+
+PARENT_TABLE = "weather_data"
+DEFAULT_PARTITION = "weather_data_default"
+COMPACTED_MARKER = "compacted"
+
+_PARTITION_NAME = re.compile(r"^weather_data_y(\d{4})m(\d{2})$")
+
+
+def month_start(value) -> date:
+    """Return the first day of the month containing value."""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """Shift a month-start date by a number of months."""
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(start: date) -> str:
+    """Name of the monthly partition beginning at start."""
+    return f"{PARENT_TABLE}_y{start.year:04d}m{start.month:02d}"
+
+
+def months_to_keep(retention_days: int, today: Optional[date] = None) -> int:
+    """Number of months before the current one that still fall inside the retention window."""
+    today = today or date.today()
+    current = month_start(today)
+    oldest = month_start(today - timedelta(days=retention_days))
+    return (current.year - oldest.year) * 12 + (current.month - oldest.month)
+
+
+def is_partitioned(cursor) -> bool:
+    """Check whether weather_data is a partitioned table (vs. the legacy heap table)."""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (PARENT_TABLE,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(cursor) -> List[Tuple[str, date, date]]:
+    """List monthly partitions as (name, lower bound, upper bound), oldest first."""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (PARENT_TABLE,))
+
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            start = date(int(match.group(1)), int(match.group(2)), 1)
+            partitions.append((name, start, add_months(start, 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(cursor, months_back: int, months_ahead: int,
+                      today: Optional[date] = None) -> List[str]:
+    """
+    Create any missing monthly partitions around today, plus the default partition.
+
+    Args:
+        cursor: Open cursor (caller commits)
+        months_back: Months before the current one that must have a partition
+        months_ahead: Months after the current one to pre-create
+        today: Reference date (defaults to today)
+
+    Returns:
+        Names of the partitions that were created
+    """
+    today = today or date.today()
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT").format(
+        sql.Identifier(DEFAULT_PARTITION), sql.Identifier(PARENT_TABLE)
+    ))
+
+    existing = {name for name, _, _ in list_partitions(cursor)}
+    current = month_start(today)
+    created = []
+
+    for offset in range(-months_back, months_ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(start)
+        if name not in existing:
+            create_partition(cursor, start)
+            created.append(name)
+
+    return created
+
+
+def create_partition(cursor, start: date) -> str:
+    """
+    Create the monthly partition beginning at start.
+
+    Rows that already landed in the default partition for that month are moved
+    into the new partition first, otherwise Postgres refuses to attach it.
+    """
+    end = add_months(start, 1)
+    name = partition_name(start)
+
+    cursor.execute(sql.SQL("SELECT 1 FROM {} WHERE timestamp >= %s AND timestamp < %s LIMIT 1").format(
+        sql.Identifier(DEFAULT_PARTITION)
+    ), (start, end))
+
+    if cursor.fetchone() is None:
+        cursor.execute(sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {} PARTITION OF {}
+            FOR VALUES FROM (%s) TO (%s)
+        """).format(sql.Identifier(name), sql.Identifier(PARENT_TABLE)), (start, end))
+        return name
+
+    cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+        sql.Identifier(name), sql.Identifier(PARENT_TABLE)
+    ))
+    cursor.execute(sql.SQL("""
+        WITH moved AS (
+            DELETE FROM {} WHERE timestamp >= %s AND timestamp < %s
+            RETURNING *
+        )
+        INSERT INTO {} SELECT * FROM moved
+    """).format(sql.Identifier(DEFAULT_PARTITION), sql.Identifier(name)), (start, end))
+    cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+        sql.Identifier(PARENT_TABLE), sql.Identifier(name)
+    ), (start, end))
+    return name
+
+
+def rollup_range(cursor, table: str, start: datetime, end: datetime) -> int:
+    """
+    Roll raw hourly rows in [start, end) up into weather_rollups.
+
+    Every collection cycle re-inserts the whole hourly forecast, so only the most
+    recently collected row per location and hour is counted.
+
+    Returns:
+        Number of daily rollup rows written
+    """
+    cursor.execute(sql.SQL("""
+        INSERT INTO weather_rollups
+            (location_id, date, temp_avg, temp_min, temp_max, humidity_avg,
+             precipitation_sum, wind_speed_avg, wind_speed_max, uv_index_max, samples)
+        SELECT location_id, timestamp::date,
+               AVG(temperature), MIN(temperature), MAX(temperature), AVG(humidity),
+               SUM(precipitation), AVG(wind_speed), MAX(wind_speed), MAX(uv_index), COUNT(*)
+        FROM (
+            SELECT DISTINCT ON (location_id, timestamp) *
+            FROM {}
+            WHERE timestamp >= %s AND timestamp < %s
+            ORDER BY location_id, timestamp, created_at DESC
+        ) latest
+        GROUP BY location_id, timestamp::date
+        ON CONFLICT (location_id, date) DO UPDATE SET
+            temp_avg = EXCLUDED.temp_avg,
+            temp_min = EXCLUDED.temp_min,
+            temp_max = EXCLUDED.temp_max,
+            humidity_avg = EXCLUDED.humidity_avg,
+            precipitation_sum = EXCLUDED.precipitation_sum,
+            wind_speed_avg = EXCLUDED.wind_speed_avg,
+            wind_speed_max = EXCLUDED.wind_speed_max,
+            uv_index_max = EXCLUDED.uv_index_max,
+            samples = EXCLUDED.samples
+    """).format(sql.Identifier(table)), (start, end))
+    return cursor.rowcount
+
+
+def compact_partition(cursor, name: str) -> int:
+    """
+    Remove superseded forecast rows from a closed monthly partition.
+
+    Keeps only the latest collected row per location and hour, then tags the
+    partition so it is not scanned again.
+
+    Returns:
+        Number of rows deleted
+    """
+    cursor.execute(sql.SQL("""
+        DELETE FROM {table}
+        WHERE ctid IN (
+            SELECT ctid FROM (
+                SELECT ctid, ROW_NUMBER() OVER (
+                    PARTITION BY location_id, timestamp
+                    ORDER BY created_at DESC, id DESC
+                ) AS rn
+                FROM {table}
+            ) ranked
+            WHERE rn > 1
+        )
+    """).format(table=sql.Identifier(name)))
+    deleted = cursor.rowcount
+    cursor.execute(sql.SQL("COMMENT ON TABLE {} IS %s").format(sql.Identifier(name)), (COMPACTED_MARKER,))
+    return deleted
+
+
+def _is_compacted(cursor, name: str) -> bool:
+    cursor.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (name,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == COMPACTED_MARKER
+
+
+def apply_retention(cursor, retention_days: int, today: Optional[date] = None) -> Dict[str, List[str]]:
+    """
+    Roll up and drop monthly partitions that ended before the retention cutoff.
+
+    Rollup and drop run in the caller's transaction, so a partition is never
+    dropped without its rollup having been written.
+    """
+    today = today or date.today()
+    cutoff = today - timedelta(days=retention_days)
+    result = {"rolled_up": [], "dropped": []}
+
+    for name, start, end in list_partitions(cursor):
+        if end > cutoff:
+            continue
+        rollup_range(cursor, name, start, end)
+        result["rolled_up"].append(name)
+        cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+        result["dropped"].append(name)
+
+    # Stray rows older than the cutoff can also sit in the default partition
+    cutoff_start = datetime.combine(cutoff, datetime.min.time())
+    if rollup_range(cursor, DEFAULT_PARTITION, datetime.min, cutoff_start):
+        cursor.execute(sql.SQL("DELETE FROM {} WHERE timestamp < %s").format(
+            sql.Identifier(DEFAULT_PARTITION)
+        ), (cutoff_start,))
+        result["rolled_up"].append(DEFAULT_PARTITION)
+
+    return result
+
+
+def maintain(cursor, retention_days: int, months_ahead: int,
+             today: Optional[date] = None) -> Dict[str, List[str]]:
+    """
+    Run one maintenance pass: create upcoming partitions, compact closed months,
+    then apply the retention policy.
+    """
+    today = today or date.today()
+    months_back = months_to_keep(retention_days, today)
+    summary = {"created": ensure_partitions(cursor, months_back, months_ahead, today), "compacted": []}
+
+    current = month_start(today)
+    for name, _, end in list_partitions(cursor):
+        if end <= current and not _is_compacted(cursor, name):
+            compact_partition(cursor, name)
+            summary["compacted"].append(name)
+
+    summary.update(apply_retention(cursor, retention_days, today))
+    return summary
@@ -22,8 +22,11 @@ CREATE TABLE IF NOT EXISTS user_locations (
 );
 
 -- Weather data table (linked to user locations)
+-- Range-partitioned by month on timestamp. Monthly partitions are created and
+-- expired by database/partitions.py; existing heap tables are converted with
+-- database/migrate_weather_partitions.py.
 CREATE TABLE IF NOT EXISTS weather_data (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     location_id INTEGER NOT NULL,
     timestamp TIMESTAMP NOT NULL,
     temperature DECIMAL(8, 2),
@@ -37,6 +40,88 @@ CREATE TABLE IF NOT EXISTS weather_data (
     uv_index DECIMAL(8, 2),
     weather_code INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
+    FOREIGN KEY (location_id) REFERENCES user_locations (id) ON DELETE CASCADE
+) PARTITION BY RANGE (timestamp);
+
+-- Daily rollups of raw weather_data, kept after raw partitions are dropped
+CREATE TABLE IF NOT EXISTS weather_rollups (
+    location_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    temp_avg DECIMAL(8, 2),
+    temp_min DECIMAL(8, 2),
+    temp_max DECIMAL(8, 2),
+    humidity_avg DECIMAL(8, 2),
+    precipitation_sum DECIMAL(8, 2),
+    wind_speed_avg DECIMAL(8, 2),
+    wind_speed_max DECIMAL(8, 2),
+    uv_index_max DECIMAL(8, 2),
+    samples INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (location_id, date),
+    FOREIGN KEY (location_id) REFERENCES user_locations (id) ON DELETE CASCADE
+);
+
+-- Per-user settings (units, theme, alert toggles)
+CREATE TABLE IF NOT EXISTS user_preferences (
+    user_id INTEGER PRIMARY KEY,
+    unit_system VARCHAR(20) NOT NULL DEFAULT 'imperial',
+    theme VARCHAR(20) NOT NULL DEFAULT 'light',
+    alerts_enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    temperature_alerts BOOLEAN NOT NULL DEFAULT TRUE,
+    precipitation_alerts BOOLEAN NOT NULL DEFAULT TRUE,
+    wind_alerts BOOLEAN NOT NULL DEFAULT TRUE,
+    anomaly_alerts BOOLEAN NOT NULL DEFAULT TRUE,
+    email_notifications BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+-- Trained forecast model parameters, one row per location and version
+CREATE TABLE IF NOT EXISTS forecast_models (
+    location_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    model_type VARCHAR(50) NOT NULL,
+    params JSONB NOT NULL,
+    n_obs INTEGER NOT NULL DEFAULT 0,
+    last_timestamp TIMESTAMP,
+    full_fit BOOLEAN NOT NULL DEFAULT TRUE,
+    fitted_at TIMESTAMP,
+    trained_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (location_id, version),
+    FOREIGN KEY (location_id) REFERENCES user_locations (id) ON DELETE CASCADE
+);
+
+-- Alerts materialized by the scheduler after each weather collection.
+-- dedup_key is location:rule:date, so a rule that keeps firing refreshes one
+-- row (keeping its read/dismissed state) instead of creating duplicates.
+CREATE TABLE IF NOT EXISTS alerts (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    location_id INTEGER NOT NULL,
+    rule VARCHAR(64) NOT NULL,
+    alert_type VARCHAR(32) NOT NULL,
+    severity VARCHAR(20) NOT NULL CHECK (severity IN ('critical', 'warning', 'info', 'recommendation')),
+    title VARCHAR(255) NOT NULL,
+    message TEXT NOT NULL,
+    recommendation TEXT,
+    icon VARCHAR(50),
+    dedup_key VARCHAR(255) NOT NULL UNIQUE,
+    is_read BOOLEAN NOT NULL DEFAULT FALSE,
+    dismissed BOOLEAN NOT NULL DEFAULT FALSE,
+    fired_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+    FOREIGN KEY (location_id) REFERENCES user_locations (id) ON DELETE CASCADE
+);
+
+-- Last alert evaluation per location
+CREATE TABLE IF NOT EXISTS alert_evaluations (
+    location_id INTEGER PRIMARY KEY,
+    evaluated_at TIMESTAMP NOT NULL,
     FOREIGN KEY (location_id) REFERENCES user_locations (id) ON DELETE CASCADE
 );
 
@@ -73,6 +158,35 @@ CREATE TABLE IF NOT EXISTS devices (
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
 );
 
+-- AI chat conversations. Turns older than the recent window are folded into
+-- summary; summarized_through is the last message seq covered by it.
+CREATE TABLE IF NOT EXISTS conversations (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    summarized_through INTEGER NOT NULL DEFAULT 0,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    conversation_id VARCHAR(36) NOT NULL,
+    seq INTEGER NOT NULL,
+    role VARCHAR(10) NOT NULL CHECK (role IN ('user', 'assistant')),
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (conversation_id, seq),
+    FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
+);
+
+-- Login attempts inside the rate-limit window (LOGIN_RATE_LIMIT_BACKEND=postgres)
+CREATE TABLE IF NOT EXISTS login_attempts (
+    key VARCHAR(255) NOT NULL,
+    attempted_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_weather_location_time ON weather_data(location_id, timestamp);
 CREATE INDEX IF NOT EXISTS idx_daily_location_date ON daily_weather(location_id, date);
@@ -81,3 +195,7 @@ CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_user_locations_user_id ON user_locations(user_id);
 CREATE INDEX IF NOT EXISTS idx_devices_user_id ON devices(user_id);
 CREATE INDEX IF NOT EXISTS idx_devices_type ON devices(type);
+CREATE INDEX IF NOT EXISTS idx_alerts_user_location_active ON alerts(user_id, location_id, expires_at) WHERE NOT dismissed;
+CREATE INDEX IF NOT EXISTS idx_alerts_expires ON alerts(expires_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations(user_id, updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_login_attempts_key_time ON login_attempts(key, attempted_at);
@@ -11,14 +11,24 @@ backend_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(backend_dir)
 sys.path.insert(0, parent_dir)
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from config import config
-from routes import auth, locations, weather, devices, images, ai, alerts, analytics, settings, pico, pico_proxy
-from auth.helpers import verify_token
+from routes import auth, locations, weather, devices, images, ai, alerts, analytics, settings, pico, pico_proxy, stream
+from auth.helpers import Principal, get_current_user
+from database.database import HomeNetDatabase
+from services.context_service import context_service
+from observability import metrics
+from observability import collectors  # noqa: F401 - registers the service stats collectors
+from observability.request_log import RequestLogMiddleware, setup_logging
+
+setup_logging()
+metrics.subscribe_scheduler_metrics()
 
 # FastAPI App
 app = FastAPI(title="HomeNetAI Weather API", version="1.0.0")
+db = HomeNetDatabase()
 
 # CORS middleware for frontend access
 app.add_middleware(
@@ -42,28 +52,10 @@ app.include_router(analytics.router)
 app.include_router(settings.router)
 app.include_router(pico.router)
 app.include_router(pico_proxy.router)
+app.include_router(stream.router)
 
-# Add middleware to log all requests (must be after CORS)
-@app.middleware("http")
-async def log_requests(request, call_next):
-    import time
-    start_time = time.time()
-    print(f"REQUEST: {request.method} {request.url.path}", flush=True)
-    import sys
-    sys.stdout.flush()
-    try:
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        print(f"RESPONSE: {request.method} {request.url.path} - {response.status_code} - {process_time:.2f}s", flush=True)
-        sys.stdout.flush()
-        return response
-    except Exception as e:
-        process_time = time.time() - start_time
-        print(f"ERROR: {request.method} {request.url.path} - {str(e)} - {process_time:.2f}s", flush=True)
-        import traceback
-        traceback.print_exc()
-        sys.stdout.flush()
-        raise
+# Structured request logging with request IDs (added after CORS so it wraps it)
+app.add_middleware(RequestLogMiddleware)
 
 
 @app.get("/")
@@ -80,35 +72,30 @@ async def health():
     """Health check endpoint"""
     return {"status": "healthy", "message": "Backend is running"}
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint: latency histograms, counters and cache ratios for this worker"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # User data management endpoints
 @app.delete("/user/data")
-async def clear_user_data(username: str = Depends(verify_token)):
-    # Clear all user data (locations, weather data, etc.)
+async def clear_user_data(current_user: Principal = Depends(get_current_user)):
+    """Clear all of the user's locations and their weather data, forecasts and alerts"""
+    conn = None
+    cursor = None
     try:
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # Get user ID
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user_result = cursor.fetchone()
-        if not user_result:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        user_id = user_result[0]
-        
-        # Delete all user locations and associated weather data
-        cursor.execute("DELETE FROM weather_data WHERE user_id = %s", (user_id,))
-        cursor.execute("DELETE FROM daily_weather WHERE user_id = %s", (user_id,))
-        cursor.execute("DELETE FROM user_locations WHERE user_id = %s", (user_id,))
+        # Weather data, daily forecasts, rollups and alerts cascade from user_locations
+        cursor.execute("DELETE FROM user_locations WHERE user_id = %s", (current_user.user_id,))
         
         conn.commit()
-        cursor.close()
-        conn.close()
+        context_service.invalidate(current_user.user_id)
         
         return {"message": "All user data has been cleared successfully"}
         
-    except HTTPException:
-        raise
     except Exception as e:
         print(f"Error clearing user data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -121,4 +108,4 @@ async def clear_user_data(username: str = Depends(verify_token)):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, access_log=False)
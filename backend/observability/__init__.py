@@ -0,0 +1 @@
+"""Request logging and metrics for HomeNetAI."""
@@ -0,0 +1,61 @@
+"""
+Scrape-time metrics for HomeNetAI
+Exports the counters the services already keep for their /stats endpoints;
+importing this module registers the collectors
+"""
+
+from auth.helpers import token_cache
+from auth.passwords import password_hasher
+from auth.rate_limit import login_limiter
+from observability.metrics import registry, stats_families
+from observability.request_log import log_stats
+from services.ai_scheduler import ai_scheduler
+from services.context_service import context_service
+from services.insights_service import insights_service
+from services.response_cache import response_cache
+from services.stream_hub import stream_hub
+
+
+@registry.collector
+def caches():
+    return stats_families("homenet_cache", {
+        "context": context_service.stats,
+        "ai_response": response_cache.stats,
+        "insights": insights_service.stats,
+        "token": token_cache.stats,
+    }, label="cache", counters=("hits", "misses"), gauges=("hit_rate",))
+
+
+@registry.collector
+def ai_requests():
+    return stats_families(
+        "homenet_ai", {"": ai_scheduler.stats},
+        counters=("completed", "failed", "retries", "rate_limited", "rejected"), gauges=("in_flight",)
+    )
+
+
+@registry.collector
+def logins():
+    return [
+        *stats_families(
+            "homenet_login", {"": login_limiter.stats},
+            counters=("allowed", "rejected_ip", "rejected_username", "errors")
+        ),
+        *stats_families(
+            "homenet_password", {"": password_hasher.stats},
+            counters=("hashed", "verified", "rehashed", "rejected"), gauges=("pending",)
+        ),
+    ]
+
+
+@registry.collector
+def streams():
+    return stats_families(
+        "homenet_stream", {"": stream_hub.stats},
+        counters=("events_sent",), gauges=("connections", "users")
+    )
+
+
+@registry.collector
+def request_log():
+    return stats_families("homenet_log", {"": log_stats}, counters=("enqueued", "dropped"), gauges=("queued",))
@@ -0,0 +1,384 @@
+"""
+Metrics for HomeNetAI
+Counters and latency histograms rendered in the Prometheus text format on /metrics
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; covers a cached request (<5 ms) up to a slow upstream call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Scheduler cycles and stages run from seconds to minutes
+SCHEDULER_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# (name, type, help, [(labels, value), ...]) produced by a collector at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """Metrics and scrape-time collectors, rendered together by render()"""
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def collector(self, fn: Callable[[], Iterable[Family]]):
+        """Register fn (usable as a decorator) to add metric families on each scrape"""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            metric.render(lines)
+        for collect in collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, *values):
+        """The child for these label values (in labelnames order), created on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            self._render_child(lines, dict(zip(self.labelnames, values)), child)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _render_child(self, lines: List[str], labels: Dict[str, str], child):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. requests or errors"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0):
+        """Increment an unlabelled counter"""
+        self.labels().inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, lines, labels, child):
+        lines.append(f"{self.name}{_format_labels(labels)} {_format_value(child.value)}")
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        """Context manager observing the seconds spent inside it"""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies in seconds) in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def observe(self, value: float):
+        """Observe a value on an unlabelled histogram"""
+        self.labels().observe(value)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, lines, labels, child):
+        with child.lock:
+            counts = list(child.counts)
+            total = child.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            bucket_labels = {**labels, "le": _format_value(bound)}
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+
+
+# HTTP requests (route is the matched path template, so ids don't multiply series)
+http_request_seconds = Histogram(
+    "homenet_http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status")
+)
+
+# Database
+db_query_seconds = Histogram(
+    "homenet_db_query_duration_seconds", "Database query latency by query name", ("query",)
+)
+db_query_errors = Counter("homenet_db_query_errors_total", "Database queries that raised", ("query",))
+db_connect_seconds = Histogram(
+    "homenet_db_connect_duration_seconds", "Time to open a database connection",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+db_connect_errors = Counter("homenet_db_connect_errors_total", "Database connections that failed to open")
+db_connections_opened = Counter("homenet_db_connections_opened_total", "Database connections opened")
+db_connections_closed = Counter("homenet_db_connections_closed_total", "Database connections closed")
+db_connection_held_seconds = Histogram(
+    "homenet_db_connection_held_seconds", "How long a database connection stayed open"
+)
+
+
+@registry.collector
+def _db_connections():
+    opened = db_connections_opened.labels().value
+    closed = db_connections_closed.labels().value
+    yield ("homenet_db_connections_open", "gauge",
+           "Database connections opened and not yet closed", [({}, opened - closed)])
+
+# Upstream services
+upstream_seconds = Histogram(
+    "homenet_upstream_request_duration_seconds", "Latency of calls to external services", ("upstream",)
+)
+upstream_errors = Counter("homenet_upstream_errors_total", "Failed calls to external services", ("upstream",))
+
+# Weather scheduler
+scheduler_cycle_seconds = Histogram(
+    "homenet_scheduler_cycle_duration_seconds", "Duration of a full scheduler cycle",
+    buckets=SCHEDULER_BUCKETS
+)
+scheduler_stage_seconds = Histogram(
+    "homenet_scheduler_stage_duration_seconds", "Duration of each scheduler stage", ("stage",),
+    buckets=SCHEDULER_BUCKETS
+)
+scheduler_cycles = Counter("homenet_scheduler_cycles_total", "Scheduler cycles by result", ("result",))
+scheduler_locations = Counter(
+    "homenet_scheduler_locations_total", "Weather collections per location by result", ("result",)
+)
+
+
+def time_query(name: str):
+    """Decorator timing a database method under homenet_db_query_duration_seconds{query=name}"""
+    child = db_query_seconds.labels(name)
+    errors = db_query_errors.labels(name)
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class upstream_call:
+    """
+    Time one call to an external service (with or async with)
+
+    An exception raised inside the block counts as an error; call fail()
+    for failures that don't raise, such as a non-200 response that is
+    handled by falling back.
+    """
+
+    __slots__ = ("upstream", "start", "failed")
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        upstream_seconds.labels(self.upstream).observe(time.perf_counter() - self.start)
+        if exc_type is not None or self.failed:
+            upstream_errors.labels(self.upstream).inc()
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+# Scheduler cycles from another process arrive over pub/sub on this channel
+SCHEDULER_CHANNEL = "metrics:scheduler"
+
+
+def record_scheduler_cycle(cycle: Dict[str, object]):
+    """
+    Record a scheduler cycle here and publish it for API processes
+
+    Args:
+        cycle: {"seconds": total, "stages": {stage: seconds}, "ok": bool,
+            "collected": n, "failed": n}
+    """
+    _observe_cycle(cycle)
+    from services.pubsub import pubsub
+    pubsub.publish(SCHEDULER_CHANNEL, {**cycle, "pid": os.getpid()})
+
+
+def subscribe_scheduler_metrics():
+    """Fold cycles reported by a scheduler in another process into this registry"""
+    from services.pubsub import pubsub
+    pubsub.subscribe(_on_message)
+
+
+def _on_message(channel: str, message: Dict[str, object]):
+    if channel == SCHEDULER_CHANNEL and message.get("pid") != os.getpid():
+        _observe_cycle(message)
+
+
+def _observe_cycle(cycle: Dict[str, object]):
+    scheduler_cycle_seconds.observe(float(cycle.get("seconds", 0.0)))
+    for stage, seconds in (cycle.get("stages") or {}).items():
+        scheduler_stage_seconds.labels(stage).observe(float(seconds))
+    scheduler_cycles.labels("success" if cycle.get("ok") else "error").inc()
+    scheduler_locations.labels("collected").inc(int(cycle.get("collected", 0)))
+    scheduler_locations.labels("failed").inc(int(cycle.get("failed", 0)))
+
+
+def stats_families(prefix: str, sources: Dict[str, Callable[[], Dict]], label: str = None,
+                   counters: Sequence[str] = (), gauges: Sequence[str] = ()) -> List[Family]:
+    """
+    Turn the stats() dicts of one or more components into metric families
+
+    Args:
+        prefix: Metric name prefix, e.g. "homenet_cache"
+        sources: label value -> stats() callable
+        label: Label naming the component, e.g. "cache" (None for a single component)
+        counters: stats keys exported as {prefix}_{key}_total
+        gauges: stats keys exported as {prefix}_{key}
+    """
+    stats = {}
+    for name, source in sources.items():
+        try:
+            stats[name] = source()
+        except Exception as e:
+            print(f"Metrics source {name or prefix} failed: {e}")
+    families = []
+    for keys, suffix, kind in ((counters, "_total", "counter"), (gauges, "", "gauge")):
+        for key in keys:
+            samples = [({label: name} if label else {}, s[key])
+                       for name, s in stats.items() if isinstance(s.get(key), (int, float))]
+            families.append((f"{prefix}_{key}{suffix}", kind, key.replace("_", " "), samples))
+    return families
+
+
+def render() -> str:
+    """The whole registry in the Prometheus text exposition format"""
+    return registry.render()
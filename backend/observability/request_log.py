@@ -0,0 +1,238 @@
+"""
+Structured request logging for HomeNetAI
+JSON log records handed to a background writer thread through a bounded
+queue, with per-route sampling and a request ID on every record
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+from observability.metrics import http_request_seconds
+
+# Request ID of the request being handled, attached to every record logged while it runs
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Incoming X-Request-ID values are reused only if they look like an ID
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# HTTP client libraries that log every call at INFO
+QUIET_LOGGERS = ("httpx", "httpcore", "urllib3")
+
+logger = logging.getLogger("homenet.request")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller
+
+    Records are enqueued with put_nowait and counted as dropped when the queue
+    is full. prepare() only resolves the message, request ID and traceback;
+    JSON encoding and the write happen on the listener thread.
+    """
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Updated in place instead of copied (QueueHandler's default): nothing
+        # but the listener thread reads the record after this
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(stream=None) -> DroppingQueueHandler:
+    """
+    Route the root logger through the queue to a JSON writer (idempotent)
+
+    Args:
+        stream: Where the writer thread puts records (default stdout)
+
+    Returns:
+        The queue handler, whose counters show enqueued and dropped records
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+
+    log_queue: "queue.Queue" = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    _handler = DroppingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(config.LOG_LEVEL)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return _handler
+
+
+def log_stats() -> Dict[str, int]:
+    if _handler is None:
+        return {"enqueued": 0, "dropped": 0, "queued": 0}
+    return {"enqueued": _handler.enqueued, "dropped": _handler.dropped, "queued": _handler.queue.qsize()}
+
+
+def parse_sample_rates(spec: str) -> List[Tuple[str, float]]:
+    """Parse "prefix:rate,prefix:rate" into (prefix, rate) pairs, longest prefix first"""
+    rates = []
+    for item in spec.split(","):
+        prefix, _, rate = item.strip().rpartition(":")
+        if prefix:
+            rates.append((prefix, float(rate)))
+    return sorted(rates, key=lambda pair: len(pair[0]), reverse=True)
+
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware that times every HTTP request and logs a structured record of it
+
+    Each request gets an ID (a well-formed incoming X-Request-ID is kept)
+    that is set on request.state.request_id, returned in the X-Request-ID
+    response header and attached to everything logged while it runs.
+    Successful requests on high-volume routes are sampled per
+    LOG_SAMPLE_RATES (other routes use LOG_SAMPLE_RATE); errors and requests
+    slower than LOG_SLOW_REQUEST_MS are always logged, and every record
+    carries its sample_rate so counts can be re-weighted. Latency goes to
+    homenet_http_request_duration_seconds for every request, sampled or not,
+    labelled by route template rather than path.
+    """
+
+    def __init__(self, app, sample_rate: float = config.LOG_SAMPLE_RATE,
+                 sample_rates: str = config.LOG_SAMPLE_RATES,
+                 slow_ms: float = config.LOG_SLOW_REQUEST_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.sample_rates = parse_sample_rates(sample_rates)
+        self.slow_ms = slow_ms
+        self.requests = 0
+        self.logged = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = self._request_id(scope)
+        scope.setdefault("state", {})["request_id"] = request_id
+        token = request_id_var.set(request_id)
+        header = (b"x-request-id", request_id.encode())
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", ()), header]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        except Exception:
+            self._log(scope, status, start, exc=True)
+            raise
+        else:
+            self._log(scope, status, start)
+        finally:
+            request_id_var.reset(token)
+
+    def _log(self, scope, status: int, start: float, exc: bool = False):
+        self.requests += 1
+        duration = time.perf_counter() - start
+        route = scope.get("route")
+        http_request_seconds.labels(
+            scope["method"], getattr(route, "path", "unmatched"), f"{status // 100}xx"
+        ).observe(duration)
+
+        duration_ms = duration * 1000
+        path = scope["path"]
+        rate = self._rate(path)
+        if not exc and status < 400 and duration_ms < self.slow_ms and random.random() >= rate:
+            return
+        self.logged += 1
+
+        principal = scope.get("state", {}).get("principal")
+        client = scope.get("client")
+        fields = {
+            "method": scope["method"],
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            "client_ip": client[0] if client else None,
+            "user_id": principal.user_id if principal else None,
+            "sample_rate": 1.0 if exc or status >= 400 or duration_ms >= self.slow_ms else rate,
+        }
+        level = logging.ERROR if exc or status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+        logger.log(level, "request failed" if exc else "request", exc_info=exc, extra={"fields": fields})
+
+    def _rate(self, path: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return self.sample_rate
+
+    @staticmethod
+    def _request_id(scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                incoming = value.decode("latin-1")
+                if REQUEST_ID_PATTERN.match(incoming):
+                    return incoming
+                break
+        return uuid.uuid4().hex
@@ -3,14 +3,15 @@ AI Routes for HomeNetAI
 Handles chatbot and AI insights endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from datetime import datetime, timezone
 import sys
 import os
-import uuid
 import asyncio
+import json
 
 # Add parent directory to path for imports
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,22 +19,39 @@ parent_dir = os.path.dirname(backend_dir)
 sys.path.insert(0, parent_dir)
 
 from services.ai_service import ai_service
-from auth.helpers import verify_token
-from database.database import HomeNetDatabase
+from services.context_service import context_service
+from services.conversation_service import conversation_store
+from services.response_cache import response_cache
+from services.ai_scheduler import ai_scheduler
+from services.prompt_builder import prompt_builder
+from services.retrieval_index import retrieval_index
+from services.insights_service import insights_service
+from auth.helpers import Principal, get_current_user
 
 # Create router
 router = APIRouter(prefix="/ai", tags=["AI"])
-db = HomeNetDatabase()
 
 # Test endpoint
 @router.get("/test")
 async def test_endpoint():
     return {"status": "ok", "message": "AI routes are working"}
 
+@router.get("/stats")
+async def ai_stats(current_user: Principal = Depends(get_current_user)):
+    """Context/response cache, prompt size and Gemini scheduler counters for this worker"""
+    return {
+        "context_cache": context_service.stats(),
+        "prompts": prompt_builder.stats(),
+        "retrieval": retrieval_index.stats(),
+        "insights": insights_service.stats(),
+        "response_cache": response_cache.stats(),
+        "scheduler": ai_scheduler.stats()
+    }
+
 # Pydantic Models
 class ChatMessage(BaseModel):
     message: str
-    conversation_id: Optional[str] = None
+    conversation_id: Optional[str] = Field(None, max_length=36)
 
 class ChatResponse(BaseModel):
     response: str
@@ -45,61 +63,46 @@ class InsightResponse(BaseModel):
     title: str
     message: str
 
-# Helper function to get user_id from username
-def get_user_id_from_username(username: str) -> int:
-    """Get user_id from username by querying database"""
-    conn = None
-    cursor = None
-    try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        result = cursor.fetchone()
-        if not result:
-            raise HTTPException(status_code=404, detail="User not found")
-        return result[0]
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
 # Routes
 @router.post("/chat", response_model=ChatResponse)
-async def chat(chat_message: ChatMessage, username: str = Depends(verify_token)):
+async def chat(chat_message: ChatMessage, background_tasks: BackgroundTasks,
+               current_user: Principal = Depends(get_current_user)):
     """
     Send a message to the AI chatbot and get a response with full context
     """
-    print(f"CHAT: {username} - {chat_message.message[:50]}...", flush=True)
+    print(f"CHAT: {current_user.username} - {chat_message.message[:50]}...", flush=True)
     
     try:
-        # Get user_id from username
-        user_id = get_user_id_from_username(username)
+        user_id = current_user.user_id
         
-        # Get user's context (locations, weather, devices) - runs in thread
-        context = await _get_user_context(user_id)
+        # Get user's context (locations, weather, devices) - cached per user
+        snapshot = await _get_user_context(user_id)
         
-        # Get conversation history if conversation_id provided
-        conversation_history = None
-        if chat_message.conversation_id:
-            conversation_history = await _get_conversation_history(
-                chat_message.conversation_id, 
-                user_id
-            )
+        # Load the conversation (summary + recent turns), or start a new one
+        conversation = await _get_conversation(chat_message.conversation_id, user_id)
         
-        # Generate AI response with full context
-        ai_response = await ai_service.generate_chat_response(
-            user_message=chat_message.message,
-            context=context,
-            conversation_history=conversation_history
-        )
+        # Snippets from the user's history relevant to this question
+        references = await _retrieve(user_id, chat_message.message)
         
-        # Generate or use existing conversation ID
-        conversation_id = chat_message.conversation_id or _generate_conversation_id()
+        # Generate AI response with full context; a failed reply is shown but not stored
+        try:
+            ai_response = await ai_service.generate_chat_response(
+                user_message=chat_message.message,
+                context=snapshot.context,
+                conversation_history=conversation.history(),
+                system_prompt=ai_service.build_system_prompt(question=chat_message.message, rendered=snapshot.rendered),
+                summary=conversation.summary,
+                references=references
+            )
+        except Exception as e:
+            print(f"AI ERROR: {e}", flush=True)
+            ai_response = ai_service.error_message(e)
+        else:
+            await _store_turn(conversation, chat_message.message, ai_response, background_tasks)
         
         return ChatResponse(
             response=ai_response,
-            conversation_id=conversation_id,
+            conversation_id=conversation.id,
             timestamp=datetime.now(timezone.utc).isoformat()
         )
         
@@ -111,18 +114,72 @@ async def chat(chat_message: ChatMessage, username: str = Depends(verify_token))
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to generate AI response: {str(e)}")
 
+@router.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage, background_tasks: BackgroundTasks,
+                      current_user: Principal = Depends(get_current_user)):
+    """
+    Send a message to the AI chatbot and stream the reply as it is generated
+    
+    Returns newline-delimited JSON events:
+    - {"type": "start", "conversation_id": ...}
+    - {"type": "delta", "text": ...}   one per chunk from the model
+    - {"type": "done", "response": ..., "timestamp": ...}
+    - {"type": "error", "message": ...}
+    
+    Closing the connection stops the model generation; an interrupted reply
+    is not stored in the conversation.
+    """
+    print(f"CHAT STREAM: {current_user.username} - {chat_message.message[:50]}...", flush=True)
+    
+    user_id = current_user.user_id
+    snapshot = await _get_user_context(user_id)
+    conversation = await _get_conversation(chat_message.conversation_id, user_id)
+    references = await _retrieve(user_id, chat_message.message)
+    
+    async def events():
+        yield _ndjson({"type": "start", "conversation_id": conversation.id})
+        parts = []
+        try:
+            async for text in ai_service.stream_chat_response(
+                user_message=chat_message.message,
+                context=snapshot.context,
+                conversation_history=conversation.history(),
+                system_prompt=ai_service.build_system_prompt(question=chat_message.message, rendered=snapshot.rendered),
+                summary=conversation.summary,
+                references=references
+            ):
+                parts.append(text)
+                yield _ndjson({"type": "delta", "text": text})
+        except Exception as e:
+            print(f"CHAT STREAM ERROR: {e}", flush=True)
+            yield _ndjson({"type": "error", "message": ai_service.error_message(e)})
+            return
+        
+        ai_response = "".join(parts).strip()
+        await _store_turn(conversation, chat_message.message, ai_response, background_tasks)
+        yield _ndjson({
+            "type": "done",
+            "response": ai_response,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 @router.get("/insights", response_model=List[InsightResponse])
-async def get_insights(username: str = Depends(verify_token)):
-    """Get AI-generated insights based on user's weather and home data"""
+async def get_insights(current_user: Principal = Depends(get_current_user)):
+    """Get rule-based insights for all of the user's locations, most severe first"""
     try:
-        # Get user_id from username
-        user_id = get_user_id_from_username(username)
+        user_id = current_user.user_id
         
         # Get user's context
-        context = await _get_user_context(user_id)
+        snapshot = await _get_user_context(user_id)
         
-        # Generate insights
-        insights = await ai_service.generate_insights(context)
+        # Evaluate insights for every location (cached until the snapshot changes)
+        loop = asyncio.get_event_loop()
+        insights = await loop.run_in_executor(None, insights_service.get_insights, user_id, snapshot)
         
         return insights
         
@@ -133,131 +190,55 @@ async def get_insights(username: str = Depends(verify_token)):
         raise HTTPException(status_code=500, detail="Failed to generate insights")
 
 # Helper functions - all database operations run in threads to avoid blocking
-async def _get_user_context(user_id: int) -> Dict:
+async def _get_user_context(user_id: int):
     """
-    Gather user's context including locations, weather, and devices
-    All database queries run in threads to avoid blocking
+    Get the user's cached context snapshot (locations, weather, devices)
+    
+    Repeat calls are served from memory; a miss loads the context in a thread
+    to avoid blocking
     """
-    def _get_context_sync():
-        """Synchronous function that runs in thread"""
-        conn = None
-        cursor = None
-        context = {}
-        
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            # Get user's locations
-            cursor.execute("""
-                SELECT id, name, latitude, longitude 
-                FROM user_locations 
-                WHERE user_id = %s
-            """, (user_id,))
-            
-            locations = []
-            for row in cursor.fetchall():
-                locations.append({
-                    "id": row[0],
-                    "name": row[1],
-                    "latitude": float(row[2]),
-                    "longitude": float(row[3])
-                })
-            context["locations"] = locations
-            
-            # Get current weather for first location
-            if locations and len(locations) > 0:
-                location_id = locations[0]["id"]
-                
-                # Get latest weather data
-                cursor.execute("""
-                    SELECT temperature, apparent_temperature, humidity, 
-                           precipitation, wind_speed, wind_direction, 
-                           cloud_cover, weather_code, timestamp
-                    FROM weather_data
-                    WHERE location_id = %s
-                    ORDER BY timestamp DESC
-                    LIMIT 1
-                """, (location_id,))
-                
-                weather_row = cursor.fetchone()
-                if weather_row:
-                    context["current_weather"] = {
-                        "temperature": float(weather_row[0]) if weather_row[0] is not None else None,
-                        "apparent_temperature": float(weather_row[1]) if weather_row[1] is not None else None,
-                        "humidity": float(weather_row[2]) if weather_row[2] is not None else None,
-                        "precipitation": float(weather_row[3]) if weather_row[3] is not None else None,
-                        "wind_speed": float(weather_row[4]) if weather_row[4] is not None else None,
-                        "wind_direction": float(weather_row[5]) if weather_row[5] is not None else None,
-                        "cloud_cover": float(weather_row[6]) if weather_row[6] is not None else None,
-                        "weather_code": int(weather_row[7]) if weather_row[7] is not None else None,
-                        "timestamp": weather_row[8].isoformat() if weather_row[8] else None
-                    }
-                
-                # Get forecast
-                cursor.execute("""
-                    SELECT date, temp_max, temp_min, precipitation_sum,
-                           precipitation_probability_max, wind_speed_max
-                    FROM daily_weather
-                    WHERE location_id = %s AND date >= CURRENT_DATE
-                    ORDER BY date
-                    LIMIT 7
-                """, (location_id,))
-                
-                forecast = []
-                for row in cursor.fetchall():
-                    forecast.append({
-                        "date": row[0].isoformat() if row[0] else None,
-                        "temp_max": float(row[1]) if row[1] is not None else None,
-                        "temp_min": float(row[2]) if row[2] is not None else None,
-                        "precipitation_sum": float(row[3]) if row[3] is not None else None,
-                        "precipitation_probability_max": float(row[4]) if row[4] is not None else None,
-                        "wind_speed_max": float(row[5]) if row[5] is not None else None
-                    })
-                context["forecast"] = forecast
-            
-            # Get devices
-            cursor.execute("""
-                SELECT id, name, type, status, room, value
-                FROM devices
-                WHERE user_id = %s
-            """, (user_id,))
-            
-            devices = []
-            for row in cursor.fetchall():
-                devices.append({
-                    "id": row[0],
-                    "name": row[1],
-                    "type": row[2],
-                    "status": row[3],
-                    "room": row[4],
-                    "value": float(row[5]) if row[5] is not None else None
-                })
-            context["devices"] = devices
-            
-            return context
-            
-        except Exception as e:
-            print(f"Error getting user context: {e}", flush=True)
-            return {}
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, context_service.get_snapshot, user_id, prompt_builder.render
+    )
+
+async def _retrieve(user_id: int, question: str) -> List[str]:
+    """
+    Top snippets for a question from the user's retrieval index
     
-    # Run database queries in thread to avoid blocking
+    The first call for a user builds the index in a thread; later calls are
+    in-memory lookups. Retrieval problems never fail the chat.
+    """
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _get_context_sync)
+    try:
+        return await loop.run_in_executor(None, retrieval_index.search, user_id, question)
+    except Exception as e:
+        print(f"Retrieval error: {e}", flush=True)
+        return []
 
-async def _get_conversation_history(conversation_id: str, user_id: int) -> List[Dict]:
+async def _get_conversation(conversation_id: Optional[str], user_id: int):
     """
-    Retrieve conversation history from database
-    For now returns empty list - can be implemented later
+    Get a conversation from the store (memory first, then the database)
+    
+    Unknown IDs start a new conversation under that ID; IDs owned by another
+    user are rejected
     """
-    # TODO: Implement database storage for conversations
-    return []
+    loop = asyncio.get_event_loop()
+    conversation = await loop.run_in_executor(
+        None, conversation_store.get_or_create, conversation_id, user_id
+    )
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+async def _store_turn(conversation, user_message: str, ai_response: str, background_tasks: BackgroundTasks):
+    """Store a completed turn; older turns are summarized after the response is sent"""
+    if not ai_service.model:
+        return
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, conversation_store.add_turn, conversation, user_message, ai_response)
+    if conversation_store.needs_compaction(conversation):
+        background_tasks.add_task(conversation_store.compact, conversation, ai_service.summarize_conversation)
 
-def _generate_conversation_id() -> str:
-    """Generate a unique conversation ID"""
-    return str(uuid.uuid4())
+def _ndjson(event: Dict) -> str:
+    return json.dumps(event) + "\n"
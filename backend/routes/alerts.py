@@ -2,47 +2,23 @@
 Alerts API Routes - Smart weather alerts and recommendations
 """
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from typing import List, Dict, Any
-import jwt
-from services.alerts_service import AlertsService
-from config import config
+from auth.helpers import Principal, get_current_user
+from services.alerts_service import alerts_service
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
-# Security
-security = HTTPBearer()
-
-
-# Authentication dependency
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Verify JWT token and return current user"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, config.SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("user_id")
-        username = payload.get("sub") or payload.get("username")
-        
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token: missing user_id")
-        
-        return {"user_id": user_id, "username": username}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    except Exception as e:
-        print(f"Authentication error: {e}")
-        raise HTTPException(status_code=401, detail="Authentication failed")
-
 @router.get("")
 async def get_alerts(
     location_id: int = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """
     Get all active alerts and recommendations for a location
     
+    Alerts are materialized by the weather scheduler after each collection,
+    so this is an indexed read of the alerts table.
+    
     Query Parameters:
     - location_id: Optional location ID to filter alerts
     
@@ -53,18 +29,17 @@ async def get_alerts(
     - recommendation: Helpful suggestions
     """
     try:
-        user_id = current_user.get("user_id")
+        user_id = current_user.user_id
         
         if not location_id:
             raise HTTPException(status_code=400, detail="location_id query parameter is required")
         
-        alerts_service = AlertsService()
         alerts = alerts_service.get_active_alerts(location_id, user_id)
         
         return {
             "success": True,
             "location_id": location_id,
-            "timestamp": alerts[0]["timestamp"] if alerts else None,
+            "timestamp": alerts[0]["created_at"] if alerts else None,
             "alert_count": len(alerts),
             "alerts": alerts
         }
@@ -77,7 +52,7 @@ async def get_alerts(
 @router.get("/{location_id}/summary")
 async def get_alert_summary(
     location_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """
     Get summary of active alerts grouped by type and severity
@@ -85,8 +60,7 @@ async def get_alert_summary(
     Provides overview of all alerts without full details
     """
     try:
-        user_id = current_user.get("user_id")
-        alerts_service = AlertsService()
+        user_id = current_user.user_id
         summary = alerts_service.get_alert_summary(location_id, user_id)
         
         return {
@@ -101,7 +75,7 @@ async def get_alert_summary(
 @router.get("/{location_id}/critical")
 async def get_critical_alerts(
     location_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """
     Get only critical and warning level alerts
@@ -109,15 +83,8 @@ async def get_critical_alerts(
     Useful for displaying high-priority alerts on dashboard
     """
     try:
-        user_id = current_user.get("user_id")
-        alerts_service = AlertsService()
-        all_alerts = alerts_service.get_active_alerts(location_id, user_id)
-        
-        # Filter for critical and warning only
-        critical_alerts = [
-            alert for alert in all_alerts 
-            if alert['severity'] in ['critical', 'warning']
-        ]
+        user_id = current_user.user_id
+        critical_alerts = alerts_service.get_active_alerts(location_id, user_id, ['critical', 'warning'])
         
         return {
             "success": True,
@@ -132,16 +99,20 @@ async def get_critical_alerts(
 @router.post("/generate/{location_id}")
 async def generate_alerts(
     location_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """
     Manually trigger alert generation for a location
     
-    Useful for refreshing alerts on-demand
+    Re-evaluates the rules for this location now instead of waiting for the
+    next scheduled collection
     """
     try:
-        user_id = current_user.get("user_id")
-        alerts_service = AlertsService()
+        user_id = current_user.user_id
+        if not alerts_service.get_owned_location(location_id, user_id):
+            raise HTTPException(status_code=404, detail="Location not found")
+        
+        alerts_service.materialize_and_deliver([location_id])
         alerts = alerts_service.get_active_alerts(location_id, user_id)
         
         return {
@@ -151,6 +122,8 @@ async def generate_alerts(
             "alert_count": len(alerts),
             "alerts": alerts
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating alerts: {str(e)}")
 
@@ -158,21 +131,24 @@ async def generate_alerts(
 @router.patch("/{alert_id}/read")
 async def mark_alert_as_read(
     alert_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """
-    Mark an alert as read (for future database-persisted alerts)
+    Mark an alert as read
     
-    Currently returns success as alerts are generated dynamically
+    The read state is kept for as long as the alert stays active
     """
     try:
-        # Note: Since alerts are currently generated dynamically,
-        # this endpoint is prepared for future database persistence
+        if not alerts_service.mark_as_read(alert_id, current_user.user_id):
+            raise HTTPException(status_code=404, detail="Alert not found")
+        
         return {
             "success": True,
             "message": f"Alert {alert_id} marked as read",
             "alert_id": alert_id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error marking alert as read: {str(e)}")
 
@@ -180,20 +156,23 @@ async def mark_alert_as_read(
 @router.delete("/{alert_id}")
 async def delete_alert(
     alert_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """
-    Delete/dismiss an alert (for future database-persisted alerts)
+    Delete/dismiss an alert
     
-    Currently returns success as alerts are generated dynamically
+    A dismissed alert does not come back while its condition keeps firing today
     """
     try:
-        # Note: Since alerts are currently generated dynamically,
-        # this endpoint is prepared for future database persistence
+        if not alerts_service.dismiss(alert_id, current_user.user_id):
+            raise HTTPException(status_code=404, detail="Alert not found")
+        
         return {
             "success": True,
             "message": f"Alert {alert_id} deleted",
             "alert_id": alert_id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting alert: {str(e)}")
@@ -3,71 +3,89 @@ Analytics Routes for HomeNetAI
 API endpoints for weather analytics, trends, and forecasting
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from typing import Optional
-import jwt
-
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from auth.helpers import Principal, get_current_user
 from services.analytics_service import analytics_service
-from config import config
+from services.export_service import export_service
+from services.columnar import columnar_response, negotiate_format, pa
 
 # Create router
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
-# Security
-security = HTTPBearer()
 
+# Request models
+class BatchAnalyticsRequest(BaseModel):
+    location_ids: List[int]
+    days: int = 30
+
+
+FORMAT_DESCRIPTION = "Response layout: rows (default), columns (JSON column arrays) or arrow (Arrow IPC)"
+
+
+def _response_format(format: Optional[str], accept: Optional[str]) -> str:
+    """Resolve ?format= / Accept into rows, columns or arrow"""
+    response_format = negotiate_format(format, accept)
+    if response_format == "arrow" and pa is None:
+        raise HTTPException(status_code=406, detail="Arrow responses are not available on this server")
+    return response_format
 
-# Authentication dependency
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Verify JWT token and return current user"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, config.SECRET_KEY, algorithms=["HS256"])
-        username = payload.get("sub") or payload.get("username")
-        user_id = payload.get("user_id")
-        
-        # If no user_id in token, look it up by username
-        if not user_id and username:
-            from database.database import HomeNetDatabase
-            db = HomeNetDatabase()
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            if result:
-                user_id = result[0]
-        
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token: could not determine user")
-        
-        return {"user_id": user_id, "username": username}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    except Exception as e:
-        print(f"Authentication error: {e}")
-        raise HTTPException(status_code=401, detail="Authentication failed")
+
+def _trend_columns(trends: Dict) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """Split a trend result into summary fields and prediction columns"""
+    predictions = np.array(trends.get("predictions") or [], dtype=float)
+    metadata = {k: v for k, v in trends.items() if k != "predictions"}
+    return metadata, {"hours_ahead": np.arange(1, len(predictions) + 1), "predicted": predictions}
+
+
+def _forecast_columns(forecast: Dict) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """Turn the per-metric forecast mapping into one column per field"""
+    metrics = list(forecast.get("forecasts", {}))
+    entries = [forecast["forecasts"][m] for m in metrics]
+    metadata = {k: v for k, v in forecast.items() if k != "forecasts"}
+    return metadata, {
+        "metric": np.array(metrics, dtype=object),
+        "current": np.array([e.get("current") for e in entries], dtype=float),
+        "predicted": np.array([e.get("predicted") for e in entries], dtype=float),
+        "trend": np.array([e.get("trend") for e in entries], dtype=object),
+        "confidence": np.array([e.get("confidence") for e in entries], dtype=float),
+    }
 
 
 @router.get("/historical/{location_id}")
 async def get_historical_data(
     location_id: int,
     days: int = Query(30, ge=1, le=365, description="Number of days of historical data"),
-    current_user: dict = Depends(get_current_user)
+    max_points: int = Query(1000, ge=10, le=20000, description="Maximum number of points returned"),
+    method: str = Query("lttb", pattern="^(lttb|minmax)$", description="Downsampling method (lttb, minmax)"),
+    metric: str = Query("temperature", description="Metric whose shape is preserved when downsampling"),
+    format: Optional[str] = Query(None, pattern="^(rows|columns|arrow)$", description=FORMAT_DESCRIPTION),
+    accept: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Get historical weather data for a location
     
     - **location_id**: ID of the user's location
     - **days**: Number of days to retrieve (1-365, default 30)
+    - **max_points**: Cap on returned points; longer series are downsampled (default 1000)
+    - **method**: lttb (Largest-Triangle-Three-Buckets) or minmax (keeps bucket extremes)
+    - **metric**: Metric used to pick the downsampled points (default temperature)
+    - **format**: rows, columns or arrow (also selected by `Accept: application/vnd.apache.arrow.stream`)
     """
+    response_format = _response_format(format, accept)
     try:
-        data = analytics_service.get_historical_data(location_id, days)
-        return data
+        if response_format == "rows":
+            return analytics_service.get_historical_data(location_id, days, max_points, method, metric)
+        
+        historical = analytics_service.get_historical_columns(location_id, days, max_points, method, metric)
+        columns = historical.pop("columns")
+        return columnar_response(response_format, historical, columns)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving historical data: {str(e)}")
 
@@ -77,7 +95,9 @@ async def get_trends(
     location_id: int,
     metric: str = Query("temperature", description="Metric to analyze (temperature, humidity, precipitation, wind_speed, uv_index)"),
     days: int = Query(30, ge=7, le=90, description="Number of days to analyze"),
-    current_user: dict = Depends(get_current_user)
+    format: Optional[str] = Query(None, pattern="^(rows|columns|arrow)$", description=FORMAT_DESCRIPTION),
+    accept: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Analyze trends in weather data
@@ -85,10 +105,14 @@ async def get_trends(
     - **location_id**: ID of the user's location
     - **metric**: Weather metric to analyze
     - **days**: Number of days to analyze (7-90, default 30)
+    - **format**: rows, columns or arrow (predictions become hours_ahead/predicted columns)
     """
+    response_format = _response_format(format, accept)
     try:
         trends = analytics_service.get_trends(location_id, metric, days)
-        return trends
+        if response_format == "rows":
+            return trends
+        return columnar_response(response_format, *_trend_columns(trends))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing trends: {str(e)}")
 
@@ -97,17 +121,23 @@ async def get_trends(
 async def get_forecast(
     location_id: int,
     hours: int = Query(24, ge=1, le=168, description="Number of hours to forecast"),
-    current_user: dict = Depends(get_current_user)
+    format: Optional[str] = Query(None, pattern="^(rows|columns|arrow)$", description=FORMAT_DESCRIPTION),
+    accept: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Get weather forecast for a location
     
     - **location_id**: ID of the user's location
     - **hours**: Number of hours to forecast (1-168, default 24)
+    - **format**: rows, columns or arrow (one entry per forecast metric)
     """
+    response_format = _response_format(format, accept)
     try:
         forecast = analytics_service.get_forecast(location_id, hours)
-        return forecast
+        if response_format == "rows":
+            return forecast
+        return columnar_response(response_format, *_forecast_columns(forecast))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating forecast: {str(e)}")
 
@@ -116,7 +146,7 @@ async def get_forecast(
 async def get_anomalies(
     location_id: int,
     days: int = Query(30, ge=7, le=90, description="Number of days to analyze"),
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Detect anomalies in weather data
@@ -135,7 +165,7 @@ async def get_anomalies(
 async def get_summary(
     location_id: int,
     days: int = Query(30, ge=7, le=365, description="Number of days to summarize"),
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Get comprehensive summary statistics for a location
@@ -148,3 +178,74 @@ async def get_summary(
         return summary
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
+
+
+@router.post("/batch")
+async def get_batch_analytics(
+    batch: BatchAnalyticsRequest,
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Get summaries, trends and anomalies for several locations in one call
+    
+    Replaces one /summary and /anomalies round trip per location with a single
+    set-based query and one vectorized pass over all locations.
+    
+    - **location_ids**: IDs of the user's locations (1-100)
+    - **days**: Number of days to analyze (7-365, default 30)
+    """
+    if not batch.location_ids or len(batch.location_ids) > 100:
+        raise HTTPException(status_code=400, detail="location_ids must contain between 1 and 100 IDs")
+    if not 7 <= batch.days <= 365:
+        raise HTTPException(status_code=400, detail="days must be between 7 and 365")
+    
+    try:
+        return analytics_service.get_batch_analytics(current_user.user_id, batch.location_ids, batch.days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating batch analytics: {str(e)}")
+
+
+@router.get("/export")
+async def export_weather_data(
+    location_id: List[int] = Query(..., description="Location ID(s) to export, repeat for several"),
+    start: Optional[datetime] = Query(None, description="Start of the time range (inclusive)"),
+    end: Optional[datetime] = Query(None, description="End of the time range (exclusive)"),
+    metrics: Optional[str] = Query(None, description="Comma-separated metrics to include (default all)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$", description="Output format (ndjson, csv, arrow)"),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Stream raw weather history for one or more locations
+    
+    Rows are read from a server-side cursor and encoded batch by batch, so
+    multi-year, multi-location exports run in bounded memory.
+    
+    - **location_id**: One or more of the user's location IDs
+    - **start** / **end**: Optional ISO timestamps bounding the export
+    - **metrics**: Optional comma-separated subset of metrics
+    - **format**: ndjson (default), csv, or arrow (Arrow IPC stream, requires pyarrow)
+    """
+    try:
+        selected_metrics = export_service.resolve_metrics(
+            [m.strip() for m in metrics.split(",") if m.strip()] if metrics else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if format == "arrow" and not export_service.arrow_available:
+        raise HTTPException(status_code=406, detail="Arrow export is not available on this server")
+    
+    try:
+        owned_ids = export_service.get_owned_location_ids(current_user.user_id, location_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error preparing export: {str(e)}")
+    
+    if len(owned_ids) != len(set(location_id)):
+        raise HTTPException(status_code=404, detail="Location not found")
+    
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        export_service.stream(format, owned_ids, selected_metrics, start, end),
+        media_type=export_service.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="weather_export.{extension}"'}
+    )
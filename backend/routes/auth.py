@@ -1,10 +1,12 @@
 """Authentication endpoints."""
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from datetime import datetime
 from database.database import HomeNetDatabase
 from models.schemas import UserCreate, UserLogin
-from auth.helpers import create_access_token, hash_password, verify_token, BYPASS_AUTH
+from auth.helpers import Principal, create_access_token, get_current_user, token_cache, BYPASS_AUTH
+from auth.passwords import PasswordQueueFull, password_hasher
+from auth.rate_limit import LoginThrottled, login_limiter
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 db = HomeNetDatabase()
@@ -24,7 +26,7 @@ async def register(user: UserCreate):
         if cursor.fetchone():
             raise HTTPException(status_code=400, detail="Username or email already exists")
         
-        hashed_password = hash_password(user.password)
+        hashed_password = await password_hasher.hash(user.password)
         cursor.execute("""
             INSERT INTO users (username, email, password_hash, created_at)
             VALUES (%s, %s, %s, %s)
@@ -34,11 +36,13 @@ async def register(user: UserCreate):
         user_id = cursor.fetchone()[0]
         conn.commit()
         
-        access_token = create_access_token(data={"sub": user.username})
+        access_token = create_access_token(data={"sub": user.username, "user_id": user_id})
         return {"access_token": access_token, "token_type": "bearer", "user_id": user_id}
         
     except HTTPException:
         raise
+    except PasswordQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -49,27 +53,40 @@ async def register(user: UserCreate):
 
 
 @router.post("/login")
-async def login(user: UserLogin):
-    """Login an existing user."""
+async def login(user: UserLogin, request: Request):
+    """Login an existing user (throttled per username and client IP)."""
     conn = None
     cursor = None
     try:
+        login_limiter.check(user.username, request.client.host if request.client else None)
+        
         conn = db.get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT id, password_hash FROM users WHERE username = %s", (user.username,))
         result = cursor.fetchone()
         
-        if not result or result[1] != hash_password(user.password):
+        matches, new_hash = await password_hasher.verify(user.password, result[1] if result else None)
+        if not matches:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         user_id = result[0]
         
-        access_token = create_access_token(data={"sub": user.username})
+        # Upgrade legacy SHA-256 (or outdated scrypt) hashes now that we know the password
+        if new_hash:
+            cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (new_hash, user_id))
+            conn.commit()
+        
+        login_limiter.succeeded(user.username)
+        access_token = create_access_token(data={"sub": user.username, "user_id": user_id})
         return {"access_token": access_token, "token_type": "bearer", "user_id": user_id}
         
     except HTTPException:
         raise
+    except LoginThrottled as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except PasswordQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -79,11 +96,22 @@ async def login(user: UserLogin):
             conn.close()
 
 
+@router.get("/stats")
+async def auth_stats(current_user: Principal = Depends(get_current_user)):
+    """Login throttling, password hashing and token cache counters"""
+    return {
+        "success": True,
+        "rate_limit": login_limiter.stats(),
+        "passwords": password_hasher.stats(),
+        "token_cache": token_cache.stats()
+    }
+
+
 @router.get("/me")
-async def get_current_user(username: str = Depends(verify_token)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     """Get current authenticated user information."""
     # In bypass mode, return a mock user for dev_user
-    if BYPASS_AUTH and username == "dev_user":
+    if BYPASS_AUTH and current_user.username == "dev_user":
         return {
             "id": 0,
             "username": "dev_user",
@@ -97,7 +125,7 @@ async def get_current_user(username: str = Depends(verify_token)):
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT id, username, email, created_at FROM users WHERE username = %s", (username,))
+        cursor.execute("SELECT id, username, email, created_at FROM users WHERE id = %s", (current_user.user_id,))
         result = cursor.fetchone()
         
         if not result:
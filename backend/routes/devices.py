@@ -5,14 +5,15 @@ from datetime import datetime
 from typing import List, Optional
 from database.database import HomeNetDatabase
 from models.schemas import DeviceCreate, DeviceUpdate, DeviceResponse
-from auth.helpers import verify_token
+from auth.helpers import Principal, get_current_user
+from services.context_service import context_service
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 db = HomeNetDatabase()
 
 
 @router.get("", response_model=List[DeviceResponse])
-async def get_user_devices(username: str = Depends(verify_token)):
+async def get_user_devices(current_user: Principal = Depends(get_current_user)):
     """Get all devices owned by the authenticated user."""
     conn = None
     cursor = None
@@ -24,10 +25,9 @@ async def get_user_devices(username: str = Depends(verify_token)):
             SELECT d.id, d.name, d.type, d.status, d.room, d.value, 
                    d.color, d.locked, d.position, d.created_at, d.updated_at
             FROM devices d
-            JOIN users u ON d.user_id = u.id
-            WHERE u.username = %s
+            WHERE d.user_id = %s
             ORDER BY d.created_at DESC
-        """, (username,))
+        """, (current_user.user_id,))
         
         devices = []
         for row in cursor.fetchall():
@@ -57,7 +57,7 @@ async def get_user_devices(username: str = Depends(verify_token)):
 
 
 @router.get("/{device_id}", response_model=DeviceResponse)
-async def get_device(device_id: int, username: str = Depends(verify_token)):
+async def get_device(device_id: int, current_user: Principal = Depends(get_current_user)):
     """Get a specific device by ID."""
     conn = None
     cursor = None
@@ -69,9 +69,8 @@ async def get_device(device_id: int, username: str = Depends(verify_token)):
             SELECT d.id, d.name, d.type, d.status, d.room, d.value, 
                    d.color, d.locked, d.position, d.created_at, d.updated_at
             FROM devices d
-            JOIN users u ON d.user_id = u.id
-            WHERE d.id = %s AND u.username = %s
-        """, (device_id, username))
+            WHERE d.id = %s AND d.user_id = %s
+        """, (device_id, current_user.user_id))
         
         row = cursor.fetchone()
         if not row:
@@ -103,7 +102,7 @@ async def get_device(device_id: int, username: str = Depends(verify_token)):
 
 
 @router.post("", response_model=DeviceResponse)
-async def create_device(device: DeviceCreate, username: str = Depends(verify_token)):
+async def create_device(device: DeviceCreate, current_user: Principal = Depends(get_current_user)):
     """Create a new device for the authenticated user."""
     conn = None
     cursor = None
@@ -120,13 +119,7 @@ async def create_device(device: DeviceCreate, username: str = Depends(verify_tok
         if device.status not in ['on', 'off']:
             raise HTTPException(status_code=400, detail="Status must be 'on' or 'off'")
         
-        # Get user ID
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user_result = cursor.fetchone()
-        if not user_result:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        user_id = user_result[0]
+        user_id = current_user.user_id
         now = datetime.utcnow()
         
         # Insert device
@@ -142,6 +135,7 @@ async def create_device(device: DeviceCreate, username: str = Depends(verify_tok
         
         device_id = cursor.fetchone()[0]
         conn.commit()
+        context_service.invalidate(user_id)
         
         # Fetch the created device
         cursor.execute("""
@@ -181,7 +175,7 @@ async def create_device(device: DeviceCreate, username: str = Depends(verify_tok
 
 
 @router.put("/{device_id}", response_model=DeviceResponse)
-async def update_device(device_id: int, device_update: DeviceUpdate, username: str = Depends(verify_token)):
+async def update_device(device_id: int, device_update: DeviceUpdate, current_user: Principal = Depends(get_current_user)):
     """Update a device owned by the authenticated user."""
     conn = None
     cursor = None
@@ -191,10 +185,9 @@ async def update_device(device_id: int, device_update: DeviceUpdate, username: s
         
         # Check if device exists and belongs to user
         cursor.execute("""
-            SELECT d.id FROM devices d
-            JOIN users u ON d.user_id = u.id
-            WHERE d.id = %s AND u.username = %s
-        """, (device_id, username))
+            SELECT id FROM devices
+            WHERE id = %s AND user_id = %s
+        """, (device_id, current_user.user_id))
         
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail="Device not found or not owned by user")
@@ -254,6 +247,7 @@ async def update_device(device_id: int, device_update: DeviceUpdate, username: s
         
         cursor.execute(update_query, update_values)
         conn.commit()
+        context_service.invalidate(current_user.user_id)
         
         # Fetch updated device
         cursor.execute("""
@@ -293,7 +287,7 @@ async def update_device(device_id: int, device_update: DeviceUpdate, username: s
 
 
 @router.delete("/{device_id}")
-async def delete_device(device_id: int, username: str = Depends(verify_token)):
+async def delete_device(device_id: int, current_user: Principal = Depends(get_current_user)):
     """Delete a device owned by the authenticated user."""
     conn = None
     cursor = None
@@ -302,16 +296,15 @@ async def delete_device(device_id: int, username: str = Depends(verify_token)):
         cursor = conn.cursor()
         
         cursor.execute("""
-            DELETE FROM devices 
-            WHERE id = %s AND user_id = (
-                SELECT id FROM users WHERE username = %s
-            )
-        """, (device_id, username))
+            DELETE FROM devices
+            WHERE id = %s AND user_id = %s
+        """, (device_id, current_user.user_id))
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Device not found or not owned by user")
         
         conn.commit()
+        context_service.invalidate(current_user.user_id)
         cursor.close()
         conn.close()
         
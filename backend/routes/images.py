@@ -14,6 +14,7 @@ parent_dir = os.path.dirname(os.path.dirname(backend_dir))
 sys.path.insert(0, parent_dir)
 
 from config import config
+from observability.metrics import upstream_call
 
 router = APIRouter(prefix="/images", tags=["images"])
 logger = logging.getLogger(__name__)
@@ -49,7 +50,7 @@ async def get_location_image(location_name: str):
                     "client_id": unsplash_access_key,
                 }
                 
-                async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
+                async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client, upstream_call("unsplash") as call:
                     logger.info(f"Fetching location image from Unsplash for: {city_name}")
                     api_response = await client.get(unsplash_api_url, params=unsplash_params, headers=headers)
                     
@@ -78,6 +79,7 @@ async def get_location_image(location_name: str):
                                     }
                                 )
                     else:
+                        call.fail()
                         logger.warning(f"Unsplash API returned status {api_response.status_code}: {api_response.text}")
             except Exception as e:
                 logger.warning(f"Failed to fetch from Unsplash API: {str(e)}, trying fallbacks...")
@@ -104,7 +106,10 @@ async def get_location_image(location_name: str):
                         logger.info("Skipping Unsplash API (requires auth)")
                         continue
                     
-                    response = await client.get(img_url, headers=headers)
+                    async with upstream_call("image_fallback") as call:
+                        response = await client.get(img_url, headers=headers)
+                        if response.status_code != 200:
+                            call.fail()
                     
                     if response.status_code == 200 and len(response.content) > 0:
                         # Check if response is actually an image
@@ -4,7 +4,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from datetime import datetime
 from database.database import HomeNetDatabase
 from models.schemas import LocationCreate
-from auth.helpers import verify_token
+from auth.helpers import Principal, get_current_user
+from services.context_service import context_service
 from weather.weather_api import search_location
 
 router = APIRouter(prefix="/locations", tags=["locations"])
@@ -35,7 +36,7 @@ async def search_locations(query: str):
 
 
 @router.get("")
-async def get_user_locations(username: str = Depends(verify_token)):
+async def get_user_locations(current_user: Principal = Depends(get_current_user)):
     """Get all locations saved by the authenticated user."""
     conn = None
     cursor = None
@@ -44,12 +45,11 @@ async def get_user_locations(username: str = Depends(verify_token)):
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT ul.id, ul.name, ul.latitude, ul.longitude, ul.created_at
-            FROM user_locations ul
-            JOIN users u ON ul.user_id = u.id
-            WHERE u.username = %s
-            ORDER BY ul.created_at DESC
-        """, (username,))
+            SELECT id, name, latitude, longitude, created_at
+            FROM user_locations
+            WHERE user_id = %s
+            ORDER BY created_at DESC
+        """, (current_user.user_id,))
         
         locations = []
         for row in cursor.fetchall():
@@ -73,7 +73,7 @@ async def get_user_locations(username: str = Depends(verify_token)):
 
 
 @router.post("")
-async def add_user_location(location: LocationCreate, username: str = Depends(verify_token)):
+async def add_user_location(location: LocationCreate, current_user: Principal = Depends(get_current_user)):
     """Add a new location for the authenticated user."""
     conn = None
     cursor = None
@@ -81,12 +81,7 @@ async def add_user_location(location: LocationCreate, username: str = Depends(ve
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user_result = cursor.fetchone()
-        if not user_result:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        user_id = user_result[0]
+        user_id = current_user.user_id
         
         cursor.execute("""
             INSERT INTO user_locations (user_id, name, latitude, longitude, created_at)
@@ -96,6 +91,7 @@ async def add_user_location(location: LocationCreate, username: str = Depends(ve
         
         location_id = cursor.fetchone()[0]
         conn.commit()
+        context_service.invalidate(user_id)
         
         return {"id": location_id, "message": "Location added successfully"}
         
@@ -111,7 +107,7 @@ async def add_user_location(location: LocationCreate, username: str = Depends(ve
 
 
 @router.delete("/{location_id}")
-async def delete_user_location(location_id: str, username: str = Depends(verify_token)):
+async def delete_user_location(location_id: str, current_user: Principal = Depends(get_current_user)):
     """Delete a location owned by the authenticated user."""
     conn = None
     cursor = None
@@ -120,16 +116,15 @@ async def delete_user_location(location_id: str, username: str = Depends(verify_
         cursor = conn.cursor()
         
         cursor.execute("""
-            DELETE FROM user_locations 
-            WHERE id = %s AND user_id = (
-                SELECT id FROM users WHERE username = %s
-            )
-        """, (location_id, username))
+            DELETE FROM user_locations
+            WHERE id = %s AND user_id = %s
+        """, (location_id, current_user.user_id))
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Location not found or not owned by user")
         
         conn.commit()
+        context_service.invalidate(current_user.user_id)
         
         return {"message": "Location deleted successfully"}
         
@@ -1,9 +1,10 @@
 """Pico Pi authentication endpoints for HomeNetAI."""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from database.database import HomeNetDatabase
-from auth.helpers import hash_password
+from auth.passwords import PasswordQueueFull, password_hasher
+from auth.rate_limit import LoginThrottled, login_limiter
 
 router = APIRouter(prefix="/pico", tags=["pico"])
 db = HomeNetDatabase()
@@ -23,7 +24,7 @@ class PicoLoginResponse(BaseModel):
 
 
 @router.post("/login", response_model=PicoLoginResponse)
-async def pico_login(credentials: PicoLoginRequest):
+async def pico_login(credentials: PicoLoginRequest, request: Request):
     """
     Login endpoint for Pico devices (.exe file).
     Validates username/password and returns the user_id from database.
@@ -31,6 +32,9 @@ async def pico_login(credentials: PicoLoginRequest):
     conn = None
     cursor = None
     try:
+        # Shares the /auth/login limits - same credentials
+        login_limiter.check(credentials.username, request.client.host if request.client else None)
+        
         conn = db.get_connection()
         cursor = conn.cursor()
         
@@ -41,14 +45,16 @@ async def pico_login(credentials: PicoLoginRequest):
         )
         result = cursor.fetchone()
         
-        if not result:
+        # Verify password (unknown users are checked against a dummy hash)
+        matches, new_hash = await password_hasher.verify(credentials.password, result[2] if result else None)
+        if not matches:
             raise HTTPException(status_code=401, detail="Invalid username or password")
         
-        user_id, username, stored_hash = result
-        
-        # Verify password
-        if stored_hash != hash_password(credentials.password):
-            raise HTTPException(status_code=401, detail="Invalid username or password")
+        user_id, username, _ = result
+        if new_hash:
+            cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (new_hash, user_id))
+            conn.commit()
+        login_limiter.succeeded(credentials.username)
         
         # Return user_id as string
         return PicoLoginResponse(
@@ -59,6 +65,10 @@ async def pico_login(credentials: PicoLoginRequest):
         
     except HTTPException:
         raise
+    except LoginThrottled as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except PasswordQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
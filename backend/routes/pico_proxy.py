@@ -4,7 +4,8 @@ Forwards requests to cloud Pico API to avoid CORS issues
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from auth.helpers import verify_token
+from auth.helpers import Principal, get_current_user
+from observability.metrics import upstream_call
 import httpx
 from typing import Dict, Any
 
@@ -13,10 +14,10 @@ router = APIRouter(prefix="/proxy/pico", tags=["pico-proxy"])
 PICO_API_BASE = "https://iot-picopi-module.onrender.com/api/v1"
 
 @router.get("/users/{user_id}/device-modules")
-async def get_user_devices(user_id: str, username: str = Depends(verify_token)):
+async def get_user_devices(user_id: str, current_user: Principal = Depends(get_current_user)):
     """Proxy: Get all device modules for a user"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=30.0) as client, upstream_call("pico_cloud"):
             response = await client.get(
                 f"{PICO_API_BASE}/users/{user_id}/device-modules",
                 headers={"Content-Type": "application/json"}
@@ -28,10 +29,10 @@ async def get_user_devices(user_id: str, username: str = Depends(verify_token)):
 
 
 @router.post("/commands")
-async def send_command(command_data: Dict[str, Any], username: str = Depends(verify_token)):
+async def send_command(command_data: Dict[str, Any], current_user: Principal = Depends(get_current_user)):
     """Proxy: Send command to a device"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=30.0) as client, upstream_call("pico_cloud"):
             response = await client.post(
                 f"{PICO_API_BASE}/commands",
                 json=command_data,
@@ -44,10 +45,10 @@ async def send_command(command_data: Dict[str, Any], username: str = Depends(ver
 
 
 @router.get("/devices/{device_id}/data")
-async def get_device_data(device_id: str, limit: int = 1, username: str = Depends(verify_token)):
+async def get_device_data(device_id: str, limit: int = 1, current_user: Principal = Depends(get_current_user)):
     """Proxy: Get device data (last reading)"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=30.0) as client, upstream_call("pico_cloud"):
             response = await client.get(
                 f"{PICO_API_BASE}/devices/{device_id}/data",
                 params={"limit": limit},
@@ -60,10 +61,10 @@ async def get_device_data(device_id: str, limit: int = 1, username: str = Depend
 
 
 @router.get("/device-modules/{module_id}/latest")
-async def get_latest_reading(module_id: str, username: str = Depends(verify_token)):
+async def get_latest_reading(module_id: str, current_user: Principal = Depends(get_current_user)):
     """Proxy: Get latest reading for a device module"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=30.0) as client, upstream_call("pico_cloud"):
             response = await client.get(
                 f"{PICO_API_BASE}/device-modules/{module_id}/latest",
                 headers={"Content-Type": "application/json"}
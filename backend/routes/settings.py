@@ -2,42 +2,16 @@
 Settings API Routes - User preferences management
 """
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
 from typing import Optional
-import jwt
-import hashlib
 
+from auth.helpers import Principal, get_current_user, token_cache
+from auth.passwords import PasswordQueueFull, password_hasher
 from services.settings_service import settings_service
-from config import config
+from services.context_service import context_service
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
-# Security
-security = HTTPBearer()
-
-
-# Authentication dependency
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Verify JWT token and return current user"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, config.SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("user_id")
-        username = payload.get("sub") or payload.get("username")
-        
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token: missing user_id")
-        
-        return {"user_id": user_id, "username": username}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    except Exception as e:
-        print(f"Authentication error: {e}")
-        raise HTTPException(status_code=401, detail="Authentication failed")
-
 
 # Request models
 class PreferencesUpdate(BaseModel):
@@ -57,14 +31,14 @@ class PasswordUpdate(BaseModel):
 
 
 @router.get("")
-async def get_preferences(current_user: dict = Depends(get_current_user)):
+async def get_preferences(current_user: Principal = Depends(get_current_user)):
     """
     Get current user's preferences
     
     Returns all preference settings including units, theme, and alert preferences
     """
     try:
-        user_id = current_user.get("user_id")
+        user_id = current_user.user_id
         preferences = settings_service.get_user_preferences(user_id)
         
         # Return preferences directly to match frontend expectations
@@ -77,7 +51,7 @@ async def get_preferences(current_user: dict = Depends(get_current_user)):
 @router.put("")
 async def update_preferences(
     preferences: PreferencesUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Update user preferences
@@ -85,7 +59,7 @@ async def update_preferences(
     Only provided fields will be updated
     """
     try:
-        user_id = current_user.get("user_id")
+        user_id = current_user.user_id
         
         # Convert to dict, excluding None values
         update_data = {k: v for k, v in preferences.dict().items() if v is not None}
@@ -114,7 +88,7 @@ async def update_preferences(
 @router.post("/password")
 async def change_password(
     password_data: PasswordUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Change user password
@@ -122,13 +96,16 @@ async def change_password(
     Requires current password for verification
     """
     try:
-        user_id = current_user.get("user_id")
+        user_id = current_user.user_id
         
-        # Verify current password (simplified - in production, verify against DB)
-        current_hash = hashlib.sha256(password_data.current_password.encode()).hexdigest()
+        # Verify current password against the stored hash
+        current_hash = settings_service.get_password_hash(user_id)
+        matches, _ = await password_hasher.verify(password_data.current_password, current_hash)
+        if not matches:
+            raise HTTPException(status_code=400, detail="Current password is incorrect")
         
         # Hash new password
-        new_hash = hashlib.sha256(password_data.new_password.encode()).hexdigest()
+        new_hash = await password_hasher.hash(password_data.new_password)
         
         success = settings_service.update_password(user_id, new_hash)
         
@@ -142,23 +119,27 @@ async def change_password(
             
     except HTTPException:
         raise
+    except PasswordQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error changing password: {str(e)}")
 
 
 @router.delete("/account")
-async def delete_account(current_user: dict = Depends(get_current_user)):
+async def delete_account(current_user: Principal = Depends(get_current_user)):
     """
     Delete user account and all associated data
     
     WARNING: This action is irreversible
     """
     try:
-        user_id = current_user.get("user_id")
+        user_id = current_user.user_id
         
         success = settings_service.delete_user_data(user_id)
         
         if success:
+            context_service.invalidate(user_id, current_user.username)
+            token_cache.forget_user(user_id)
             return {
                 "success": True,
                 "message": "Account deleted successfully"
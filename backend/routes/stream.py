@@ -0,0 +1,137 @@
+"""
+Real-time push endpoints - alert and weather deltas over SSE or WebSocket
+
+Clients load the current state over REST once, then keep one stream open
+instead of polling /alerts and /weather. Events:
+- {"type": "weather", "location_id": ..., "changes": {...}}  changed current-weather fields
+- {"type": "alert", "alert": {...}}                          a newly fired alert
+- {"type": "resync"}                                          events were dropped, refetch over REST
+"""
+
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from auth.helpers import Principal, decode_token, get_current_user
+from config import config
+from services.stream_hub import stream_hub
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+
+def authenticate(token: Optional[str]) -> Optional[int]:
+    """
+    Resolve a JWT to a user id
+
+    Browsers cannot set headers on EventSource/WebSocket, so the token may
+    come from the `token` query parameter.
+
+    Returns:
+        User ID, or None if the token is missing or invalid
+    """
+    if not token:
+        return None
+    try:
+        return decode_token(token).user_id
+    except HTTPException:
+        return None
+
+
+def bearer_token(token: Optional[str], authorization: Optional[str]) -> Optional[str]:
+    if token:
+        return token
+    if authorization and authorization.startswith("Bearer "):
+        return authorization[7:]
+    return None
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Server-Sent Events stream of the current user's alert and weather deltas
+
+    A comment line is sent every STREAM_HEARTBEAT_SECONDS to keep proxies from
+    closing idle connections.
+    """
+    user_id = authenticate(bearer_token(token, authorization))
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    connection = stream_hub.connect(user_id)
+    if connection is None:
+        raise HTTPException(status_code=503, detail="Too many open streams, retry later")
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                event = await connection.next_event(config.STREAM_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            stream_hub.disconnect(connection)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@router.websocket("/ws")
+async def stream_websocket(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    WebSocket stream of the current user's alert and weather deltas
+
+    Sends JSON events; a {"type": "ping"} is sent every STREAM_HEARTBEAT_SECONDS
+    of inactivity. Messages from the client are ignored.
+    """
+    user_id = authenticate(bearer_token(token, websocket.headers.get("authorization")))
+    if user_id is None:
+        await websocket.close(code=4401)
+        return
+
+    connection = stream_hub.connect(user_id)
+    if connection is None:
+        await websocket.close(code=1013)
+        return
+
+    await websocket.accept()
+    receiver = None
+    try:
+        # Drain incoming frames so a client close is noticed promptly
+        async def receive():
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+        receiver = asyncio.create_task(receive())
+
+        while not receiver.done():
+            sender = asyncio.create_task(connection.next_event(config.STREAM_HEARTBEAT_SECONDS))
+            done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if sender not in done:
+                sender.cancel()
+                break
+            await websocket.send_json(sender.result() or {"type": "ping"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if receiver is not None:
+            receiver.cancel()
+        stream_hub.disconnect(connection)
+
+
+@router.get("/stats")
+async def stream_stats(current_user: Principal = Depends(get_current_user)):
+    """Open stream connections and delivery counters for this worker"""
+    return {"success": True, **stream_hub.stats()}
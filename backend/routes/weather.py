@@ -1,27 +1,39 @@
 """Weather data endpoints."""
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
+from typing import Optional
+import numpy as np
 from database.database import HomeNetDatabase
-from auth.helpers import verify_token
+from auth.helpers import Principal, get_current_user
 from weather.weather_api import get_weather_data
+from services.columnar import columnar_response, negotiate_format, pa
 
 router = APIRouter(prefix="/weather", tags=["weather"])
 db = HomeNetDatabase()
 
 
 @router.get("/{location_id}")
-async def get_weather_for_location(location_id: str, username: str = Depends(verify_token)):
-    """Get current weather and forecast for a user's location."""
+async def get_weather_for_location(location_id: str, current_user: Principal = Depends(get_current_user),
+                                   accept: Optional[str] = Header(None)):
+    """
+    Get current weather and forecast for a user's location.
+    
+    Open-Meteo already returns the forecast as column arrays; clients sending
+    `Accept: application/vnd.apache.arrow.stream` get the hourly forecast as an
+    Arrow IPC stream with the rest of the payload in the schema metadata.
+    """
+    response_format = negotiate_format(None, accept)
+    if response_format == "arrow" and pa is None:
+        raise HTTPException(status_code=406, detail="Arrow responses are not available on this server")
     try:
         conn = db.get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT ul.name, ul.latitude, ul.longitude
-            FROM user_locations ul
-            JOIN users u ON ul.user_id = u.id
-            WHERE ul.id = %s AND u.username = %s
-        """, (location_id, username))
+            SELECT name, latitude, longitude
+            FROM user_locations
+            WHERE id = %s AND user_id = %s
+        """, (location_id, current_user.user_id))
         
         location = cursor.fetchone()
         if not location:
@@ -32,6 +44,18 @@ async def get_weather_for_location(location_id: str, username: str = Depends(ver
         
         weather_data = get_weather_data(location[1], location[2])
         
+        if response_format == "arrow":
+            hourly = weather_data.get("hourly", {})
+            columns = {"time": np.array(hourly.get("time", []), dtype="datetime64[s]")}
+            for name, values in hourly.items():
+                if name != "time":
+                    columns[name] = np.array(values, dtype=float)
+            return columnar_response(response_format, {
+                "location": location[0],
+                "current_weather": weather_data.get("current_weather", {}),
+                "daily_forecast": weather_data.get("daily", {})
+            }, columns)
+        
         return {
             "location": location[0],
             "current_weather": weather_data.get("current_weather", {}),
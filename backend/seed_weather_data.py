@@ -4,15 +4,91 @@ Populates the weather_data table with sample historical data for analytics
 """
 
 import psycopg2
+from psycopg2.extras import execute_values
 import sys
 import os
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
 import random
+import numpy as np
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from config import config
 
+SYNTHETIC_METRICS = ["temperature", "apparent_temperature", "humidity", "precipitation", "wind_speed", "uv_index"]
+
+
+def generate_hourly_history(latitude: float, end: datetime, hours: int,
+                            seed: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Generate a realistic hourly weather history ending at `end`
+    
+    Temperature combines an annual cycle (colder and more seasonal away from the
+    equator), a diurnal cycle peaking mid-afternoon and multi-day weather
+    systems (AR(1) noise); humidity, wind, precipitation and UV follow from it.
+    Used by the benchmark and backtest scripts as well as for hourly seeding.
+    
+    Args:
+        latitude: Location latitude, sets the climate
+        end: Timestamp of the last hourly reading (naive, local time)
+        hours: Number of hourly readings
+        seed: Optional random seed for reproducible histories
+        
+    Returns:
+        Dictionary of equal-length arrays: "timestamp" (datetime64[h]) plus SYNTHETIC_METRICS
+    """
+    rng = np.random.default_rng(seed)
+    end_hour = np.datetime64(end.replace(minute=0, second=0, microsecond=0), "h")
+    timestamp = end_hour - np.arange(hours - 1, -1, -1).astype("timedelta64[h]")
+    
+    hour_of_day = (timestamp.astype(np.int64) % 24).astype(float)
+    day_of_year = ((timestamp - timestamp.astype("datetime64[Y]")).astype(np.int64) / 24.0)
+    
+    # Multi-day weather systems: AR(1) with a ~2 day memory
+    systems = np.empty(hours)
+    shocks = rng.normal(0, 1.2, hours)
+    systems[0] = shocks[0] * 5
+    for i in range(1, hours):
+        systems[i] = 0.98 * systems[i - 1] + shocks[i]
+    
+    base_temp = 60 - abs(latitude - 25) * 0.6
+    seasonal_swing = 8 + abs(latitude) * 0.35
+    annual = -seasonal_swing * np.cos(2 * np.pi * (day_of_year - 15) / 365.25) * np.sign(latitude or 1)
+    diurnal = 9 * np.sin(2 * np.pi * (hour_of_day - 9) / 24)
+    temperature = base_temp + annual + diurnal + systems + rng.normal(0, 0.8, hours)
+    
+    humidity = np.clip(65 - 1.2 * diurnal - 0.8 * systems + rng.normal(0, 4, hours), 5, 100)
+    wind_speed = np.clip(8 + 0.4 * np.abs(systems) + 2 * np.sin(2 * np.pi * (hour_of_day - 14) / 24)
+                         + rng.gamma(2, 1.5, hours), 0, None)
+    raining = (humidity > 80) & (rng.random(hours) < 0.35)
+    precipitation = np.where(raining, rng.exponential(0.05, hours), 0.0)
+    daylight = np.clip(np.sin(np.pi * (hour_of_day - 6) / 12), 0, None)
+    uv_index = np.round(daylight * (6 + 3 * np.cos(np.radians(latitude))) * (1 - 0.5 * raining), 1)
+    apparent_temperature = temperature - 0.3 * wind_speed + rng.normal(0, 0.5, hours)
+    
+    return {
+        "timestamp": timestamp,
+        "temperature": np.round(temperature, 2),
+        "apparent_temperature": np.round(apparent_temperature, 2),
+        "humidity": np.round(humidity, 2),
+        "precipitation": np.round(precipitation, 2),
+        "wind_speed": np.round(wind_speed, 2),
+        "uv_index": uv_index,
+    }
+
+
+def insert_history(cursor, location_id: int, history: Dict[str, np.ndarray]) -> int:
+    """Bulk insert a generated history for one location, returns rows inserted"""
+    timestamps = history["timestamp"].astype(datetime)
+    columns = [history[m].tolist() for m in SYNTHETIC_METRICS]
+    rows = [(location_id, ts, *values) for ts, *values in zip(timestamps, *columns)]
+    execute_values(cursor, f"""
+        INSERT INTO weather_data (location_id, timestamp, {", ".join(SYNTHETIC_METRICS)})
+        VALUES %s
+    """, rows, page_size=1000)
+    return len(rows)
+
 
 def seed_weather_data():
     """Seed weather data for all user locations"""
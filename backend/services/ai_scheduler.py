@@ -0,0 +1,218 @@
+"""
+AI Request Scheduler for HomeNetAI
+Runs every Gemini call through bounded workers, a token bucket and a priority queue
+"""
+
+import asyncio
+import itertools
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+from config import config
+from observability.metrics import upstream_call
+
+# Priorities - lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class AIQueueFull(Exception):
+    """Raised when too many AI requests are already waiting (treated like a rate limit)"""
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for quota/429 errors from the Gemini client"""
+    text = str(error).lower()
+    return "429" in text or "quota" in text or "resource exhausted" in text or "rate limit" in text
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """Empty the bucket after the upstream reported a rate limit"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = time.monotonic()
+
+
+class AIScheduler:
+    """
+    Priority queue in front of a fixed pool of worker threads
+
+    Interactive chat is dequeued ahead of background work (conversation
+    summaries). Each call takes a token from a bucket sized to the Gemini
+    quota; calls failing with 429/quota errors are retried with exponential
+    backoff and jitter, and the bucket is drained so other workers back off
+    too. Waiting work is bounded by AI_QUEUE_SIZE.
+    """
+
+    def __init__(self, workers: int = config.AI_MAX_CONCURRENCY,
+                 requests_per_minute: int = config.AI_REQUESTS_PER_MINUTE,
+                 burst: int = config.AI_RATE_BURST,
+                 max_queue: int = config.AI_QUEUE_SIZE,
+                 max_retries: int = config.AI_MAX_RETRIES):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._queue_waits = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self.throttled_seconds = 0.0
+
+    def submit(self, fn: Callable[[], Any], priority: int = INTERACTIVE) -> Future:
+        """
+        Queue a blocking call
+
+        Returns:
+            concurrent.futures.Future with fn's result; cancelling it before a
+            worker picks it up skips the call
+
+        Raises:
+            AIQueueFull: when AI_QUEUE_SIZE calls are already waiting
+        """
+        self._ensure_workers()
+        future: Future = Future()
+        with self._lock:
+            if sum(self._waiting.values()) >= self.max_queue:
+                self.rejected += 1
+                raise AIQueueFull("AI request queue is full (rate limit), try again shortly")
+            self._waiting[priority] += 1
+        self._queue.put((priority, next(self._sequence), time.monotonic(), fn, future))
+        return future
+
+    async def run(self, fn: Callable[[], Any], priority: int = INTERACTIVE) -> Any:
+        """Await a blocking call; cancelling the awaiting task drops it from the queue"""
+        return await asyncio.wrap_future(self.submit(fn, priority))
+
+    def call(self, fn: Callable[[], Any], priority: int = BACKGROUND) -> Any:
+        """Run a blocking call from a (non-event-loop) thread and wait for it"""
+        return self.submit(fn, priority).result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting = {PRIORITY_NAMES[p]: n for p, n in self._waiting.items()}
+            queue_waits = sorted(self._queue_waits)
+            run_times = sorted(self._run_times)
+        return {
+            "workers": self.workers,
+            "queued": waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "rejected": self.rejected,
+            "throttled_seconds": round(self.throttled_seconds, 2),
+            "queue_wait_ms": _percentiles(queue_waits),
+            "run_time_ms": _percentiles(run_times),
+        }
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f"ai-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            priority, _, enqueued, fn, future = self._queue.get()
+            running = future.set_running_or_notify_cancel()
+            with self._lock:
+                self._waiting[priority] -= 1
+                if not running:
+                    self.cancelled += 1
+                    continue
+                self._queue_waits.append((time.monotonic() - enqueued) * 1000)
+                self.in_flight += 1
+
+            try:
+                result = self._run_with_retries(fn)
+            except Exception as e:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.failed += 1
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+                future.set_result(result)
+
+    def _run_with_retries(self, fn: Callable[[], Any]) -> Any:
+        attempt = 0
+        while True:
+            self.throttled_seconds += self.bucket.acquire()
+            started = time.monotonic()
+            try:
+                with upstream_call("gemini"):
+                    result = fn()
+                self._run_times.append((time.monotonic() - started) * 1000)
+                return result
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                self.rate_limited += 1
+                self.bucket.drain()
+                if attempt >= self.max_retries:
+                    raise
+                delay = config.AI_RETRY_BASE_SECONDS * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay))
+                attempt += 1
+                self.retries += 1
+
+
+def _percentiles(values) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0}
+    return {
+        "p50": round(values[len(values) // 2], 1),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+    }
+
+
+# Global AI scheduler
+ai_scheduler = AIScheduler()
@@ -4,11 +4,15 @@ Integrates with Google Gemini API to provide intelligent insights about weather
 """
 
 import google.generativeai as genai
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
 from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeout
+import asyncio
 import json
 import sys
 import os
+import threading
+from collections import OrderedDict
 
 # Add parent directory to path for config import
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,18 +20,75 @@ parent_dir = os.path.dirname(backend_dir)
 sys.path.insert(0, parent_dir)
 
 from config import config
+from services.fake_model import FakeGenerativeModel
+from services.response_cache import response_cache
+from services.prompt_builder import prompt_builder, estimate_tokens, RenderedContext
+from services.ai_scheduler import ai_scheduler, is_rate_limited, INTERACTIVE, BACKGROUND
+
+NOT_CONFIGURED_MESSAGE = "AI service is not configured. Please add your Gemini API key to the configuration."
+
+# Marks the end of a streamed response on the hand-over queue
+_STREAM_END = object()
+
+
+def truncate_summary(previous_summary: str, messages: List[Dict[str, str]]) -> str:
+    """Conversation summary without an AI model: keep a clipped line per turn"""
+    lines = [previous_summary] if previous_summary else []
+    for message in messages:
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        text = " ".join(message["content"].split())
+        lines.append(f"{speaker}: {text[:200]}")
+    return "\n".join(lines)
+
+
+def with_references(user_message: str, references: Optional[List[str]]) -> str:
+    """The message sent to the model: retrieved snippets first, then the question"""
+    if not references:
+        return user_message
+    lines = "\n".join(f"- {reference}" for reference in references)
+    return f"Relevant records from my history:\n{lines}\n\nQuestion: {user_message}"
+
+
+def _close_stream(*streams):
+    """Close a streamed model response (and its chunk iterator) that is abandoned part way"""
+    for stream in streams:
+        close = getattr(stream, "close", None)
+        if close is None:
+            continue
+        try:
+            close()
+        except Exception as e:
+            print(f"Error closing AI stream: {e}")
 
 
 class AIService:
     """Service for AI-powered chat and insights"""
     
-    def __init__(self):
-        """Initialize Gemini client with API key"""
+    def __init__(self, model_factory: Optional[Callable] = None):
+        """
+        Initialize Gemini client with API key
+        
+        Args:
+            model_factory: Optional function (system_instruction) -> model used
+                instead of Gemini, e.g. a local fake model in tests
+        """
+        self._chat_models = OrderedDict()
+        self._chat_models_lock = threading.Lock()
+        self.model_factory = model_factory
+        if self.model_factory is None and config.AI_FAKE_MODEL:
+            self.model_factory = lambda system_instruction: FakeGenerativeModel(system_instruction)
+            print("✓ AI service using the local fake model (AI_FAKE_MODEL=true)")
+        
         self.api_key_configured = bool(config.GEMINI_API_KEY and config.GEMINI_API_KEY.strip())
-        if self.api_key_configured:
+        if self.model_factory is not None:
+            self.model = self.model_factory(None)
+        elif self.api_key_configured:
             try:
                 genai.configure(api_key=config.GEMINI_API_KEY)
-                self.model = genai.GenerativeModel(config.GEMINI_MODEL)
+                self.model_factory = lambda system_instruction: genai.GenerativeModel(
+                    config.GEMINI_MODEL, system_instruction=system_instruction
+                )
+                self.model = self.model_factory(None)
                 print(f"✓ Gemini AI service initialized successfully with model: {config.GEMINI_MODEL}")
                 print(f"  API Key: {config.GEMINI_API_KEY[:20]}... (length: {len(config.GEMINI_API_KEY)})")
             except Exception as e:
@@ -46,7 +107,10 @@ class AIService:
         self, 
         user_message: str, 
         context: Optional[Dict] = None,
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+        summary: Optional[str] = None,
+        references: Optional[List[str]] = None
     ) -> str:
         """
         Generate AI chat response with context about user's weather and home data
@@ -54,245 +118,253 @@ class AIService:
         Args:
             user_message: The user's message
             context: Optional context about user's locations, weather, devices
-            conversation_history: Previous messages in the conversation
+            conversation_history: Recent messages in the conversation (the
+                conversation store keeps this bounded)
+            system_prompt: Prebuilt system prompt (e.g. from a cached context
+                snapshot); built from context when omitted
+            summary: Rolling summary of turns older than conversation_history
+            references: Snippets retrieved for this question (history,
+                forecasts, alerts, devices), sent along with the message
             
         Returns:
-            AI-generated response string
+            AI-generated response string; errors are raised to the caller
+            (error_message() turns one into a reply for the user)
+        
+        Standalone questions (no history or summary) go through the response
+        cache, so the same question against the same context is answered once.
         """
         if not self.model:
-            return "AI service is not configured. Please add your Gemini API key to the configuration."
+            return NOT_CONFIGURED_MESSAGE
         
-        try:
-            # Build system prompt with context
-            system_prompt = self._build_system_prompt(context)
-            
-            # Build conversation history for Gemini
-            chat_history = []
-            if conversation_history:
-                for msg in conversation_history[-10:]:  # Last 10 messages for context
-                    role = msg.get("role", "user")
-                    content = msg.get("content", "")
-                    # Gemini uses 'user' and 'model' roles
-                    gemini_role = "model" if role == "assistant" else "user"
-                    chat_history.append({"role": gemini_role, "parts": [content]})
-            
-            # Start chat with history
-            chat = self.model.start_chat(history=chat_history)
-            
-            # Combine system prompt with user message
-            full_message = f"{system_prompt}\n\nUser: {user_message}"
-            
-            # Run Gemini API call in thread to avoid blocking
-            import asyncio
-            def call_gemini():
-                return chat.send_message(full_message).text.strip()
-            
-            if hasattr(asyncio, 'to_thread'):
-                response = await asyncio.to_thread(call_gemini)
-            else:
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(None, call_gemini)
-            
-            return response
-            
-        except Exception as e:
-            error_msg = str(e).lower()
-            print(f"AI ERROR: {e}", flush=True)
-            
-            if "api key" in error_msg or "authentication" in error_msg or "invalid" in error_msg:
-                return "AI service authentication failed. Please check that your Gemini API key is valid."
-            elif "quota" in error_msg or "rate" in error_msg or "429" in str(e):
-                return "AI service is temporarily unavailable due to rate limits. Please try again in a minute."
-            else:
-                return f"I'm having trouble connecting to the AI service. Error: {str(e)[:100]}"
+        message = with_references(user_message, references)
+        
+        def call_gemini():
+            chat = self._start_chat(message, context, conversation_history, system_prompt, summary)
+            return chat.send_message(message).text.strip()
+        
+        # Run Gemini API call on the scheduler's bounded workers, rate limited
+        key = self._cache_key(user_message, context, conversation_history, summary, references)
+        if key is None:
+            return await ai_scheduler.run(call_gemini, INTERACTIVE)
+        return await response_cache.get_or_compute(key, lambda: ai_scheduler.run(call_gemini, INTERACTIVE))
     
-    def _build_system_prompt(self, context: Optional[Dict] = None) -> str:
+    async def stream_chat_response(
+        self,
+        user_message: str,
+        context: Optional[Dict] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None,
+        summary: Optional[str] = None,
+        references: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
         """
-        Build system prompt with user context
+        Stream the chat response as text chunks while the model produces them
         
-        Args:
-            context: User's weather locations, devices, and recent data
-            
-        Returns:
-            Formatted system prompt string
+        The blocking model stream is consumed on an AI scheduler worker and
+        handed over through a small queue, so a slow client slows the
+        producer instead of buffering the whole reply. Closing the generator
+        (e.g. the client disconnected) stops reading from the model, which
+        ends the upstream generation. A cached answer to a standalone
+        question is yielded as a single chunk.
+        
+        Args: see generate_chat_response
+        
+        Yields:
+            Text chunks; errors are raised to the caller
         """
-        base_prompt = """You are HomeNetAI Assistant, an intelligent AI helper for a smart home and weather monitoring system.
-
-Your role is to:
-- Provide insights about weather patterns and forecasts
-- Help users understand their home's energy usage and device status
-- Suggest optimizations for energy efficiency
-- Alert users to important weather conditions
-- Answer questions about their locations and devices
-- Be friendly, helpful, and concise
-
-Always provide accurate information based on the user's data when available."""
-
-        if not context:
-            return base_prompt
+        if not self.model:
+            yield NOT_CONFIGURED_MESSAGE
+            return
+        
+        message = with_references(user_message, references)
+        key = self._cache_key(user_message, context, conversation_history, summary, references)
+        cached = response_cache.lookup(key) if key else None
+        if cached is not None:
+            yield cached
+            return
         
-        # Add user's locations context
-        if context.get("locations"):
-            locations_text = "\n\nUser's Monitored Locations:\n"
-            for loc in context["locations"]:
-                locations_text += f"- {loc.get('name', 'Unknown')}: {loc.get('latitude', 'N/A')}°, {loc.get('longitude', 'N/A')}°\n"
-            base_prompt += locations_text
+        loop = asyncio.get_running_loop()
+        chunks: "asyncio.Queue" = asyncio.Queue(maxsize=config.AI_STREAM_BUFFER)
+        stop = threading.Event()
         
-        # Add current weather context
-        if context.get("current_weather"):
-            weather = context["current_weather"]
-            weather_text = f"\n\nCurrent Weather Data:\n"
-            weather_text += f"- Temperature: {weather.get('temperature', 'N/A')}°C\n"
-            weather_text += f"- Conditions: {self._weather_code_to_text(weather.get('weather_code'))}\n"
-            weather_text += f"- Humidity: {weather.get('humidity', 'N/A')}%\n"
-            weather_text += f"- Wind Speed: {weather.get('wind_speed', 'N/A')} km/h\n"
-            base_prompt += weather_text
+        def hand_over(item) -> bool:
+            # Blocks while the queue is full; gives up once the consumer has gone.
+            # One put per item, never resubmitted, so a put that lands just as
+            # the wait times out cannot deliver the chunk twice
+            if stop.is_set():
+                return False
+            future = asyncio.run_coroutine_threadsafe(chunks.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.5)
+                    return True
+                except FutureTimeout:
+                    if stop.is_set():
+                        future.cancel()
+                        return False
         
-        # Add forecast context
-        if context.get("forecast"):
-            forecast_text = "\n\nUpcoming Forecast:\n"
-            for day in context["forecast"][:3]:  # Next 3 days
-                forecast_text += f"- {day.get('date', 'N/A')}: {day.get('temp_max', 'N/A')}°C max, {day.get('temp_min', 'N/A')}°C min\n"
-            base_prompt += forecast_text
+        def produce():
+            delivered = False
+            response = stream = None
+            try:
+                chat = self._start_chat(message, context, conversation_history, system_prompt, summary)
+                response = chat.send_message(message, stream=True)
+                stream = iter(response)
+                for chunk in stream:
+                    if stop.is_set() or not hand_over(chunk.text):
+                        # Stop the upstream generation, not just our reading of it
+                        _close_stream(stream, response)
+                        return
+                    delivered = True
+            except Exception as e:
+                _close_stream(stream, response)
+                # Nothing sent yet: let the scheduler retry a rate-limited call
+                if not delivered and is_rate_limited(e):
+                    raise
+                hand_over(e)
+                return
+            hand_over(_STREAM_END)
         
-        # Add devices context (if implemented)
-        if context.get("devices"):
-            devices_text = "\n\nConnected Devices:\n"
-            for device in context["devices"]:
-                status = "On" if device.get("status") == "on" else "Off"
-                devices_text += f"- {device.get('name', 'Unknown')} ({device.get('type', 'Unknown')}): {status}\n"
-            base_prompt += devices_text
+        def job_done(job):
+            # Retries exhausted (or the job never ran): wake the consumer with the error
+            if not job.cancelled() and job.exception() is not None:
+                loop.call_soon_threadsafe(chunks.put_nowait, job.exception())
         
-        return base_prompt
+        job = ai_scheduler.submit(produce, INTERACTIVE)
+        job.add_done_callback(job_done)
+        parts = []
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if item:
+                    parts.append(item)
+                    yield item
+            if key:
+                response_cache.put(key, "".join(parts).strip())
+        finally:
+            # A queued job is dropped; a running producer notices within one
+            # hand-over timeout and closes the upstream stream
+            job.cancel()
+            stop.set()
+    
+    @staticmethod
+    def error_message(e: Exception) -> str:
+        """User-facing message for a failed model call"""
+        error_msg = str(e).lower()
+        if "api key" in error_msg or "authentication" in error_msg or "invalid" in error_msg:
+            return "AI service authentication failed. Please check that your Gemini API key is valid."
+        elif "quota" in error_msg or "rate" in error_msg or "429" in str(e):
+            return "AI service is temporarily unavailable due to rate limits. Please try again in a minute."
+        else:
+            return f"I'm having trouble connecting to the AI service. Error: {str(e)[:100]}"
+    
+    @staticmethod
+    def _cache_key(user_message: str, context: Optional[Dict], conversation_history: Optional[List[Dict]],
+                   summary: Optional[str], references: Optional[List[str]] = None) -> Optional[str]:
+        """Response cache key for standalone questions; None when the answer depends on the conversation"""
+        if conversation_history or summary or context is None:
+            return None
+        if references:
+            context = {**context, "references": references}
+        return response_cache.key(user_message, context)
     
-    def _weather_code_to_text(self, code: Optional[int]) -> str:
-        """Convert WMO weather code to human-readable text"""
-        if code is None:
-            return "Unknown"
+    def _start_chat(self, user_message: str, context: Optional[Dict], conversation_history: Optional[List[Dict]],
+                    system_prompt: Optional[str], summary: Optional[str]):
+        """Open a chat session on the system prompt with the summary and recent turns as history"""
+        # Build system prompt with context
+        if system_prompt is None:
+            system_prompt = self.build_system_prompt(context, user_message)
         
-        weather_codes = {
-            0: "Clear sky",
-            1: "Mainly clear",
-            2: "Partly cloudy",
-            3: "Overcast",
-            45: "Foggy",
-            48: "Depositing rime fog",
-            51: "Light drizzle",
-            53: "Moderate drizzle",
-            55: "Dense drizzle",
-            61: "Slight rain",
-            63: "Moderate rain",
-            65: "Heavy rain",
-            71: "Slight snow",
-            73: "Moderate snow",
-            75: "Heavy snow",
-            77: "Snow grains",
-            80: "Slight rain showers",
-            81: "Moderate rain showers",
-            82: "Violent rain showers",
-            85: "Slight snow showers",
-            86: "Heavy snow showers",
-            95: "Thunderstorm",
-            96: "Thunderstorm with slight hail",
-            99: "Thunderstorm with heavy hail"
-        }
+        # Build conversation history for Gemini, older turns as a summary
+        chat_history = []
+        if summary:
+            chat_history.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{summary}"]})
+            chat_history.append({"role": "model", "parts": ["Understood, I'll keep that in mind."]})
+        if conversation_history:
+            for msg in conversation_history:
+                role = msg.get("role", "user")
+                content = msg.get("content", "")
+                # Gemini uses 'user' and 'model' roles
+                gemini_role = "model" if role == "assistant" else "user"
+                chat_history.append({"role": gemini_role, "parts": [content]})
         
-        return weather_codes.get(code, f"Weather code {code}")
+        # Measure what this call sends: instructions, history and the new message
+        prompt_builder.record(estimate_tokens(system_prompt) + estimate_tokens(user_message) + sum(
+            estimate_tokens(part) for turn in chat_history for part in turn["parts"]
+        ))
+        
+        # The context goes in as the model's system instruction rather than
+        # being prepended to every message; it stays byte-identical across
+        # turns until the user's context changes
+        return self._chat_model(system_prompt).start_chat(history=chat_history)
+    
+    def _chat_model(self, system_prompt: str):
+        """GenerativeModel carrying system_prompt as its system instruction, reused per prompt"""
+        # Called from several AI worker threads at once
+        with self._chat_models_lock:
+            model = self._chat_models.get(system_prompt)
+            if model is not None:
+                self._chat_models.move_to_end(system_prompt)
+                return model
+        
+        model = self.model_factory(system_prompt)
+        with self._chat_models_lock:
+            model = self._chat_models.setdefault(system_prompt, model)
+            self._chat_models.move_to_end(system_prompt)
+            if len(self._chat_models) > 256:
+                self._chat_models.popitem(last=False)
+        return model
     
-    async def generate_insights(self, context: Dict) -> List[Dict[str, str]]:
+    def summarize_conversation(self, previous_summary: str, messages: List[Dict]) -> str:
         """
-        Generate AI insights based on user's data
+        Fold older chat turns into a short rolling summary
         
         Args:
-            context: User's locations, weather, and device data
+            previous_summary: Summary of even older turns ('' if none)
+            messages: Turns to fold in, as role/content dicts
             
         Returns:
-            List of insight objects with type, title, and message
+            New summary text (falls back to clipped transcripts without a model)
         """
-        insights = []
+        if not self.model:
+            return truncate_summary(previous_summary, messages)
         
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages
+        )
+        prompt = (
+            "Update the running summary of a chat between a user and their smart home assistant. "
+            "Keep facts, preferences and open questions; drop pleasantries. At most 150 words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
         try:
-            # Generate weather-based insights
-            if context.get("current_weather"):
-                weather = context["current_weather"]
-                
-                # Temperature insights (data is in Fahrenheit)
-                temp = weather.get("temperature", 0)
-                if temp is not None:
-                    if temp > 95:  # ~35°C - Hot weather alert
-                        insights.append({
-                            "type": "warning",
-                            "title": "High Temperature Alert",
-                            "message": f"Temperature is {temp:.0f}°F. Consider staying hydrated and using cooling systems."
-                        })
-                    elif temp < 32:  # 0°C - Freezing
-                        insights.append({
-                            "type": "warning",
-                            "title": "Freezing Temperature Alert",
-                            "message": f"Temperature is {temp:.0f}°F. Protect pipes and ensure heating is adequate."
-                        })
-                    elif temp < 50:  # ~10°C - Cold weather
-                        insights.append({
-                            "type": "info",
-                            "title": "Cold Weather",
-                            "message": f"Temperature is {temp:.0f}°F. Dress warmly if going outside."
-                        })
-                
-                # Weather condition insights
-                weather_code = weather.get("weather_code", 0)
-                if weather_code is not None and weather_code >= 61:  # Rain or worse
-                    insights.append({
-                        "type": "info",
-                        "title": "Rain Expected",
-                        "message": "Don't forget your umbrella! Rain is in the forecast."
-                    })
-                
-                # Wind insights (data is in mph)
-                wind_speed = weather.get("wind_speed", 0)
-                if wind_speed is not None and wind_speed > 30:  # ~50 km/h
-                    insights.append({
-                        "type": "warning",
-                        "title": "High Wind Alert",
-                        "message": f"Wind speed is {wind_speed:.0f} mph. Secure outdoor items and be cautious."
-                    })
-            
-            # Energy saving opportunities (temp_max is in Fahrenheit)
-            if context.get("forecast"):
-                forecast = context["forecast"]
-                if len(forecast) > 0:
-                    tomorrow = forecast[0]
-                    temp_max = tomorrow.get("temp_max")
-                    
-                    if temp_max is not None and temp_max > 80:  # ~27°C - warm day
-                        insights.append({
-                            "type": "tip",
-                            "title": "Energy Saving Tip",
-                            "message": f"Tomorrow will be warm ({temp_max:.0f}°F). Consider pre-cooling your home during off-peak hours."
-                        })
-                    elif temp_max is not None and temp_max < 40:  # ~4°C - cold day
-                        insights.append({
-                            "type": "tip", 
-                            "title": "Heating Tip",
-                            "message": f"Tomorrow will be cold ({temp_max:.0f}°F). Consider programming your thermostat to save energy."
-                        })
-            
-            # Add a general insight if no specific insights
-            if not insights:
-                insights.append({
-                    "type": "info",
-                    "title": "All Systems Normal",
-                    "message": "Your home and weather conditions are looking good!"
-                })
-            
+            return ai_scheduler.call(lambda: self.model.generate_content(prompt).text.strip(), BACKGROUND)
         except Exception as e:
-            print(f"Error generating insights: {e}")
-            insights.append({
-                "type": "error",
-                "title": "Insights Unavailable",
-                "message": "Unable to generate insights at this time."
-            })
+            print(f"AI summary error: {e}", flush=True)
+            return truncate_summary(previous_summary, messages)
+    
+    def build_system_prompt(self, context: Optional[Dict] = None, question: Optional[str] = None,
+                            rendered: Optional[RenderedContext] = None) -> str:
+        """
+        Build system prompt with user context
         
-        return insights
+        Args:
+            context: User's weather locations, devices, and recent data
+            question: The user's message, used to rank context when it does
+                not fit the token budget
+            rendered: Context already rendered by the prompt builder (e.g.
+                from a cached snapshot); rendered from context when omitted
+            
+        Returns:
+            Formatted system prompt string
+        """
+        if rendered is None:
+            rendered = prompt_builder.render(context)
+        return prompt_builder.build(rendered, question)
 
 
 # Global instance
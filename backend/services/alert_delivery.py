@@ -0,0 +1,97 @@
+"""
+Alert Delivery Queue for HomeNetAI
+Hands newly fired alerts from the scheduler to delivery handlers on a worker thread
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Dict, List
+
+from config import config
+
+AlertHandler = Callable[[Dict[str, Any]], None]
+
+
+class AlertDeliveryQueue:
+    """
+    Bounded in-process queue of new alerts
+
+    The scheduler publishes without blocking; a single worker thread passes
+    each alert to every registered handler (push, email, websocket...). When
+    the queue is full the alert is dropped and counted - it is still stored in
+    the alerts table and shows up on the next read.
+    """
+
+    def __init__(self, maxsize: int = config.ALERT_QUEUE_SIZE):
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=maxsize)
+        self._handlers: List[AlertHandler] = []
+        self._lock = threading.Lock()
+        self._worker = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def register(self, handler: AlertHandler):
+        """Add a delivery handler; called once per alert on the worker thread"""
+        with self._lock:
+            self._handlers.append(handler)
+
+    def publish(self, alerts: List[Dict[str, Any]]) -> int:
+        """Queue alerts for delivery, returns how many were accepted"""
+        self._ensure_worker()
+        accepted = 0
+        for alert in alerts:
+            try:
+                self._queue.put_nowait(alert)
+                accepted += 1
+            except queue.Full:
+                self.dropped += 1
+        self.published += accepted
+        return accepted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def join(self):
+        """Block until every queued alert has been handled"""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="alert-delivery", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            alert = self._queue.get()
+            try:
+                with self._lock:
+                    handlers = list(self._handlers)
+                for handler in handlers:
+                    try:
+                        handler(alert)
+                    except Exception as e:
+                        self.failed += 1
+                        print(f"Alert delivery error ({getattr(handler, '__name__', handler)}): {e}")
+                self.delivered += 1
+            finally:
+                self._queue.task_done()
+
+
+def log_alert(alert: Dict[str, Any]):
+    """Default handler: log delivered alerts"""
+    channel = "email+app" if alert.get("email_notifications") else "app"
+    print(f"Alert for user {alert['user_id']} ({channel}): {alert['title']} - location {alert['location_id']}")
+
+
+# Global alert delivery queue
+alert_delivery = AlertDeliveryQueue()
+alert_delivery.register(log_alert)
@@ -0,0 +1,373 @@
+"""
+Alert Rule Engine for HomeNetAI
+Declarative weather alert rules evaluated with NumPy over every location at once
+
+Rules are plain data. Each one compares an aggregate of a metric (over the
+current reading or a window of forecast hours) with a threshold. Evaluating a
+rule set is a handful of array operations over (locations x hours) matrices,
+so adding a rule adds a row to RULES and never a new Python loop.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+AGGREGATIONS = ("current", "max", "min", "sum", "mean", "drop", "rise")
+OPERATORS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+SEVERITY_ORDER = {"critical": 0, "warning": 1, "info": 2, "recommendation": 3}
+
+
+@dataclass(frozen=True)
+class Condition:
+    """
+    One comparison: aggregation(metric over window) op threshold
+
+    aggregation is "current" (latest observation) or one of max/min/sum/mean
+    over forecast hours [window[0], window[1]), or drop/rise of the window's
+    min/max relative to the current value. Forecast values <= floor are
+    ignored before aggregating (e.g. trace precipitation).
+    """
+    metric: str
+    op: str
+    threshold: float
+    aggregation: str = "current"
+    window: Tuple[int, int] = (0, 24)
+    floor: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class AlertRule:
+    """
+    A declarative alert: a primary condition, optional extra conditions that
+    must also hold, and the alert text
+
+    Message templates can use {value} (the primary aggregate), {hours} (offset
+    of the forecast hour that produced it), {time} (that hour as "03 PM"),
+    {current_<metric>} for any current reading, and the unit conversions
+    {delta_f} (value * 1.8), {fahrenheit} (value * 1.8 + 32) and {mph}.
+    """
+    id: str
+    type: str
+    severity: str
+    metric: str
+    op: str
+    threshold: float
+    title: str
+    message: str
+    recommendation: str = ""
+    icon: str = "info"
+    aggregation: str = "current"
+    window: Tuple[int, int] = (0, 24)
+    floor: Optional[float] = None
+    also: Tuple[Condition, ...] = ()
+    suppressed_by: Tuple[str, ...] = ()
+
+    @property
+    def condition(self) -> Condition:
+        return Condition(self.metric, self.op, self.threshold, self.aggregation, self.window, self.floor)
+
+
+@dataclass
+class WeatherBatch:
+    """
+    Current readings and hourly forecasts for many locations
+
+    current[metric] has shape (n_locations,); forecast[metric] has shape
+    (n_locations, hours) with NaN where a location has no forecast row.
+    """
+    location_ids: List[int]
+    current: Dict[str, np.ndarray]
+    forecast: Dict[str, np.ndarray]
+    extra: Dict[str, np.ndarray] = field(default_factory=dict)
+
+
+def _outdoor_score(batch: WeatherBatch) -> np.ndarray:
+    """Hourly outdoor comfort score (higher is better)"""
+    temp = batch.forecast["temperature"]
+    humidity = batch.forecast["humidity"]
+    precip = batch.forecast["precipitation"]
+    wind = batch.forecast["wind_speed"]
+
+    score = np.full(temp.shape, 100.0)
+    score += np.select([(temp >= 15) & (temp <= 25), (temp < 10) | (temp > 30)], [20, -30], 0)
+    score += np.select([humidity < 60, humidity > 80], [10, -20], 0)
+    score += np.where(precip < 0.1, 20, -50)
+    score += np.where(wind < 20, 10, -15)
+    # Hours with no forecast row never win
+    return np.where(np.isnan(temp), np.nan, score)
+
+
+def _temperature_deviation(batch: WeatherBatch) -> np.ndarray:
+    """Absolute z-score of the current temperature against the recent mean/std"""
+    mean = batch.extra.get("temperature_mean")
+    std = batch.extra.get("temperature_std")
+    if mean is None or std is None:
+        return np.full(len(batch.location_ids), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.abs(batch.current["temperature"] - mean) / np.where(std > 0, std, np.nan)
+
+
+# Metrics computed from the raw arrays, per forecast hour (n, hours) or per location (n,)
+DERIVED_METRICS: Dict[str, Callable[[WeatherBatch], np.ndarray]] = {
+    "outdoor_score": _outdoor_score,
+    "temperature_deviation": _temperature_deviation,
+}
+
+
+RULES: Tuple[AlertRule, ...] = (
+    # Precipitation
+    AlertRule(
+        id="heavy_rain", type="precipitation", severity="warning",
+        metric="precipitation", aggregation="sum", window=(0, 6), floor=0.1, op=">", threshold=5,
+        title="⚠️ Heavy Rain Expected",
+        message="Heavy rain ({value:.1f}mm) expected in {hours} hour(s)",
+        recommendation="Consider postponing outdoor activities", icon="cloud-rain"
+    ),
+    AlertRule(
+        id="rain", type="precipitation", severity="info",
+        metric="precipitation", aggregation="sum", window=(0, 6), floor=0.1, op=">", threshold=0.5,
+        suppressed_by=("heavy_rain",),
+        title="🌧️ Rain Expected",
+        message="Rain ({value:.1f}mm) expected in {hours} hour(s)",
+        recommendation="Bring an umbrella if going out", icon="cloud-drizzle"
+    ),
+    AlertRule(
+        id="raining_now", type="precipitation", severity="info",
+        metric="precipitation", op=">", threshold=0.1,
+        title="🌧️ Currently Raining",
+        message="Active precipitation: {value:.1f}mm/h",
+        recommendation="Take precautions if going outside", icon="cloud-rain"
+    ),
+    # Temperature
+    AlertRule(
+        id="temperature_drop", type="temperature", severity="warning",
+        metric="temperature", aggregation="drop", window=(0, 12), op=">=", threshold=8,
+        title="🥶 Significant Temperature Drop",
+        message="Temperature dropping {value:.1f}°C ({delta_f:.0f}°F) in next 12 hours",
+        recommendation="Adjust home heating and dress warmly", icon="thermometer-snow"
+    ),
+    AlertRule(
+        id="temperature_rise", type="temperature", severity="info",
+        metric="temperature", aggregation="rise", window=(0, 12), op=">=", threshold=8,
+        title="🌡️ Temperature Rising",
+        message="Temperature increasing {value:.1f}°C ({delta_f:.0f}°F) today",
+        recommendation="Consider adjusting cooling systems", icon="thermometer-sun"
+    ),
+    AlertRule(
+        id="freezing", type="temperature", severity="critical",
+        metric="temperature", op="<=", threshold=0,
+        title="❄️ Freezing Temperature",
+        message="Current temperature: {value:.1f}°C (32°F)",
+        recommendation="Protect pipes and sensitive plants", icon="snowflake"
+    ),
+    AlertRule(
+        id="extreme_heat", type="temperature", severity="critical",
+        metric="temperature", op=">=", threshold=35,
+        title="🔥 Extreme Heat",
+        message="Current temperature: {value:.1f}°C ({fahrenheit:.0f}°F)",
+        recommendation="Stay hydrated and avoid prolonged sun exposure", icon="sun"
+    ),
+    # Comfort and recommendations
+    AlertRule(
+        id="great_weather_ahead", type="recommendation", severity="recommendation",
+        metric="outdoor_score", aggregation="max", window=(0, 12), op=">=", threshold=80,
+        also=(Condition("precipitation", "<", 0.1),),
+        title="☀️ Great Weather Ahead",
+        message="Excellent outdoor conditions around {time}",
+        recommendation="Perfect time for outdoor activities", icon="sun"
+    ),
+    AlertRule(
+        id="ideal_conditions", type="recommendation", severity="recommendation",
+        metric="temperature", op=">=", threshold=18,
+        also=(
+            Condition("temperature", "<=", 24),
+            Condition("humidity", "<", 70),
+            Condition("precipitation", "<", 0.1),
+            Condition("wind_speed", "<", 25),
+        ),
+        title="🌤️ Ideal Weather Conditions",
+        message="Current conditions are excellent for outdoor activities",
+        recommendation="Great time to be outside!", icon="cloud-sun"
+    ),
+    AlertRule(
+        id="high_humidity", type="comfort", severity="info",
+        metric="humidity", op=">", threshold=80,
+        title="💧 High Humidity",
+        message="Current humidity: {value:.0f}%",
+        recommendation="Use dehumidifier for indoor comfort", icon="droplet"
+    ),
+    # Anomalies
+    AlertRule(
+        id="temperature_anomaly", type="anomaly", severity="warning",
+        metric="temperature_deviation", op=">", threshold=2,
+        title="⚡ Unusual Weather Pattern",
+        message="Abnormal temperature: {current_temperature:.1f} (deviation: {value:.1f}σ)",
+        recommendation="Weather conditions differ from historical patterns", icon="alert-triangle"
+    ),
+    # Wind
+    AlertRule(
+        id="high_wind", type="wind", severity="warning",
+        metric="wind_speed", op=">", threshold=50,
+        title="💨 High Wind Warning",
+        message="Current wind speed: {value:.0f} km/h ({mph:.0f} mph)",
+        recommendation="Secure loose outdoor items", icon="wind"
+    ),
+    AlertRule(
+        id="strong_winds_expected", type="wind", severity="warning",
+        metric="wind_speed", aggregation="max", window=(0, 6), op=">", threshold=60,
+        title="🌪️ Strong Winds Expected",
+        message="Wind gusts up to {value:.0f} km/h expected",
+        recommendation="Prepare for strong winds", icon="wind"
+    ),
+)
+
+
+class RuleEngine:
+    """Compiles a rule set and evaluates it over a WeatherBatch"""
+
+    def __init__(self, rules: Sequence[AlertRule] = RULES):
+        ids = [rule.id for rule in rules]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Alert rule ids must be unique")
+        for rule in rules:
+            for condition in (rule.condition, *rule.also):
+                if condition.aggregation not in AGGREGATIONS:
+                    raise ValueError(f"Rule {rule.id}: unknown aggregation {condition.aggregation}")
+                if condition.op not in OPERATORS:
+                    raise ValueError(f"Rule {rule.id}: unknown operator {condition.op}")
+            for other in rule.suppressed_by:
+                if other not in ids:
+                    raise ValueError(f"Rule {rule.id}: suppressed_by unknown rule {other}")
+        self.rules = tuple(rules)
+
+    def evaluate(self, batch: WeatherBatch, now: Optional[datetime] = None,
+                 type_enabled: Optional[Dict[str, np.ndarray]] = None) -> Dict[int, List[Dict]]:
+        """
+        Evaluate every rule for every location in the batch
+
+        Args:
+            batch: Current and forecast arrays for the locations
+            now: Evaluation time (default datetime.now())
+            type_enabled: Optional per-location boolean masks by alert type;
+                rules of a masked-out type never fire for that location
+
+        Returns:
+            location_id -> alerts sorted by severity, in the AlertsService
+            format (type, severity, title, message, recommendation, timestamp, icon)
+        """
+        now = now or datetime.now()
+        n = len(batch.location_ids)
+        alerts: Dict[int, List[Dict]] = {location_id: [] for location_id in batch.location_ids}
+        if n == 0:
+            return alerts
+
+        # Shared aggregates are computed once per (metric, aggregation, window, floor)
+        aggregates: Dict[tuple, Tuple[np.ndarray, np.ndarray]] = {}
+        derived: Dict[str, np.ndarray] = {}
+
+        def aggregate(condition: Condition) -> Tuple[np.ndarray, np.ndarray]:
+            key = (condition.metric, condition.aggregation, condition.window, condition.floor)
+            if key not in aggregates:
+                aggregates[key] = self._aggregate(batch, condition, derived, n)
+            return aggregates[key]
+
+        fired: Dict[str, np.ndarray] = {}
+        primary: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for rule in self.rules:
+            values, positions = aggregate(rule.condition)
+            with np.errstate(invalid="ignore"):
+                mask = OPERATORS[rule.op](values, rule.threshold)
+                for condition in rule.also:
+                    mask &= OPERATORS[condition.op](aggregate(condition)[0], condition.threshold)
+            if type_enabled is not None and rule.type in type_enabled:
+                mask &= type_enabled[rule.type]
+            fired[rule.id] = mask
+            primary[rule.id] = (values, positions)
+
+        timestamp = now.isoformat()
+        current_values = {f"current_{m}": v for m, v in batch.current.items()}
+        for rule in self.rules:
+            mask = fired[rule.id]
+            for other in rule.suppressed_by:
+                mask = mask & ~fired[other]
+            values, positions = primary[rule.id]
+
+            # Formatting only touches the (few) locations that fired
+            for i in np.flatnonzero(mask):
+                value = float(values[i])
+                hours = int(positions[i])
+                context = {name: float(v[i]) for name, v in current_values.items()}
+                context.update(
+                    value=value, delta_f=value * 1.8, fahrenheit=value * 1.8 + 32, mph=value * 0.621,
+                    hours=hours, time=(now + timedelta(hours=hours)).strftime("%I %p")
+                )
+                alerts[batch.location_ids[i]].append({
+                    "type": rule.type,
+                    "rule": rule.id,
+                    "severity": rule.severity,
+                    "title": rule.title,
+                    "message": rule.message.format(**context),
+                    "recommendation": rule.recommendation,
+                    "timestamp": timestamp,
+                    "icon": rule.icon,
+                })
+
+        for location_alerts in alerts.values():
+            location_alerts.sort(key=lambda a: SEVERITY_ORDER.get(a["severity"], 999))
+        return alerts
+
+    @staticmethod
+    def _aggregate(batch: WeatherBatch, condition: Condition, derived: Dict[str, np.ndarray],
+                   n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Reduce one metric to a value and a forecast-hour position per location"""
+        metric = condition.metric
+        if metric in DERIVED_METRICS:
+            if metric not in derived:
+                derived[metric] = DERIVED_METRICS[metric](batch)
+            source = derived[metric]
+        elif condition.aggregation == "current":
+            source = batch.current.get(metric)
+        else:
+            source = batch.forecast.get(metric)
+        if source is None:
+            return np.full(n, np.nan), np.zeros(n, dtype=int)
+
+        if condition.aggregation == "current":
+            return source.astype(float), np.zeros(n, dtype=int)
+
+        start, end = condition.window
+        window = source[:, start:end]
+        if condition.floor is not None:
+            window = np.where(window > condition.floor, window, np.nan)
+        present = ~np.isnan(window)
+        has_any = present.any(axis=1)
+
+        if condition.aggregation in ("max", "rise"):
+            positions = np.argmax(np.where(present, window, -np.inf), axis=1)
+        elif condition.aggregation in ("min", "drop"):
+            positions = np.argmin(np.where(present, window, np.inf), axis=1)
+        else:
+            # sum/mean report the first hour that contributed
+            positions = np.argmax(present, axis=1)
+
+        picked = window[np.arange(n), positions] if window.shape[1] else np.full(n, np.nan)
+        if condition.aggregation == "sum":
+            values = np.where(has_any, np.nansum(np.where(present, window, 0.0), axis=1), 0.0)
+        elif condition.aggregation == "mean":
+            counts = present.sum(axis=1)
+            values = np.where(has_any, np.where(present, window, 0.0).sum(axis=1) / np.maximum(counts, 1), np.nan)
+        elif condition.aggregation in ("drop", "rise"):
+            current = batch.current.get(metric, np.full(n, np.nan))
+            values = current - picked if condition.aggregation == "drop" else picked - current
+        else:
+            values = picked
+
+        values = np.where(has_any, values, np.nan) if condition.aggregation != "sum" else values
+        return values.astype(float), positions.astype(int)
@@ -2,399 +2,343 @@
 Smart Alerts Service - ML-driven weather alerts and recommendations
 Provides actionable insights based on weather predictions and patterns
 """
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import List, Dict, Any, Optional
-import statistics
+import numpy as np
+from psycopg2.extras import execute_values
+from config import config
 from database.database import HomeNetDatabase
-from services.analytics_service import AnalyticsService
+from services.alert_delivery import alert_delivery
+from services.alert_rules import RULES, SEVERITY_ORDER, RuleEngine, WeatherBatch
+from services.pubsub import pubsub, user_channel
 
 class AlertsService:
+    # user_preferences toggle for each alert type; other types follow alerts_enabled only
+    PREFERENCE_COLUMNS = {
+        'temperature': 'temperature_alerts',
+        'precipitation': 'precipitation_alerts',
+        'wind': 'wind_alerts',
+        'anomaly': 'anomaly_alerts',
+    }
+    
+    # Hours of forecast the rules can look ahead
+    FORECAST_HOURS = 24
+    CURRENT_METRICS = ["temperature", "humidity", "precipitation", "wind_speed", "apparent_temperature", "cloud_cover"]
+    FORECAST_METRICS = ["temperature", "humidity", "precipitation", "wind_speed", "apparent_temperature"]
+    
     def __init__(self):
         self.db = HomeNetDatabase()
-        self.analytics = AnalyticsService()
+        self.engine = RuleEngine(RULES)
     
-    def get_active_alerts(self, location_id: int, user_id: int) -> List[Dict[str, Any]]:
-        """Get all active alerts and recommendations for a location"""
-        alerts = []
+    def get_active_alerts(self, location_id: int, user_id: int,
+                          severities: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get the active (unexpired, not dismissed) alerts for one of the user's locations
         
-        # Get weather data for analysis
-        weather_data = self._get_recent_weather(location_id)
-        forecast_data = self._get_forecast_weather(location_id)
+        Alerts are read from the alerts table. A location the scheduler has not
+        evaluated yet (e.g. just added) is materialized once on first read.
         
-        if not weather_data or not forecast_data:
+        Args:
+            location_id: ID of the location
+            user_id: Owner of the location
+            severities: Optional severity filter
+            
+        Returns:
+            Alerts ordered by severity, then newest first
+        """
+        location = self.get_owned_location(location_id, user_id)
+        if not location:
             return []
-        
-        # Generate different types of alerts
-        alerts.extend(self._check_precipitation_alerts(weather_data, forecast_data))
-        alerts.extend(self._check_temperature_alerts(weather_data, forecast_data))
-        alerts.extend(self._check_comfort_recommendations(weather_data, forecast_data))
-        alerts.extend(self._check_anomaly_alerts(location_id, weather_data))
-        alerts.extend(self._check_wind_alerts(weather_data, forecast_data))
-        alerts.extend(self._check_uv_alerts(forecast_data))
-        
-        # Sort by severity and timestamp
-        severity_order = {'critical': 0, 'warning': 1, 'info': 2, 'recommendation': 3}
-        alerts.sort(key=lambda x: (severity_order.get(x['severity'], 999), x['timestamp']))
-        
-        # Add unique IDs and format for frontend compatibility
-        formatted_alerts = []
-        for idx, alert in enumerate(alerts):
-            formatted_alerts.append({
-                'id': idx + 1,  # Unique ID for each alert
-                'user_id': user_id,
-                'location_id': location_id,
-                'alert_type': alert.get('title', alert.get('type', 'Alert')),
-                'severity': alert.get('severity', 'info'),
-                'title': alert.get('title', ''),
-                'message': alert.get('message', '') + (' ' + alert.get('recommendation', '') if alert.get('recommendation') else ''),
-                'is_read': False,
-                'created_at': alert.get('timestamp', datetime.now().isoformat()),
-                'expires_at': None,
-                'icon': alert.get('icon', 'info')
-            })
-        
-        return formatted_alerts
+        if location['evaluated_at'] is None:
+            self.materialize_and_deliver([location_id])
+        
+        rows = self.db.execute_query("""
+            SELECT id, user_id, location_id, rule, alert_type, severity, title, message,
+                   recommendation, icon, is_read, fired_at, expires_at
+            FROM alerts
+            WHERE user_id = %s AND location_id = %s
+                AND NOT dismissed
+                AND expires_at > LOCALTIMESTAMP
+                AND (%s::text[] IS NULL OR severity = ANY(%s::text[]))
+            ORDER BY array_position(%s::text[], severity::text), fired_at DESC, id
+        """, (user_id, location_id, severities, severities, list(SEVERITY_ORDER)), name="get_active_alerts")
+        return [self.format_alert(row) for row in rows]
     
-    def _get_recent_weather(self, location_id: int) -> Optional[Dict[str, Any]]:
-        """Get recent weather data (last 24 hours)"""
-        query = """
-            SELECT temperature, humidity, precipitation, wind_speed, 
-                   apparent_temperature, cloud_cover, timestamp
-            FROM weather_data
-            WHERE location_id = %s 
-            AND timestamp >= NOW() - INTERVAL '24 hours'
-            ORDER BY timestamp DESC
-            LIMIT 24
-        """
-        results = self.db.execute_query(query, (location_id,))
-        
-        if not results:
-            return None
-        
+    def get_owned_location(self, location_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """The user's location with its last alert evaluation time, or None"""
+        rows = self.db.execute_query("""
+            SELECT l.id AS location_id, e.evaluated_at
+            FROM user_locations l
+            LEFT JOIN alert_evaluations e ON e.location_id = l.id
+            WHERE l.id = %s AND l.user_id = %s
+        """, (location_id, user_id), name="get_owned_location")
+        return rows[0] if rows else None
+    
+    @staticmethod
+    def format_alert(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a stored alert for the frontend"""
         return {
-            'current': results[0] if results else None,
-            'recent': results
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'location_id': row['location_id'],
+            'alert_type': row['title'],
+            'severity': row['severity'],
+            'title': row['title'],
+            'message': row['message'] + (' ' + row['recommendation'] if row.get('recommendation') else ''),
+            'is_read': row['is_read'],
+            'created_at': row['fired_at'].isoformat(),
+            'expires_at': row['expires_at'].isoformat(),
+            'icon': row.get('icon') or 'info',
+            'type': row['alert_type']
         }
     
-    def _get_forecast_weather(self, location_id: int) -> Optional[Dict[str, Any]]:
-        """Get forecast weather data (next 24 hours)"""
-        query = """
-            SELECT temperature, humidity, precipitation, wind_speed,
-                   apparent_temperature, timestamp
-            FROM weather_data
-            WHERE location_id = %s 
-            AND timestamp >= NOW()
-            AND timestamp <= NOW() + INTERVAL '24 hours'
-            ORDER BY timestamp ASC
-            LIMIT 24
-        """
-        results = self.db.execute_query(query, (location_id,))
-        
-        return results if results else []
+    def mark_as_read(self, alert_id: int, user_id: int) -> bool:
+        """Mark one of the user's alerts as read; False if it does not exist"""
+        rows = self.db.execute_query("""
+            UPDATE alerts SET is_read = TRUE, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND user_id = %s
+            RETURNING id
+        """, (alert_id, user_id), name="mark_alert_read")
+        return bool(rows)
     
-    def _check_precipitation_alerts(self, weather_data: Dict, forecast_data: List) -> List[Dict]:
-        """Check for rain/precipitation alerts"""
-        alerts = []
-        
-        # Check upcoming rain in next 6 hours
-        next_6_hours = [f for f in forecast_data[:6] if f]
-        rain_forecast = [f for f in next_6_hours if f.get('precipitation', 0) > 0.1]
-        
-        if rain_forecast:
-            total_rain = sum(f.get('precipitation', 0) for f in rain_forecast)
-            hours_until = len([f for f in forecast_data[:forecast_data.index(rain_forecast[0])] if f])
-            
-            if total_rain > 5:  # Heavy rain (>5mm)
-                alerts.append({
-                    'type': 'precipitation',
-                    'severity': 'warning',
-                    'title': '⚠️ Heavy Rain Expected',
-                    'message': f'Heavy rain ({total_rain:.1f}mm) expected in {hours_until} hour(s)',
-                    'recommendation': 'Consider postponing outdoor activities',
-                    'timestamp': datetime.now().isoformat(),
-                    'icon': 'cloud-rain'
-                })
-            elif total_rain > 0.5:
-                alerts.append({
-                    'type': 'precipitation',
-                    'severity': 'info',
-                    'title': '🌧️ Rain Expected',
-                    'message': f'Rain ({total_rain:.1f}mm) expected in {hours_until} hour(s)',
-                    'recommendation': 'Bring an umbrella if going out',
-                    'timestamp': datetime.now().isoformat(),
-                    'icon': 'cloud-drizzle'
-                })
-        
-        # Check if currently raining
-        current = weather_data.get('current')
-        if current and current.get('precipitation', 0) > 0.1:
-            alerts.append({
-                'type': 'precipitation',
-                'severity': 'info',
-                'title': '🌧️ Currently Raining',
-                'message': f'Active precipitation: {current.get("precipitation", 0):.1f}mm/h',
-                'recommendation': 'Take precautions if going outside',
-                'timestamp': datetime.now().isoformat(),
-                'icon': 'cloud-rain'
-            })
+    def dismiss(self, alert_id: int, user_id: int) -> bool:
+        """
+        Dismiss one of the user's alerts; False if it does not exist
         
-        return alerts
+        The row is kept (flagged dismissed) until it expires so the same
+        condition does not bring the alert back later that day.
+        """
+        rows = self.db.execute_query("""
+            UPDATE alerts SET dismissed = TRUE, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND user_id = %s
+            RETURNING id
+        """, (alert_id, user_id), name="dismiss_alert")
+        return bool(rows)
     
-    def _check_temperature_alerts(self, weather_data: Dict, forecast_data: List) -> List[Dict]:
-        """Check for significant temperature changes"""
-        alerts = []
-        
-        current = weather_data.get('current')
-        if not current:
-            return alerts
-        
-        current_temp = current.get('temperature', 0)
-        
-        # Check for temperature drops in next 12 hours
-        if len(forecast_data) >= 12:
-            future_temps = [f.get('temperature', 0) for f in forecast_data[:12] if f]
-            if future_temps:
-                min_temp = min(future_temps)
-                temp_drop = current_temp - min_temp
-                
-                if temp_drop >= 8:  # 15°F drop
-                    alerts.append({
-                        'type': 'temperature',
-                        'severity': 'warning',
-                        'title': '🥶 Significant Temperature Drop',
-                        'message': f'Temperature dropping {temp_drop:.1f}°C ({temp_drop * 1.8:.0f}°F) in next 12 hours',
-                        'recommendation': 'Adjust home heating and dress warmly',
-                        'timestamp': datetime.now().isoformat(),
-                        'icon': 'thermometer-snow'
-                    })
-                
-                # Check for temperature rise
-                max_temp = max(future_temps)
-                temp_rise = max_temp - current_temp
-                
-                if temp_rise >= 8:  # 15°F rise
-                    alerts.append({
-                        'type': 'temperature',
-                        'severity': 'info',
-                        'title': '🌡️ Temperature Rising',
-                        'message': f'Temperature increasing {temp_rise:.1f}°C ({temp_rise * 1.8:.0f}°F) today',
-                        'recommendation': 'Consider adjusting cooling systems',
-                        'timestamp': datetime.now().isoformat(),
-                        'icon': 'thermometer-sun'
-                    })
+    def materialize_and_deliver(self, location_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Materialize alerts and queue the newly fired ones for delivery
         
-        # Extreme temperature alerts
-        if current_temp <= 0:
-            alerts.append({
-                'type': 'temperature',
-                'severity': 'critical',
-                'title': '❄️ Freezing Temperature',
-                'message': f'Current temperature: {current_temp:.1f}°C (32°F)',
-                'recommendation': 'Protect pipes and sensitive plants',
-                'timestamp': datetime.now().isoformat(),
-                'icon': 'snowflake'
-            })
-        elif current_temp >= 35:  # 95°F
-            alerts.append({
-                'type': 'temperature',
-                'severity': 'critical',
-                'title': '🔥 Extreme Heat',
-                'message': f'Current temperature: {current_temp:.1f}°C ({current_temp * 1.8 + 32:.0f}°F)',
-                'recommendation': 'Stay hydrated and avoid prolonged sun exposure',
-                'timestamp': datetime.now().isoformat(),
-                'icon': 'sun'
-            })
+        Every caller of materialize goes through here: an alert is only new
+        in the run that fired it, so one left undelivered is never pushed.
         
-        return alerts
+        Returns:
+            materialize()'s result plus how many new alerts were queued
+        """
+        result = self.materialize(location_ids)
+        result['queued'] = alert_delivery.publish(result['new'])
+        return result
     
-    def _check_comfort_recommendations(self, weather_data: Dict, forecast_data: List) -> List[Dict]:
-        """Generate comfort and activity recommendations"""
-        alerts = []
-        
-        current = weather_data.get('current')
-        if not current:
-            return alerts
+    def materialize(self, location_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Evaluate the rules and store the results in the alerts table
         
-        temp = current.get('temperature', 0)
-        humidity = current.get('humidity', 0)
-        windspeed = current.get('windspeed', 0)
-        precipitation = current.get('precipitation', 0)
+        Every location is evaluated in one batched load and one vectorized
+        pass, with each owner's user_preferences toggles applied as masks, so
+        the cost grows with locations rather than with dashboard views.
+        Firing rules are upserted on their dedup key (refreshing message and
+        expiry, keeping read/dismissed state); active alerts whose rule no
+        longer fires are expired; long-expired rows are purged.
         
-        # Find best outdoor time in next 12 hours
-        outdoor_scores = []
-        for i, forecast in enumerate(forecast_data[:12]):
-            if not forecast:
-                continue
+        Args:
+            location_ids: Locations to evaluate (default: every location)
             
-            f_temp = forecast.get('temperature', 0)
-            f_humidity = forecast.get('humidity', 0)
-            f_precip = forecast.get('precipitation', 0)
-            f_wind = forecast.get('windspeed', 0)
+        Returns:
+            Dictionary with the number of locations evaluated, active alerts,
+            and the alerts that newly fired in this run (for delivery)
+        """
+        conn = None
+        cursor = None
+        try:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            preference_columns = list(self.PREFERENCE_COLUMNS.values())
+            cursor.execute(f"""
+                SELECT l.id, l.user_id,
+                       COALESCE(p.email_notifications, FALSE),
+                       COALESCE(p.alerts_enabled, TRUE),
+                       {", ".join(f"COALESCE(p.{c}, TRUE)" for c in preference_columns)}
+                FROM user_locations l
+                LEFT JOIN user_preferences p ON p.user_id = l.user_id
+                WHERE %s::int[] IS NULL OR l.id = ANY(%s::int[])
+                ORDER BY l.id
+            """, (location_ids, location_ids))
+            locations = cursor.fetchall()
+            if not locations:
+                return {"evaluated": 0, "active": 0, "new": []}
             
-            # Calculate comfort score (0-100)
-            score = 100
+            owners = {row[0]: row[1] for row in locations}
+            email = {row[1]: row[2] for row in locations}
+            toggles = np.array([row[3:] for row in locations], dtype=bool)
+            enabled = toggles[:, 0]
+            type_enabled = {rule_type: enabled for rule_type in {rule.type for rule in self.engine.rules}}
+            for j, alert_type in enumerate(self.PREFERENCE_COLUMNS):
+                type_enabled[alert_type] = enabled & toggles[:, j + 1]
             
-            # Temperature comfort (15-25°C is ideal)
-            if 15 <= f_temp <= 25:
-                score += 20
-            elif f_temp < 10 or f_temp > 30:
-                score -= 30
+            cursor.execute("SELECT LOCALTIMESTAMP")
+            now = cursor.fetchone()[0]
+            expires_at = now + timedelta(minutes=config.ALERT_TTL_MINUTES)
+            evaluated = self.engine.evaluate(self._load_batch(list(owners)), now, type_enabled)
             
-            # Low humidity is better
-            if f_humidity < 60:
-                score += 10
-            elif f_humidity > 80:
-                score -= 20
+            rows = []
+            for location_id, alerts in evaluated.items():
+                for alert in alerts:
+                    rows.append((
+                        owners[location_id], location_id, alert['rule'], alert['type'], alert['severity'],
+                        alert['title'], alert['message'], alert['recommendation'], alert['icon'],
+                        f"{location_id}:{alert['rule']}:{now.date().isoformat()}", expires_at
+                    ))
             
-            # No precipitation
-            if f_precip < 0.1:
-                score += 20
-            else:
-                score -= 50
+            new_alerts = []
+            if rows:
+                # fired_at restarts when an expired alert fires again, so
+                # fired_at = LOCALTIMESTAMP marks alerts that are new in this run
+                stored = execute_values(cursor, """
+                    INSERT INTO alerts (user_id, location_id, rule, alert_type, severity, title,
+                                        message, recommendation, icon, dedup_key, expires_at)
+                    VALUES %s
+                    ON CONFLICT (dedup_key) DO UPDATE SET
+                        severity = EXCLUDED.severity,
+                        title = EXCLUDED.title,
+                        message = EXCLUDED.message,
+                        recommendation = EXCLUDED.recommendation,
+                        icon = EXCLUDED.icon,
+                        fired_at = CASE WHEN alerts.expires_at <= LOCALTIMESTAMP
+                                        THEN LOCALTIMESTAMP ELSE alerts.fired_at END,
+                        expires_at = EXCLUDED.expires_at,
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING id, user_id, location_id, rule, alert_type, severity, title, message,
+                              recommendation, icon, is_read, dismissed, fired_at, expires_at
+                """, rows, template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", fetch=True)
+                columns = [c.name for c in cursor.description]
+                for values in stored:
+                    row = dict(zip(columns, values))
+                    if row['fired_at'] == now and not row['dismissed']:
+                        row['email_notifications'] = email[row['user_id']]
+                        new_alerts.append(row)
             
-            # Moderate wind
-            if f_wind < 20:
-                score += 10
-            else:
-                score -= 15
+            # Active alerts that did not fire this time are over
+            cursor.execute("""
+                UPDATE alerts SET expires_at = LOCALTIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE location_id = ANY(%s) AND expires_at > LOCALTIMESTAMP
+                    AND NOT (dedup_key = ANY(%s))
+            """, (list(owners), [row[9] for row in rows]))
             
-            outdoor_scores.append((i, score))
-        
-        if outdoor_scores:
-            best_time_idx, best_score = max(outdoor_scores, key=lambda x: x[1])
+            cursor.execute("""
+                INSERT INTO alert_evaluations (location_id, evaluated_at)
+                SELECT UNNEST(%s::int[]), LOCALTIMESTAMP
+                ON CONFLICT (location_id) DO UPDATE SET evaluated_at = EXCLUDED.evaluated_at
+            """, (list(owners),))
             
-            if best_score >= 80 and precipitation < 0.1:
-                time_offset = best_time_idx
-                best_time = (datetime.now() + timedelta(hours=time_offset)).strftime('%I %p')
-                
-                alerts.append({
-                    'type': 'recommendation',
-                    'severity': 'recommendation',
-                    'title': '☀️ Great Weather Ahead',
-                    'message': f'Excellent outdoor conditions around {best_time}',
-                    'recommendation': 'Perfect time for outdoor activities',
-                    'timestamp': datetime.now().isoformat(),
-                    'icon': 'sun'
-                })
-        
-        # Current comfort recommendations
-        if temp >= 18 and temp <= 24 and humidity < 70 and precipitation < 0.1 and windspeed < 25:
-            alerts.append({
-                'type': 'recommendation',
-                'severity': 'recommendation',
-                'title': '🌤️ Ideal Weather Conditions',
-                'message': 'Current conditions are excellent for outdoor activities',
-                'recommendation': 'Great time to be outside!',
-                'timestamp': datetime.now().isoformat(),
-                'icon': 'cloud-sun'
-            })
+            cursor.execute("DELETE FROM alerts WHERE expires_at < LOCALTIMESTAMP - make_interval(days => %s)",
+                           (config.ALERT_RETENTION_DAYS,))
+            conn.commit()
+            return {"evaluated": len(owners), "active": len(rows), "new": new_alerts}
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+    
+    def evaluate_locations(self, location_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Evaluate the alert rules for many locations in one pass
         
-        # High humidity warning
-        if humidity > 80:
-            alerts.append({
-                'type': 'comfort',
-                'severity': 'info',
-                'title': '💧 High Humidity',
-                'message': f'Current humidity: {humidity:.0f}%',
-                'recommendation': 'Use dehumidifier for indoor comfort',
-                'timestamp': datetime.now().isoformat(),
-                'icon': 'droplet'
-            })
+        Loads current readings and forecasts for every location with three
+        set-based queries, then runs the vectorized rule engine once.
         
-        return alerts
+        Args:
+            location_ids: Locations to evaluate
+            
+        Returns:
+            location_id -> raw alerts (locations without data map to [])
+        """
+        batch = self._load_batch(location_ids)
+        return self.engine.evaluate(batch)
     
-    def _check_anomaly_alerts(self, location_id: int, weather_data: Dict) -> List[Dict]:
-        """Check for unusual weather patterns using ML anomaly detection"""
-        alerts = []
-        
+    def _load_batch(self, location_ids: List[int]) -> WeatherBatch:
+        """Build (locations x hours) arrays of current and forecast weather"""
+        location_ids = list(dict.fromkeys(location_ids))
+        index = {location_id: i for i, location_id in enumerate(location_ids)}
+        n = len(location_ids)
+        current = {m: np.full(n, np.nan) for m in self.CURRENT_METRICS}
+        forecast = {m: np.full((n, self.FORECAST_HOURS), np.nan) for m in self.FORECAST_METRICS}
+        extra = {"temperature_mean": np.full(n, np.nan), "temperature_std": np.full(n, np.nan)}
+        if not location_ids:
+            return WeatherBatch(location_ids, current, forecast, extra)
+        
+        conn = None
+        cursor = None
         try:
-            # Get anomalies from analytics service
-            anomalies = self.analytics.get_anomalies(location_id, days=7)
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
             
-            current = weather_data.get('current')
-            if not current:
-                return alerts
+            # Latest reading per location from the last 24 hours
+            cursor.execute(f"""
+                SELECT DISTINCT ON (location_id) location_id,
+                       {", ".join(f"{m}::float8" for m in self.CURRENT_METRICS)}
+                FROM weather_data
+                WHERE location_id = ANY(%s)
+                    AND timestamp <= LOCALTIMESTAMP
+                    AND timestamp >= LOCALTIMESTAMP - INTERVAL '24 hours'
+                ORDER BY location_id, timestamp DESC, created_at DESC
+            """, (location_ids,))
+            rows = cursor.fetchall()
+            if rows:
+                rows_idx = np.array([index[row[0]] for row in rows])
+                values = np.array([row[1:] for row in rows], dtype=float)
+                for j, metric in enumerate(self.CURRENT_METRICS):
+                    current[metric][rows_idx] = values[:, j]
             
-            current_time = current.get('timestamp')
-            # Parse timestamp if it's a string
-            if isinstance(current_time, str):
-                current_time = datetime.fromisoformat(current_time.replace('Z', '+00:00'))
+            # Next FORECAST_HOURS hourly rows per location (latest collection wins)
+            cursor.execute(f"""
+                SELECT location_id,
+                       ROW_NUMBER() OVER (PARTITION BY location_id ORDER BY timestamp) - 1 AS step,
+                       {", ".join(f"{m}::float8" for m in self.FORECAST_METRICS)}
+                FROM (
+                    SELECT DISTINCT ON (location_id, timestamp) *
+                    FROM weather_data
+                    WHERE location_id = ANY(%s)
+                        AND timestamp > LOCALTIMESTAMP
+                        AND timestamp <= LOCALTIMESTAMP + make_interval(hours => %s)
+                    ORDER BY location_id, timestamp, created_at DESC
+                ) upcoming
+            """, (location_ids, self.FORECAST_HOURS))
+            rows = [row for row in cursor.fetchall() if row[1] < self.FORECAST_HOURS]
+            if rows:
+                rows_idx = np.array([index[row[0]] for row in rows])
+                steps = np.array([row[1] for row in rows])
+                values = np.array([row[2:] for row in rows], dtype=float)
+                for j, metric in enumerate(self.FORECAST_METRICS):
+                    forecast[metric][rows_idx, steps] = values[:, j]
             
-            # Check if current weather is anomalous
-            for anomaly in anomalies.get('anomalies', []):
-                anomaly_time = anomaly.get('timestamp')
-                # Parse timestamp if it's a string
-                if isinstance(anomaly_time, str):
-                    anomaly_time = datetime.fromisoformat(anomaly_time.replace('Z', '+00:00'))
-                
-                # Check if anomaly is within last hour
-                if anomaly_time and current_time:
-                    time_diff = abs((current_time - anomaly_time).total_seconds() / 3600)
-                    
-                    if time_diff <= 1:
-                        metric = anomaly.get('metric', '')
-                        value = anomaly.get('value', 0)
-                        deviation = anomaly.get('deviation', 0)
-                        
-                        alerts.append({
-                            'type': 'anomaly',
-                            'severity': 'warning',
-                            'title': '⚡ Unusual Weather Pattern',
-                            'message': f'Abnormal {metric}: {value:.1f} (deviation: {deviation:.1f}σ)',
-                            'recommendation': 'Weather conditions differ from historical patterns',
-                            'timestamp': datetime.now().isoformat(),
-                            'icon': 'alert-triangle'
-                        })
-        except Exception as e:
-            print(f"Error checking anomalies: {e}")
-        
-        return alerts
-    
-    def _check_wind_alerts(self, weather_data: Dict, forecast_data: List) -> List[Dict]:
-        """Check for high wind alerts"""
-        alerts = []
-        
-        current = weather_data.get('current')
-        if not current:
-            return alerts
-        
-        windspeed = current.get('wind_speed', 0) or current.get('windspeed', 0)
-        
-        # High wind warning (>50 km/h / 30 mph)
-        if windspeed > 50:
-            alerts.append({
-                'type': 'wind',
-                'severity': 'warning',
-                'title': '💨 High Wind Warning',
-                'message': f'Current wind speed: {windspeed:.0f} km/h ({windspeed * 0.621:.0f} mph)',
-                'recommendation': 'Secure loose outdoor items',
-                'timestamp': datetime.now().isoformat(),
-                'icon': 'wind'
-            })
-        
-        # Check for increasing winds
-        future_winds = [f.get('wind_speed', 0) or f.get('windspeed', 0) for f in forecast_data[:6] if f]
-        if future_winds and max(future_winds) > 60:
-            alerts.append({
-                'type': 'wind',
-                'severity': 'warning',
-                'title': '🌪️ Strong Winds Expected',
-                'message': f'Wind gusts up to {max(future_winds):.0f} km/h expected',
-                'recommendation': 'Prepare for strong winds',
-                'timestamp': datetime.now().isoformat(),
-                'icon': 'wind'
-            })
-        
-        return alerts
-    
-    def _check_uv_alerts(self, forecast_data: List) -> List[Dict]:
-        """Check for UV index alerts (if available in data)"""
-        alerts = []
-        
-        # This would require UV index data in the database
-        # Placeholder for future implementation when UV data is available
-        
-        return alerts
+            # Temperature baseline over the past week for anomaly detection
+            cursor.execute("""
+                SELECT location_id, AVG(temperature)::float8, STDDEV_SAMP(temperature)::float8
+                FROM (
+                    SELECT DISTINCT ON (location_id, timestamp) location_id, temperature
+                    FROM weather_data
+                    WHERE location_id = ANY(%s)
+                        AND timestamp <= LOCALTIMESTAMP
+                        AND timestamp >= LOCALTIMESTAMP - INTERVAL '7 days'
+                    ORDER BY location_id, timestamp, created_at DESC
+                ) recent
+                GROUP BY location_id
+            """, (location_ids,))
+            for location_id, mean, std in cursor.fetchall():
+                extra["temperature_mean"][index[location_id]] = np.nan if mean is None else mean
+                extra["temperature_std"][index[location_id]] = np.nan if std is None else std
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+        
+        return WeatherBatch(location_ids, current, forecast, extra)
     
     def get_alert_summary(self, location_id: int, user_id: int) -> Dict[str, Any]:
         """Get summary of active alerts by type and severity"""
@@ -418,3 +362,16 @@ class AlertsService:
             summary['by_type'][alert_type] = summary['by_type'].get(alert_type, 0) + 1
         
         return summary
+
+
+def push_alert(alert: Dict[str, Any]):
+    """Alert delivery handler: push a newly fired alert to the owner's open streams"""
+    pubsub.publish(user_channel(alert['user_id']), {
+        'type': 'alert',
+        'alert': AlertsService.format_alert(alert)
+    })
+
+
+# Global alerts service instance
+alerts_service = AlertsService()
+alert_delivery.register(push_alert)
@@ -5,10 +5,13 @@ Provides statistical analysis, trend detection, and forecasting for weather data
 
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database.database import HomeNetDatabase
+from services.downsampling import downsample_indices
+from services.columnar import to_json_columns
+from services.forecast_models import fit_linear_trend
+from services.forecasting_service import forecasting_service
 
 db = HomeNetDatabase()
 
@@ -16,30 +19,41 @@ db = HomeNetDatabase()
 class AnalyticsService:
     """Service for analyzing weather data and generating insights"""
     
-    def get_historical_data(
+    # Metric columns returned by get_historical_data, in query order
+    HISTORICAL_METRICS = ["temperature", "apparent_temperature", "humidity", "precipitation", "wind_speed", "uv_index"]
+    
+    def get_historical_columns(
         self, 
         location_id: int, 
-        days: int = 30
+        days: int = 30,
+        max_points: Optional[int] = None,
+        method: str = "lttb",
+        metric: str = "temperature"
     ) -> Dict:
         """
-        Get historical weather data for analysis
+        Get historical weather data as NumPy column arrays
         
         Args:
             location_id: ID of the location
             days: Number of days to retrieve (default 30)
+            max_points: Optional cap on returned points; statistics still use every row
+            method: Downsampling method when capped ("lttb" or "minmax")
+            metric: Metric whose shape the downsampler preserves
             
         Returns:
-            Dictionary with historical data and basic statistics
+            Dictionary with "timestamp" and metric arrays under "columns",
+            plus statistics and point counts
         """
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        
+        # Get weather data for the specified period
+        start_date = datetime.now() - timedelta(days=days)
+        
         try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            # Get weather data for the specified period
-            start_date = datetime.now() - timedelta(days=days)
-            
+            # Each collection re-inserts the hourly forecast, keep the latest row per hour
             cursor.execute("""
-                SELECT 
+                SELECT DISTINCT ON (timestamp)
                     timestamp,
                     temperature,
                     apparent_temperature,
@@ -49,49 +63,83 @@ class AnalyticsService:
                     uv_index
                 FROM weather_data
                 WHERE location_id = %s AND timestamp >= %s
-                ORDER BY timestamp ASC
+                ORDER BY timestamp ASC, created_at DESC
             """, (location_id, start_date))
             
             rows = cursor.fetchall()
+        finally:
             cursor.close()
             conn.close()
+        
+        if not rows:
+            return {"columns": {}, "statistics": {}, "data_points": 0}
+        
+        # One float matrix for all metrics (NULL -> NaN), no per-row dicts
+        timestamps = np.array([row[0] for row in rows], dtype="datetime64[s]")
+        values = np.array([row[1:] for row in rows], dtype=float)
+        columns = dict(zip(self.HISTORICAL_METRICS, values.T))
+        
+        statistics = {
+            "temperature": self._calculate_stats(columns["temperature"]),
+            "humidity": self._calculate_stats(columns["humidity"]),
+            "precipitation": self._calculate_stats(columns["precipitation"]),
+            "wind_speed": self._calculate_stats(columns["wind_speed"]),
+        }
+        
+        # Downsample before serialization so payload size is bounded
+        if max_points and len(rows) > max_points:
+            if metric not in columns:
+                metric = "temperature"
+            indices = downsample_indices(timestamps.astype(np.int64), columns[metric], max_points, method)
+            timestamps = timestamps[indices]
+            columns = {name: column[indices] for name, column in columns.items()}
+        
+        return {
+            "columns": {"timestamp": timestamps, **columns},
+            "statistics": statistics,
+            "data_points": len(rows),
+            "returned_points": len(timestamps),
+            "downsampled": len(timestamps) < len(rows),
+            "period_days": days
+        }
+    
+    def get_historical_data(
+        self, 
+        location_id: int, 
+        days: int = 30,
+        max_points: Optional[int] = None,
+        method: str = "lttb",
+        metric: str = "temperature"
+    ) -> Dict:
+        """
+        Get historical weather data for analysis
+        
+        Args:
+            location_id: ID of the location
+            days: Number of days to retrieve (default 30)
+            max_points: Optional cap on returned points; statistics still use every row
+            method: Downsampling method when capped ("lttb" or "minmax")
+            metric: Metric whose shape the downsampler preserves
             
-            if not rows:
+        Returns:
+            Dictionary with historical data and basic statistics
+        """
+        try:
+            historical = self.get_historical_columns(location_id, days, max_points, method, metric)
+            columns = historical.pop("columns")
+            
+            if not columns:
                 return {
                     "data": [],
                     "statistics": {},
                     "data_points": 0
                 }
             
-            # Convert to list of dictionaries
-            data = []
-            for row in rows:
-                data.append({
-                    "timestamp": row[0].isoformat(),
-                    "temperature": float(row[1]) if row[1] else None,
-                    "apparent_temperature": float(row[2]) if row[2] else None,
-                    "humidity": float(row[3]) if row[3] else None,
-                    "precipitation": float(row[4]) if row[4] else None,
-                    "wind_speed": float(row[5]) if row[5] else None,
-                    "uv_index": float(row[6]) if row[6] else None
-                })
-            
-            # Calculate basic statistics
-            df = pd.DataFrame(data)
-            
-            statistics = {
-                "temperature": self._calculate_stats(df, "temperature"),
-                "humidity": self._calculate_stats(df, "humidity"),
-                "precipitation": self._calculate_stats(df, "precipitation"),
-                "wind_speed": self._calculate_stats(df, "wind_speed"),
-            }
+            # Row format for existing clients, built from the column lists
+            names = list(columns)
+            data = [dict(zip(names, row)) for row in zip(*to_json_columns(columns).values())]
             
-            return {
-                "data": data,
-                "statistics": statistics,
-                "data_points": len(data),
-                "period_days": days
-            }
+            return {"data": data, **historical}
             
         except Exception as e:
             print(f"Error getting historical data: {e}")
@@ -152,15 +200,12 @@ class AnalyticsService:
             timestamps = [(row[0] - rows[0][0]).total_seconds() / 3600 for row in rows]  # Hours from start
             values = [float(row[1]) for row in rows]
             
-            # Fit linear regression
-            X = np.array(timestamps).reshape(-1, 1)
-            y = np.array(values)
-            
-            model = LinearRegression()
-            model.fit(X, y)
-            
-            slope = float(model.coef_[0])
-            r_squared = float(model.score(X, y))
+            # Predict 24 hours ahead for visualization
+            future_hours = 24
+            fit = fit_linear_trend(np.array(timestamps), np.array(values), future_hours)
+            slope = fit["slope"]
+            r_squared = fit["r_squared"]
+            predictions = fit["predictions"].tolist()
             
             # Determine trend direction
             if abs(slope) < 0.01:
@@ -170,11 +215,6 @@ class AnalyticsService:
             else:
                 direction = "decreasing"
             
-            # Calculate predictions for visualization
-            future_hours = 24  # Predict 24 hours ahead
-            future_X = np.array(timestamps + [timestamps[-1] + i for i in range(1, future_hours + 1)]).reshape(-1, 1)
-            predictions = model.predict(future_X).tolist()
-            
             return {
                 "metric": metric,
                 "trend": direction,
@@ -183,7 +223,7 @@ class AnalyticsService:
                 "direction": direction,
                 "confidence": r_squared,
                 "data_points": len(rows),
-                "predictions": predictions[-future_hours:],
+                "predictions": predictions,
                 "current_value": values[-1] if values else None,
                 "predicted_24h": predictions[-1] if predictions else None
             }
@@ -198,7 +238,10 @@ class AnalyticsService:
         hours: int = 24
     ) -> Dict:
         """
-        Generate simple weather forecast using historical patterns
+        Generate a weather forecast for a location
+        
+        Served from the location's trained seasonal models when available,
+        otherwise from a linear extrapolation of the last 7 days.
         
         Args:
             location_id: ID of the location
@@ -208,6 +251,10 @@ class AnalyticsService:
             Dictionary with forecasted values for key metrics
         """
         try:
+            forecast = forecasting_service.forecast(location_id, hours)
+            if forecast and forecast["forecasts"]:
+                return forecast
+            
             # Get trends for multiple metrics
             metrics = ["temperature", "humidity", "precipitation", "wind_speed"]
             forecasts = {}
@@ -227,6 +274,7 @@ class AnalyticsService:
                 "location_id": location_id,
                 "forecast_hours": hours,
                 "generated_at": datetime.now().isoformat(),
+                "model": "linear",
                 "forecasts": forecasts
             }
             
@@ -333,9 +381,206 @@ class AnalyticsService:
             print(f"Error generating summary: {e}")
             raise
     
-    def _calculate_stats(self, df: pd.DataFrame, column: str) -> Dict:
-        """Calculate statistics for a column"""
-        if column not in df.columns or df[column].isna().all():
+    # Metrics summarized by get_batch_analytics, in query order
+    BATCH_METRICS = ["temperature", "humidity", "precipitation", "wind_speed"]
+    
+    def get_batch_analytics(
+        self,
+        user_id: int,
+        location_ids: List[int],
+        days: int = 30
+    ) -> Dict:
+        """
+        Summaries, trends and anomalies for many locations at once
+        
+        One set-based query returns every location's rows (with per-location
+        window aggregates for the anomaly baseline), and one vectorized NumPy
+        pass computes all groups together instead of a query per location.
+        
+        Args:
+            user_id: Owner of the locations; other users' locations are ignored
+            location_ids: IDs of the locations to analyze
+            days: Number of days to analyze
+            
+        Returns:
+            Dictionary with per-location results keyed by location ID and the
+            requested IDs that had no data
+        """
+        try:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            
+            start_date = datetime.now() - timedelta(days=days)
+            
+            cursor.execute("""
+                SELECT location_id, timestamp, hours,
+                       temperature, humidity, precipitation, wind_speed,
+                       AVG(temperature) OVER loc AS temp_mean,
+                       STDDEV_SAMP(temperature) OVER loc AS temp_std
+                FROM (
+                    SELECT DISTINCT ON (w.location_id, w.timestamp)
+                        w.location_id,
+                        w.timestamp,
+                        EXTRACT(EPOCH FROM w.timestamp)::float8 / 3600.0 AS hours,
+                        w.temperature::float8 AS temperature,
+                        w.humidity::float8 AS humidity,
+                        w.precipitation::float8 AS precipitation,
+                        w.wind_speed::float8 AS wind_speed
+                    FROM weather_data w
+                    JOIN user_locations ul ON ul.id = w.location_id
+                    WHERE ul.user_id = %s
+                        AND w.location_id = ANY(%s)
+                        AND w.timestamp >= %s
+                    ORDER BY w.location_id, w.timestamp, w.created_at DESC
+                ) latest
+                WINDOW loc AS (PARTITION BY location_id)
+                ORDER BY location_id, timestamp
+            """, (user_id, list(location_ids), start_date))
+            
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            
+            if not rows:
+                return {"locations": {}, "missing": sorted(set(location_ids)), "period_days": days}
+            
+            location_col = np.array([row[0] for row in rows])
+            timestamps = [row[1] for row in rows]
+            numeric = np.array([row[2:] for row in rows], dtype=float)
+            hours = numeric[:, 0]
+            values = numeric[:, 1:1 + len(self.BATCH_METRICS)]
+            temp_mean, temp_std = numeric[:, -2], numeric[:, -1]
+            
+            # Rows are sorted by location: each group is a contiguous segment
+            ids, starts = np.unique(location_col, return_index=True)
+            counts = np.diff(np.append(starts, len(rows)))
+            group = np.repeat(np.arange(len(ids)), counts)
+            
+            statistics = {}
+            trends = {}
+            for j, metric in enumerate(self.BATCH_METRICS):
+                stats, slope = self._grouped_stats_and_slope(hours, values[:, j], starts, group)
+                statistics[metric] = stats
+                trends[metric] = slope
+            
+            anomalies = self._grouped_anomalies(
+                values[:, 0], temp_mean, temp_std, timestamps, group, len(ids)
+            )
+            
+            generated_at = datetime.now().isoformat()
+            locations = {}
+            for g, location_id in enumerate(ids.tolist()):
+                locations[location_id] = {
+                    "period": {
+                        "days": days,
+                        "data_points": int(counts[g])
+                    },
+                    "statistics": {m: statistics[m][g] for m in self.BATCH_METRICS},
+                    "trends": {
+                        m: {
+                            "direction": self._direction(trends[m][g]),
+                            "change_per_day": trends[m][g] * 24
+                        }
+                        for m in ("temperature", "humidity")
+                    },
+                    "anomalies": anomalies[g],
+                    "generated_at": generated_at
+                }
+            
+            return {
+                "locations": locations,
+                "missing": sorted(set(location_ids) - set(locations)),
+                "period_days": days
+            }
+            
+        except Exception as e:
+            print(f"Error generating batch analytics: {e}")
+            raise
+    
+    def _grouped_stats_and_slope(
+        self,
+        hours: np.ndarray,
+        values: np.ndarray,
+        starts: np.ndarray,
+        group: np.ndarray
+    ) -> Tuple[List[Dict], List[float]]:
+        """Per-group mean/min/max/std and least-squares slope (per hour) in one pass"""
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        
+        n = np.add.reduceat(present.astype(float), starts)
+        safe_n = np.maximum(n, 1)
+        mean = np.add.reduceat(filled, starts) / safe_n
+        minimum = np.minimum.reduceat(np.where(present, values, np.inf), starts)
+        maximum = np.maximum.reduceat(np.where(present, values, -np.inf), starts)
+        
+        # Centered sums keep the regression numerically stable on epoch hours
+        x_mean = np.add.reduceat(np.where(present, hours, 0.0), starts) / safe_n
+        dx = np.where(present, hours - x_mean[group], 0.0)
+        dy = np.where(present, values - mean[group], 0.0)
+        sxx = np.add.reduceat(dx * dx, starts)
+        sxy = np.add.reduceat(dx * dy, starts)
+        syy = np.add.reduceat(dy * dy, starts)
+        
+        std = np.sqrt(syy / np.maximum(n - 1, 1))
+        slope = np.where((n >= 2) & (sxx > 0), sxy / np.where(sxx > 0, sxx, 1.0), 0.0)
+        
+        stats = [
+            {"mean": None, "min": None, "max": None, "std": None} if n[g] == 0 else {
+                "mean": float(mean[g]),
+                "min": float(minimum[g]),
+                "max": float(maximum[g]),
+                "std": float(std[g]) if n[g] > 1 else None
+            }
+            for g in range(len(starts))
+        ]
+        return stats, slope.tolist()
+    
+    def _grouped_anomalies(
+        self,
+        temperature: np.ndarray,
+        temp_mean: np.ndarray,
+        temp_std: np.ndarray,
+        timestamps: List[datetime],
+        group: np.ndarray,
+        n_groups: int,
+        limit: int = 10
+    ) -> List[Dict]:
+        """Flag temperatures more than 2 standard deviations from their location's mean"""
+        with np.errstate(invalid="ignore"):
+            deviation = np.abs(temperature - temp_mean)
+            flagged = np.flatnonzero(deviation > 2 * temp_std)
+        
+        totals = np.bincount(group[flagged], minlength=n_groups)
+        results = [{"anomalies": [], "total": int(totals[g])} for g in range(n_groups)]
+        
+        # Keep the first `limit` anomalies of each group without a Python loop over rows
+        flagged_groups = group[flagged]
+        _, first = np.unique(flagged_groups, return_index=True)
+        rank = np.arange(len(flagged)) - np.repeat(first, np.diff(np.append(first, len(flagged))))
+        
+        for i in flagged[rank < limit]:
+            mean, std = temp_mean[i], temp_std[i]
+            results[group[i]]["anomalies"].append({
+                "timestamp": timestamps[i].isoformat(),
+                "metric": "temperature",
+                "value": float(temperature[i]),
+                "expected_range": [float(mean - 2 * std), float(mean + 2 * std)],
+                "severity": "high" if deviation[i] > 3 * std else "medium"
+            })
+        
+        return results
+    
+    def _direction(self, slope: float) -> str:
+        """Classify a per-hour slope the same way get_trends does"""
+        if abs(slope) < 0.01:
+            return "stable"
+        return "increasing" if slope > 0 else "decreasing"
+    
+    def _calculate_stats(self, values: np.ndarray) -> Dict:
+        """Calculate statistics for a metric column (NaN = missing)"""
+        present = values[~np.isnan(values)]
+        if present.size == 0:
             return {
                 "mean": None,
                 "min": None,
@@ -344,10 +589,10 @@ class AnalyticsService:
             }
         
         return {
-            "mean": float(df[column].mean()),
-            "min": float(df[column].min()),
-            "max": float(df[column].max()),
-            "std": float(df[column].std())
+            "mean": float(present.mean()),
+            "min": float(present.min()),
+            "max": float(present.max()),
+            "std": float(present.std(ddof=1)) if present.size > 1 else None
         }
 
 
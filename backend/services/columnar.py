@@ -0,0 +1,81 @@
+"""
+Columnar response helpers for HomeNetAI
+Serialize NumPy column arrays as JSON column lists or Arrow IPC streams
+"""
+
+import json
+from typing import Dict, Optional, Union
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow responses are optional
+    pa = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+FORMATS = ("rows", "columns", "arrow")
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the response format from the ?format= parameter or the Accept header
+
+    An explicit parameter (rows, columns or arrow) wins; without one an Accept
+    header asking for Arrow selects Arrow, and everything else keeps the row
+    format.
+    """
+    if requested:
+        return requested
+    if accept and ARROW_MEDIA_TYPE in accept:
+        return "arrow"
+    return "rows"
+
+
+def column_to_list(values: np.ndarray) -> list:
+    """Convert one column to a JSON-ready list (NaN -> None, datetimes -> ISO strings)"""
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return np.datetime_as_string(values, unit="s").tolist()
+    if values.dtype.kind == "f":
+        out = values.astype(object)
+        out[np.isnan(values)] = None
+        return out.tolist()
+    return values.tolist()
+
+
+def to_json_columns(columns: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """Convert a dict of column arrays to a dict of JSON lists"""
+    return {name: column_to_list(values) for name, values in columns.items()}
+
+
+def to_arrow_ipc(columns: Dict[str, np.ndarray], metadata: Optional[Dict] = None) -> bytes:
+    """
+    Encode column arrays as a single Arrow IPC stream
+
+    Non-columnar fields (statistics, trend summary...) travel as JSON in the
+    schema metadata under the "homenet" key.
+    """
+    if pa is None:
+        raise RuntimeError("Arrow responses require the pyarrow package")
+
+    table = pa.table({
+        name: pa.array(np.asarray(values), from_pandas=True)
+        for name, values in columns.items()
+    })
+    if metadata:
+        table = table.replace_schema_metadata({"homenet": json.dumps(metadata, default=str)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def columnar_response(response_format: str, metadata: Dict,
+                      columns: Dict[str, np.ndarray]) -> Union[Dict, Response]:
+    """Build a columns-JSON body or an Arrow IPC response"""
+    if response_format == "arrow":
+        return Response(content=to_arrow_ipc(columns, metadata), media_type=ARROW_MEDIA_TYPE)
+    return {**metadata, "format": "columns", "columns": to_json_columns(columns)}
@@ -0,0 +1,251 @@
+"""
+User Context Service for HomeNetAI
+Caches each user's AI context (locations, latest weather, forecast, devices)
+until something it was built from changes
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from config import config
+from database.database import HomeNetDatabase
+from services.pubsub import pubsub
+
+
+@dataclass(frozen=True)
+class ContextSnapshot:
+    """Precomputed context for one user; rebuilt rather than mutated"""
+    user_id: int
+    context: Dict[str, Any]
+    rendered: Any  # prompt_builder.RenderedContext
+    built_at: float
+
+
+class UserContextService:
+    """
+    Per-user LRU cache of ContextSnapshots with event-driven invalidation
+
+    Snapshots are dropped when the user's devices or locations change (the
+    routes call invalidate) and when the scheduler ingests weather for one of
+    their locations (a "weather" message on user:<id>). Invalidations are
+    broadcast on context:<id> so every API worker drops its copy.
+    CONTEXT_CACHE_SECONDS is only a safety net for missed events.
+    """
+
+    def __init__(self, max_users: int = config.CONTEXT_CACHE_SIZE,
+                 ttl_seconds: int = config.CONTEXT_CACHE_SECONDS):
+        self.db = HomeNetDatabase()
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._snapshots: "OrderedDict[int, ContextSnapshot]" = OrderedDict()
+        self._user_ids: "OrderedDict[str, int]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        """Resolve a username to its user ID, cached for the life of the account"""
+        self._ensure_subscribed()
+        with self._lock:
+            if username in self._user_ids:
+                self._user_ids.move_to_end(username)
+                return self._user_ids[username]
+
+        rows = self.db.execute_query("SELECT id FROM users WHERE username = %s", (username,),
+                                     name="get_user_id")
+        if not rows:
+            return None
+        with self._lock:
+            self._user_ids[username] = rows[0]["id"]
+            if len(self._user_ids) > self.max_users:
+                self._user_ids.popitem(last=False)
+        return rows[0]["id"]
+
+    def get_snapshot(self, user_id: int, renderer) -> ContextSnapshot:
+        """
+        Return the user's context snapshot, loading it on a miss
+
+        Args:
+            user_id: User ID
+            renderer: Function rendering a context dict for the prompt builder
+
+        Returns:
+            ContextSnapshot (a cache hit touches no database connection)
+        """
+        self._ensure_subscribed()
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot and time.time() - snapshot.built_at < self.ttl_seconds:
+                self._snapshots.move_to_end(user_id)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            generation = self._generations.get(user_id, 0)
+
+        context = self._load_context(user_id)
+        snapshot = ContextSnapshot(user_id, context, renderer(context), time.time())
+
+        with self._lock:
+            # Skip caching if the user was invalidated while we were loading
+            if context and self._generations.get(user_id, 0) == generation:
+                self._snapshots[user_id] = snapshot
+                self._snapshots.move_to_end(user_id)
+                if len(self._snapshots) > self.max_users:
+                    self._snapshots.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id: int, username: Optional[str] = None):
+        """
+        Drop a user's snapshot here and on every other API worker
+
+        Pass username when the account itself is deleted so the username
+        mapping is dropped too.
+        """
+        self._drop(user_id, username)
+        pubsub.publish(f"context:{user_id}", {"type": "invalidate", "username": username})
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._snapshots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    def _drop(self, user_id: int, username: Optional[str] = None):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._snapshots.pop(user_id, None)
+            if username:
+                self._user_ids.pop(username, None)
+            self.invalidations += 1
+
+    def _ensure_subscribed(self):
+        if not self._subscribed:
+            self._subscribed = True
+            pubsub.subscribe(self._on_message)
+
+    def _on_message(self, channel: str, message: Dict[str, Any]):
+        kind, _, user_id = channel.partition(":")
+        if kind == "context":
+            self._drop(int(user_id), message.get("username"))
+        elif kind == "user" and message.get("type") == "weather":
+            self._drop(int(user_id))
+
+    def _load_context(self, user_id: int) -> Dict[str, Any]:
+        """Gather the user's locations, latest weather, forecast and devices on one connection"""
+        conn = None
+        cursor = None
+        context = {}
+
+        try:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+
+            # Get user's locations
+            cursor.execute("""
+                SELECT id, name, latitude, longitude
+                FROM user_locations
+                WHERE user_id = %s
+            """, (user_id,))
+
+            locations = []
+            for row in cursor.fetchall():
+                locations.append({
+                    "id": row[0],
+                    "name": row[1],
+                    "latitude": float(row[2]),
+                    "longitude": float(row[3])
+                })
+            context["locations"] = locations
+
+            # Get current weather and forecast for first location
+            if locations:
+                location_id = locations[0]["id"]
+
+                cursor.execute("""
+                    SELECT temperature, apparent_temperature, humidity,
+                           precipitation, wind_speed, wind_direction,
+                           cloud_cover, weather_code, timestamp
+                    FROM weather_data
+                    WHERE location_id = %s
+                    ORDER BY timestamp DESC
+                    LIMIT 1
+                """, (location_id,))
+
+                weather_row = cursor.fetchone()
+                if weather_row:
+                    context["current_weather"] = {
+                        "temperature": float(weather_row[0]) if weather_row[0] is not None else None,
+                        "apparent_temperature": float(weather_row[1]) if weather_row[1] is not None else None,
+                        "humidity": float(weather_row[2]) if weather_row[2] is not None else None,
+                        "precipitation": float(weather_row[3]) if weather_row[3] is not None else None,
+                        "wind_speed": float(weather_row[4]) if weather_row[4] is not None else None,
+                        "wind_direction": float(weather_row[5]) if weather_row[5] is not None else None,
+                        "cloud_cover": float(weather_row[6]) if weather_row[6] is not None else None,
+                        "weather_code": int(weather_row[7]) if weather_row[7] is not None else None,
+                        "timestamp": weather_row[8].isoformat() if weather_row[8] else None
+                    }
+
+                cursor.execute("""
+                    SELECT date, temp_max, temp_min, precipitation_sum,
+                           precipitation_probability_max, wind_speed_max
+                    FROM daily_weather
+                    WHERE location_id = %s AND date >= CURRENT_DATE
+                    ORDER BY date
+                    LIMIT 7
+                """, (location_id,))
+
+                forecast = []
+                for row in cursor.fetchall():
+                    forecast.append({
+                        "date": row[0].isoformat() if row[0] else None,
+                        "temp_max": float(row[1]) if row[1] is not None else None,
+                        "temp_min": float(row[2]) if row[2] is not None else None,
+                        "precipitation_sum": float(row[3]) if row[3] is not None else None,
+                        "precipitation_probability_max": float(row[4]) if row[4] is not None else None,
+                        "wind_speed_max": float(row[5]) if row[5] is not None else None
+                    })
+                context["forecast"] = forecast
+
+            # Get devices
+            cursor.execute("""
+                SELECT id, name, type, status, room, value
+                FROM devices
+                WHERE user_id = %s
+            """, (user_id,))
+
+            devices = []
+            for row in cursor.fetchall():
+                devices.append({
+                    "id": row[0],
+                    "name": row[1],
+                    "type": row[2],
+                    "status": row[3],
+                    "room": row[4],
+                    "value": float(row[5]) if row[5] is not None else None
+                })
+            context["devices"] = devices
+
+            return context
+
+        except Exception as e:
+            print(f"Error getting user context: {e}", flush=True)
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+
+# Global user context service
+context_service = UserContextService()
@@ -0,0 +1,184 @@
+"""
+Conversation Store for HomeNetAI
+Persists AI chat turns and keeps each conversation's history bounded with a rolling summary
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from config import config
+from database.database import HomeNetDatabase
+
+# summarizer(previous_summary, messages) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+class Conversation:
+    """In-memory state of one conversation: its summary plus the unsummarized turns"""
+
+    def __init__(self, conversation_id: str, user_id: int, summary: str = "",
+                 summarized_through: int = 0, messages: Optional[List[Dict]] = None):
+        self.id = conversation_id
+        self.user_id = user_id
+        self.summary = summary
+        self.summarized_through = summarized_through
+        self.messages = messages or []  # [{"seq", "role", "content"}], seq ascending
+        self.lock = threading.Lock()
+        self.compacting = False
+
+    @property
+    def next_seq(self) -> int:
+        return self.messages[-1]["seq"] + 1 if self.messages else self.summarized_through + 1
+
+    def history(self) -> List[Dict[str, str]]:
+        """Unsummarized turns as {"role", "content"} dicts, oldest first"""
+        with self.lock:
+            return [{"role": m["role"], "content": m["content"]} for m in self.messages]
+
+
+class ConversationStore:
+    """
+    Conversations in Postgres with an LRU of hot ones in memory
+
+    A turn on a hot conversation costs one write and no reads. History sent to
+    the model is the rolling summary plus at most CONVERSATION_MAX_MESSAGES
+    recent turns, so prompt size stays flat however long the chat runs.
+    """
+
+    def __init__(self, max_conversations: int = config.CONVERSATION_CACHE_SIZE):
+        self.db = HomeNetDatabase()
+        self.max_conversations = max_conversations
+        self._cache: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, conversation_id: Optional[str], user_id: int) -> Optional[Conversation]:
+        """
+        Load a user's conversation, creating it when the ID is new or missing
+
+        Returns:
+            Conversation, or None if the ID belongs to another user
+        """
+        conversation_id = conversation_id or str(uuid.uuid4())
+        with self._lock:
+            conversation = self._cache.get(conversation_id)
+            if conversation:
+                self._cache.move_to_end(conversation_id)
+        if conversation is None:
+            conversation = self._load(conversation_id, user_id)
+        if conversation.user_id != user_id:
+            return None
+
+        with self._lock:
+            conversation = self._cache.setdefault(conversation_id, conversation)
+            self._cache.move_to_end(conversation_id)
+            if len(self._cache) > self.max_conversations:
+                self._cache.popitem(last=False)
+        return conversation
+
+    def add_turn(self, conversation: Conversation, user_message: str, reply: str):
+        """Persist a user message and the assistant's reply, and add them to the history"""
+        with conversation.lock:
+            seq = conversation.next_seq
+            turn = [
+                {"seq": seq, "role": "user", "content": user_message},
+                {"seq": seq + 1, "role": "assistant", "content": reply},
+            ]
+            conversation.messages.extend(turn)
+
+        conn = None
+        cursor = None
+        try:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            execute_values(cursor, """
+                INSERT INTO conversation_messages (conversation_id, seq, role, content) VALUES %s
+            """, [(conversation.id, m["seq"], m["role"], m["content"]) for m in turn])
+            cursor.execute("""
+                UPDATE conversations SET message_count = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (seq + 1, conversation.id))
+            conn.commit()
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def needs_compaction(self, conversation: Conversation) -> bool:
+        return len(conversation.messages) > config.CONVERSATION_MAX_MESSAGES and not conversation.compacting
+
+    def compact(self, conversation: Conversation, summarizer: Summarizer):
+        """
+        Fold all but the last CONVERSATION_KEEP_MESSAGES turns into the summary
+
+        Meant to run after the response has been sent, so the summarizer call
+        never adds latency to a chat turn.
+        """
+        with conversation.lock:
+            if conversation.compacting:
+                return
+            fold_count = len(conversation.messages) - config.CONVERSATION_KEEP_MESSAGES
+            if fold_count <= 0:
+                return
+            conversation.compacting = True
+            folded = conversation.messages[:fold_count]
+            previous_summary = conversation.summary
+
+        try:
+            summary = summarizer(previous_summary, [{"role": m["role"], "content": m["content"]} for m in folded])
+            summary = summary.strip()[-config.CONVERSATION_SUMMARY_CHARS:]
+            through = folded[-1]["seq"]
+
+            self.db.execute_query("""
+                UPDATE conversations SET summary = %s, summarized_through = %s
+                WHERE id = %s
+            """, (summary, through, conversation.id), name="compact_conversation")
+
+            with conversation.lock:
+                conversation.summary = summary
+                conversation.summarized_through = through
+                conversation.messages = [m for m in conversation.messages if m["seq"] > through]
+        except Exception as e:
+            print(f"Error summarizing conversation {conversation.id}: {e}")
+        finally:
+            conversation.compacting = False
+
+    def _load(self, conversation_id: str, user_id: int) -> Conversation:
+        """Read a conversation and its unsummarized turns, inserting it if new"""
+        conn = None
+        cursor = None
+        try:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO conversations (id, user_id) VALUES (%s, %s)
+                ON CONFLICT (id) DO NOTHING
+            """, (conversation_id, user_id))
+            cursor.execute("""
+                SELECT user_id, summary, summarized_through FROM conversations WHERE id = %s
+            """, (conversation_id,))
+            owner, summary, summarized_through = cursor.fetchone()
+
+            messages = []
+            if owner == user_id:
+                cursor.execute("""
+                    SELECT seq, role, content FROM conversation_messages
+                    WHERE conversation_id = %s AND seq > %s
+                    ORDER BY seq
+                """, (conversation_id, summarized_through))
+                messages = [{"seq": row[0], "role": row[1], "content": row[2]} for row in cursor.fetchall()]
+            conn.commit()
+            return Conversation(conversation_id, owner, summary, summarized_through, messages)
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+
+# Global conversation store
+conversation_store = ConversationStore()
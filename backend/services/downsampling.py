@@ -0,0 +1,99 @@
+"""
+Downsampling helpers for HomeNetAI analytics
+Reduce long time series to a bounded number of points before serialization
+"""
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Select points with Largest-Triangle-Three-Buckets
+
+    Args:
+        x: Monotonic x values (e.g. epoch seconds)
+        y: Values to preserve the visual shape of (NaNs are never selected
+           unless a bucket contains nothing else)
+        n_out: Number of points to keep (including first and last)
+
+    Returns:
+        Sorted array of selected indices into x/y
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    y_filled = np.where(np.isnan(y), np.nanmean(y) if np.any(~np.isnan(y)) else 0.0, y)
+
+    # Interior points split into n_out - 2 equal-count buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    bucket_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges)
+    bucket_y = np.add.reduceat(y_filled[1:n - 1], edges[:-1] - 1) / np.diff(edges)
+    # The average used for the last bucket is the final point itself
+    next_x = np.append(bucket_x[1:], x[-1])
+    next_y = np.append(bucket_y[1:], y_filled[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs(
+            (x[prev] - next_x[i]) * (y_filled[lo:hi] - y_filled[prev])
+            - (x[prev] - x[lo:hi]) * (next_y[i] - y_filled[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Keep the minimum and maximum of each equal-count bucket
+
+    Fully vectorized; preserves peaks exactly, which matters for extremes such
+    as temperature highs or precipitation bursts.
+
+    Args:
+        y: Values to downsample
+        n_out: Approximate number of points to keep (two per bucket)
+
+    Returns:
+        Sorted, de-duplicated array of selected indices
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    size = int(np.max(np.diff(edges)))
+
+    # Pad every bucket to the same width so argmin/argmax run as one 2-D op
+    offsets = edges[:-1, None] + np.arange(size)[None, :]
+    valid = offsets < edges[1:, None]
+    offsets = np.minimum(offsets, n - 1)
+    values = y[offsets]
+
+    low = np.where(valid & ~np.isnan(values), values, np.inf)
+    high = np.where(valid & ~np.isnan(values), values, -np.inf)
+    rows = np.arange(n_buckets)
+    picks = np.concatenate([offsets[rows, np.argmin(low, axis=1)], offsets[rows, np.argmax(high, axis=1)]])
+
+    return np.unique(picks)
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: int, method: str = "lttb") -> np.ndarray:
+    """Dispatch to the requested downsampling method"""
+    if method == "minmax":
+        return minmax_indices(y, max_points)
+    return lttb_indices(x, y, max_points)
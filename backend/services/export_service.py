@@ -0,0 +1,211 @@
+"""
+Export Service for HomeNetAI
+Streams historical weather data out of PostgreSQL as NDJSON, CSV or Arrow IPC
+"""
+
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional, Sequence
+
+from psycopg2 import sql
+
+from database.database import HomeNetDatabase
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow export is optional
+    pa = None
+
+db = HomeNetDatabase()
+
+
+class ExportService:
+    """Service for bulk, bounded-memory exports of weather history"""
+
+    EXPORT_METRICS = [
+        "temperature", "apparent_temperature", "humidity", "precipitation",
+        "precipitation_probability", "wind_speed", "wind_direction",
+        "cloud_cover", "uv_index", "weather_code"
+    ]
+    FORMATS = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+        "arrow": "application/vnd.apache.arrow.stream",
+    }
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+
+    @property
+    def arrow_available(self) -> bool:
+        return pa is not None
+
+    def get_owned_location_ids(self, user_id: int, location_ids: Sequence[int]) -> List[int]:
+        """Return the subset of location_ids that belong to user_id"""
+        conn = None
+        cursor = None
+        try:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id FROM user_locations
+                WHERE user_id = %s AND id = ANY(%s)
+                ORDER BY id
+            """, (user_id, list(location_ids)))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def resolve_metrics(self, metrics: Optional[Sequence[str]]) -> List[str]:
+        """Validate requested metric names, defaulting to all of them"""
+        if not metrics:
+            return list(self.EXPORT_METRICS)
+        invalid = [m for m in metrics if m not in self.EXPORT_METRICS]
+        if invalid:
+            raise ValueError(f"Unknown metrics: {', '.join(invalid)}")
+        return list(metrics)
+
+    def iter_batches(
+        self,
+        location_ids: Sequence[int],
+        metrics: Sequence[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        latest_only: bool = True
+    ) -> Iterator[List[tuple]]:
+        """
+        Yield row batches from a server-side (named) cursor
+
+        Only batch_size rows are held in memory at a time, and the next batch is
+        fetched only when the consumer asks for it, so a slow client slows the
+        query down instead of buffering the result.
+
+        Args:
+            location_ids: Locations to export (already ownership-checked)
+            metrics: Metric columns to include
+            start: Inclusive lower bound on timestamp
+            end: Exclusive upper bound on timestamp
+            latest_only: Keep only the latest collected row per location and hour
+
+        Yields:
+            Lists of (location_id, timestamp, *metrics) tuples
+        """
+        conditions = [sql.SQL("location_id = ANY(%s)")]
+        params = [list(location_ids)]
+        if start:
+            conditions.append(sql.SQL("timestamp >= %s"))
+            params.append(start)
+        if end:
+            conditions.append(sql.SQL("timestamp < %s"))
+            params.append(end)
+
+        columns = sql.SQL(", ").join(
+            sql.SQL("{}::int").format(sql.Identifier(m)) if m == "weather_code"
+            else sql.SQL("{}::float8").format(sql.Identifier(m))
+            for m in metrics
+        )
+        distinct = sql.SQL("DISTINCT ON (location_id, timestamp)") if latest_only else sql.SQL("")
+        order = sql.SQL("location_id, timestamp, created_at DESC") if latest_only else sql.SQL("location_id, timestamp")
+        query = sql.SQL("""
+            SELECT {distinct} location_id, timestamp, {columns}
+            FROM weather_data
+            WHERE {conditions}
+            ORDER BY {order}
+        """).format(
+            distinct=distinct,
+            columns=columns,
+            conditions=sql.SQL(" AND ").join(conditions),
+            order=order
+        )
+
+        conn = None
+        cursor = None
+        try:
+            conn = db.get_connection()
+            # Named cursors stream from the server instead of materializing the result
+            cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+            cursor.itersize = self.batch_size
+            cursor.execute(query, params)
+
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.rollback()
+                conn.close()
+
+    def stream(self, export_format: str, location_ids: Sequence[int], metrics: Sequence[str],
+               start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[bytes]:
+        """Encode exported batches in the requested format"""
+        batches = self.iter_batches(location_ids, metrics, start, end)
+        if export_format == "csv":
+            return self._iter_csv(batches, metrics)
+        if export_format == "arrow":
+            return self._iter_arrow(batches, metrics)
+        return self._iter_ndjson(batches, metrics)
+
+    def _iter_ndjson(self, batches: Iterator[List[tuple]], metrics: Sequence[str]) -> Iterator[bytes]:
+        keys = ["location_id", "timestamp", *metrics]
+        for rows in batches:
+            lines = []
+            for row in rows:
+                record = dict(zip(keys, row))
+                record["timestamp"] = row[1].isoformat()
+                lines.append(json.dumps(record))
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _iter_csv(self, batches: Iterator[List[tuple]], metrics: Sequence[str]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["location_id", "timestamp", *metrics])
+        for rows in batches:
+            for row in rows:
+                writer.writerow((row[0], row[1].isoformat(), *row[2:]))
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _iter_arrow(self, batches: Iterator[List[tuple]], metrics: Sequence[str]) -> Iterator[bytes]:
+        if pa is None:
+            raise RuntimeError("Arrow export requires the pyarrow package")
+
+        fields = [pa.field("location_id", pa.int32()), pa.field("timestamp", pa.timestamp("s"))]
+        fields += [pa.field(m, pa.int32() if m == "weather_code" else pa.float64()) for m in metrics]
+        schema = pa.schema(fields)
+
+        buffer = io.BytesIO()
+        writer = pa.ipc.new_stream(buffer, schema)
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(col, type=field.type) for col, field in zip(columns, fields)],
+                schema=schema
+            ))
+            # Hand each encoded batch to the client instead of growing the buffer
+            yield self._drain(buffer)
+        writer.close()
+        yield self._drain(buffer)
+
+    @staticmethod
+    def _drain(buffer: io.BytesIO) -> bytes:
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+
+# Global export service instance
+export_service = ExportService()
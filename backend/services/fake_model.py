@@ -0,0 +1,73 @@
+"""
+Local Fake Model for HomeNetAI
+Stands in for a Gemini GenerativeModel in development and benchmarks (AI_FAKE_MODEL=true)
+
+Implements the slice of the google.generativeai API that AIService uses:
+start_chat(history).send_message(text, stream=...) and generate_content(prompt, stream=...).
+Replies are deterministic and streamed word by word with a fixed delay.
+"""
+
+import time
+from typing import Dict, Iterator, List, Optional
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeResponse:
+    """Whole-reply (.text) or streamed (iterate for FakeChunks) response"""
+
+    def __init__(self, model: "FakeGenerativeModel", text: str, stream: bool):
+        self._model = model
+        self._text = text
+        self._stream = stream
+        if not stream:
+            time.sleep(model.token_delay * len(text.split()))
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def __iter__(self) -> Iterator[FakeChunk]:
+        if not self._stream:
+            yield FakeChunk(self._text)
+            return
+        words = self._text.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self._model.token_delay)
+            self._model.chunks_generated += 1
+            yield FakeChunk(word if i == len(words) - 1 else word + " ")
+
+
+class FakeChatSession:
+    def __init__(self, model: "FakeGenerativeModel", history: Optional[List[Dict]] = None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content: str, stream: bool = False) -> FakeResponse:
+        reply = self.model.reply(content, len(self.history))
+        self.history.append({"role": "user", "parts": [content]})
+        self.history.append({"role": "model", "parts": [reply]})
+        return FakeResponse(self.model, reply, stream)
+
+
+class FakeGenerativeModel:
+    def __init__(self, system_instruction: Optional[str] = None, token_delay: float = 0.02):
+        self.system_instruction = system_instruction
+        self.token_delay = token_delay
+        self.chunks_generated = 0
+        self.calls = 0
+
+    def reply(self, content: str, history_length: int = 0) -> str:
+        self.calls += 1
+        context_words = len((self.system_instruction or "").split())
+        return (f"This is a local test reply to: {content.strip()} "
+                f"(context {context_words} words, history {history_length} messages).")
+
+    def start_chat(self, history: Optional[List[Dict]] = None) -> FakeChatSession:
+        return FakeChatSession(self, history)
+
+    def generate_content(self, prompt: str, stream: bool = False) -> FakeResponse:
+        return FakeResponse(self, self.reply(prompt[-200:]), stream)
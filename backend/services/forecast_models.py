@@ -0,0 +1,287 @@
+"""
+Forecast Models for HomeNetAI
+Seasonal-baseline + exponential-smoothing forecasters with JSON-serializable parameters
+
+Kept free of database and web imports so training can run in worker processes.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+MODEL_TYPE = "seasonal_es"
+MODEL_FORMAT = 1
+
+# Smoothing grids searched when a model is fit from scratch
+ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+PHIS = np.array([0.8, 0.9, 0.95, 0.98])
+
+# Observations in a (day-of-week, hour) slot before it fully overrides the hourly profile
+SLOT_SHRINKAGE = 4.0
+
+# Physical bounds applied to predictions
+METRIC_BOUNDS = {
+    "humidity": (0.0, 100.0),
+    "precipitation": (0.0, None),
+    "wind_speed": (0.0, None),
+    "uv_index": (0.0, None),
+}
+
+
+def hour_slots(epoch_hours: np.ndarray):
+    """Hour-of-day (0-23) and day-of-week x hour (0-167, Monday 00:00 = 0) slots"""
+    epoch_hours = np.asarray(epoch_hours, dtype=np.int64)
+    hour = epoch_hours % 24
+    # 1970-01-01 was a Thursday
+    dow = (epoch_hours // 24 + 3) % 7
+    return hour, dow * 24 + hour
+
+
+class SeasonalForecaster:
+    """
+    Hour-of-day / day-of-week seasonal baseline plus a damped exponential
+    smoothing level on the residuals
+
+    The baseline is stored as running sums and counts, so new observations are
+    folded in without revisiting history. Predictions are
+
+        baseline(slot) + level * phi ** step
+    """
+
+    def __init__(self, metric: str):
+        self.metric = metric
+        self.alpha = 0.3
+        self.phi = 0.9
+        self.level = 0.0
+        self.hour_sums = np.zeros(24)
+        self.hour_counts = np.zeros(24)
+        self.slot_sums = np.zeros(168)
+        self.slot_counts = np.zeros(168)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.resid_sq = 0.0
+        self.n_obs = 0
+        self.last_hour: Optional[int] = None
+        self.last_value: Optional[float] = None
+
+    # ---- fitting -------------------------------------------------------
+
+    def fit(self, epoch_hours: np.ndarray, values: np.ndarray) -> "SeasonalForecaster":
+        """
+        Fit from scratch, choosing alpha/phi by one-step-ahead squared error
+
+        Args:
+            epoch_hours: Integer hours since the Unix epoch, ascending
+            values: Observed metric values (NaNs are ignored)
+
+        Returns:
+            self
+        """
+        epoch_hours, values = self._clean(epoch_hours, values)
+        self.__init__(self.metric)
+        if len(values) == 0:
+            return self
+
+        hour, slot = hour_slots(epoch_hours)
+        self.hour_sums = np.bincount(hour, weights=values, minlength=24).astype(float)
+        self.hour_counts = np.bincount(hour, minlength=24).astype(float)
+        self.slot_sums = np.bincount(slot, weights=values, minlength=168).astype(float)
+        self.slot_counts = np.bincount(slot, minlength=168).astype(float)
+        self.total = float(values.sum())
+        self.total_sq = float(np.square(values).sum())
+        self.n_obs = len(values)
+
+        residuals = values - self._baseline(hour, slot)
+        gaps = np.diff(epoch_hours, prepend=epoch_hours[0])
+
+        # Run every (alpha, phi) pair side by side over the residual series
+        alpha = np.repeat(ALPHAS, len(PHIS))
+        phi = np.tile(PHIS, len(ALPHAS))
+        level = np.zeros_like(alpha)
+        sse = np.zeros_like(alpha)
+        for r, gap in zip(residuals, gaps):
+            predicted = level * phi ** max(int(gap), 1)
+            error = r - predicted
+            sse += error * error
+            level = predicted + alpha * error
+
+        best = int(np.argmin(sse))
+        self.alpha = float(alpha[best])
+        self.phi = float(phi[best])
+        self.level = float(level[best])
+        self.resid_sq = float(sse[best])
+        self.last_hour = int(epoch_hours[-1])
+        self.last_value = float(values[-1])
+        return self
+
+    def update(self, epoch_hours: np.ndarray, values: np.ndarray) -> int:
+        """
+        Fold newer observations into the baseline and smoothing level
+
+        Observations at or before the last seen hour are skipped.
+
+        Returns:
+            Number of observations applied
+        """
+        epoch_hours, values = self._clean(epoch_hours, values)
+        if self.last_hour is not None:
+            newer = epoch_hours > self.last_hour
+            epoch_hours, values = epoch_hours[newer], values[newer]
+        if len(values) == 0:
+            return 0
+
+        hour, slot = hour_slots(epoch_hours)
+        self.hour_sums += np.bincount(hour, weights=values, minlength=24)
+        self.hour_counts += np.bincount(hour, minlength=24)
+        self.slot_sums += np.bincount(slot, weights=values, minlength=168)
+        self.slot_counts += np.bincount(slot, minlength=168)
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values).sum())
+        self.n_obs += len(values)
+
+        residuals = values - self._baseline(hour, slot)
+        previous = self.last_hour if self.last_hour is not None else int(epoch_hours[0]) - 1
+        for h, r in zip(epoch_hours, residuals):
+            predicted = self.level * self.phi ** max(int(h) - previous, 1)
+            error = r - predicted
+            self.resid_sq += error * error
+            self.level = predicted + self.alpha * error
+            previous = int(h)
+
+        self.last_hour = int(epoch_hours[-1])
+        self.last_value = float(values[-1])
+        return len(values)
+
+    # ---- prediction ----------------------------------------------------
+
+    def predict(self, start_hour: int, hours: int) -> np.ndarray:
+        """
+        Predict `hours` hourly values starting at epoch hour start_hour
+
+        Returns:
+            Array of predictions (NaN everywhere if the model has no data)
+        """
+        if self.n_obs == 0 or self.last_hour is None:
+            return np.full(hours, np.nan)
+
+        target = start_hour + np.arange(hours)
+        hour, slot = hour_slots(target)
+        steps = np.maximum(target - self.last_hour, 1)
+        predictions = self._baseline(hour, slot) + self.level * self.phi ** steps
+
+        lower, upper = METRIC_BOUNDS.get(self.metric, (None, None))
+        if lower is not None or upper is not None:
+            predictions = np.clip(predictions, lower, upper)
+        return predictions
+
+    @property
+    def confidence(self) -> float:
+        """Share of variance explained in-sample (0-1), like the linear model's R^2"""
+        if self.n_obs < 2:
+            return 0.0
+        variance = self.total_sq / self.n_obs - (self.total / self.n_obs) ** 2
+        if variance <= 1e-12:
+            return 1.0
+        return float(max(0.0, 1.0 - (self.resid_sq / self.n_obs) / variance))
+
+    # ---- serialization -------------------------------------------------
+
+    def to_params(self) -> Dict:
+        """Serialize to a JSON-compatible dict"""
+        return {
+            "type": MODEL_TYPE,
+            "format": MODEL_FORMAT,
+            "metric": self.metric,
+            "alpha": self.alpha,
+            "phi": self.phi,
+            "level": self.level,
+            "hour_sums": self.hour_sums.tolist(),
+            "hour_counts": self.hour_counts.tolist(),
+            "slot_sums": self.slot_sums.tolist(),
+            "slot_counts": self.slot_counts.tolist(),
+            "total": self.total,
+            "total_sq": self.total_sq,
+            "resid_sq": self.resid_sq,
+            "n_obs": self.n_obs,
+            "last_hour": self.last_hour,
+            "last_value": self.last_value,
+        }
+
+    @classmethod
+    def from_params(cls, params: Dict) -> "SeasonalForecaster":
+        """Rebuild a model serialized with to_params"""
+        if params.get("type") != MODEL_TYPE or params.get("format") != MODEL_FORMAT:
+            raise ValueError(f"Unsupported forecast model: {params.get('type')} v{params.get('format')}")
+        model = cls(params["metric"])
+        for name in ("alpha", "phi", "level", "total", "total_sq", "resid_sq"):
+            setattr(model, name, float(params[name]))
+        for name in ("hour_sums", "hour_counts", "slot_sums", "slot_counts"):
+            setattr(model, name, np.array(params[name], dtype=float))
+        model.n_obs = int(params["n_obs"])
+        model.last_hour = params["last_hour"]
+        model.last_value = params["last_value"]
+        return model
+
+    # ---- helpers -------------------------------------------------------
+
+    def _baseline(self, hour: np.ndarray, slot: np.ndarray) -> np.ndarray:
+        """Hourly profile, shrunk toward the day-of-week slot mean as it fills up"""
+        overall = self.total / self.n_obs if self.n_obs else 0.0
+        hour_counts = self.hour_counts[hour]
+        hour_mean = np.where(hour_counts > 0, self.hour_sums[hour] / np.maximum(hour_counts, 1), overall)
+        slot_counts = self.slot_counts[slot]
+        slot_mean = np.where(slot_counts > 0, self.slot_sums[slot] / np.maximum(slot_counts, 1), hour_mean)
+        weight = slot_counts / (slot_counts + SLOT_SHRINKAGE)
+        return hour_mean + weight * (slot_mean - hour_mean)
+
+    @staticmethod
+    def _clean(epoch_hours: np.ndarray, values: np.ndarray):
+        epoch_hours = np.asarray(epoch_hours, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        keep = ~np.isnan(values)
+        return epoch_hours[keep], values[keep]
+
+
+def fit_linear_trend(hours: np.ndarray, values: np.ndarray, horizon: int = 24) -> Dict:
+    """
+    Fit the linear trend used by AnalyticsService.get_trends and extrapolate it
+
+    Args:
+        hours: Hours from the first observation
+        values: Observed values
+        horizon: Number of hourly steps to predict past the last observation
+
+    Returns:
+        Dictionary with slope (per hour), r_squared and a predictions array
+    """
+    X = np.asarray(hours, dtype=float).reshape(-1, 1)
+    y = np.asarray(values, dtype=float)
+
+    model = LinearRegression()
+    model.fit(X, y)
+
+    future_X = (X[-1, 0] + np.arange(1, horizon + 1)).reshape(-1, 1)
+    return {
+        "slope": float(model.coef_[0]),
+        "r_squared": float(model.score(X, y)),
+        "predictions": model.predict(future_X)
+    }
+
+
+def fit_models(series: Dict[str, tuple]) -> Dict[str, Dict]:
+    """
+    Fit one forecaster per metric and return their serialized parameters
+
+    Module-level so it can be submitted to a ProcessPoolExecutor.
+
+    Args:
+        series: Mapping of metric -> (epoch_hours, values) arrays
+
+    Returns:
+        Mapping of metric -> parameters dict
+    """
+    return {
+        metric: SeasonalForecaster(metric).fit(epoch_hours, values).to_params()
+        for metric, (epoch_hours, values) in series.items()
+    }
@@ -0,0 +1,323 @@
+"""
+Forecasting Service for HomeNetAI
+Trains per-location seasonal forecast models, versions them in PostgreSQL and
+serves forecasts from an in-memory model cache
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from psycopg2.extras import Json
+
+from config import config
+from database.database import HomeNetDatabase
+from services.forecast_models import MODEL_TYPE, SeasonalForecaster, fit_models
+
+db = HomeNetDatabase()
+
+
+def _epoch_hour(moment: datetime) -> int:
+    """Hours since the epoch for a naive timestamp, matching the SQL EXTRACT(EPOCH ...)"""
+    return int((moment - datetime(1970, 1, 1)).total_seconds() // 3600)
+
+
+def _from_epoch_hour(hour: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(hours=int(hour))
+
+
+class ForecastingService:
+    """Registry of trained forecast models, one set of metric models per location"""
+
+    METRICS = ["temperature", "humidity", "precipitation", "wind_speed"]
+
+    def __init__(self):
+        self.training_days = config.FORECAST_TRAINING_DAYS
+        self.full_retrain_after = timedelta(hours=config.FORECAST_FULL_RETRAIN_HOURS)
+        self.workers = config.FORECAST_TRAINING_WORKERS
+        self.versions_kept = config.FORECAST_MODEL_VERSIONS
+        self.cache_seconds = config.FORECAST_CACHE_SECONDS
+
+        # location_id -> {"models", "version", "trained_at", "fitted_at", "loaded_at"}
+        self._cache: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    # ---- serving -------------------------------------------------------
+
+    def forecast(self, location_id: int, hours: int = 24) -> Optional[Dict]:
+        """
+        Forecast the next `hours` hours from the location's cached models
+
+        Args:
+            location_id: ID of the location
+            hours: Number of hours to forecast
+
+        Returns:
+            Forecast dictionary, or None if no model has been trained yet
+        """
+        entry = self._get_entry(location_id)
+        if not entry:
+            return None
+
+        start_hour = _epoch_hour(datetime.now()) + 1
+        # Forecasts only change when the hour rolls over or a new version is loaded
+        memo_key = (start_hour, hours)
+        if memo_key in entry["forecasts"]:
+            return entry["forecasts"][memo_key]
+
+        forecasts = {}
+        for metric, model in entry["models"].items():
+            predictions = model.predict(start_hour, hours)
+            if np.all(np.isnan(predictions)):
+                continue
+            current = model.last_value
+            predicted = float(predictions[-1])
+            change_per_hour = (predicted - current) / hours if current is not None else 0.0
+
+            if abs(change_per_hour) < 0.01:
+                direction = "stable"
+            elif change_per_hour > 0:
+                direction = "increasing"
+            else:
+                direction = "decreasing"
+
+            forecasts[metric] = {
+                "current": current,
+                "predicted": round(predicted, 2),
+                "trend": direction,
+                "confidence": round(model.confidence, 3),
+                "hourly": np.round(predictions, 2).tolist()
+            }
+
+        result = {
+            "location_id": location_id,
+            "forecast_hours": hours,
+            "generated_at": datetime.now().isoformat(),
+            "model": MODEL_TYPE,
+            "model_version": entry["version"],
+            "trained_at": entry["trained_at"].isoformat() if entry["trained_at"] else None,
+            "start": _from_epoch_hour(start_hour).isoformat(),
+            "forecasts": forecasts
+        }
+        with self._lock:
+            if len(entry["forecasts"]) >= 32:
+                entry["forecasts"].clear()
+            entry["forecasts"][memo_key] = result
+        return result
+
+    def _get_entry(self, location_id: int) -> Optional[Dict]:
+        """Return cached models, reloading the latest version once the cache entry ages out"""
+        with self._lock:
+            entry = self._cache.get(location_id)
+        if entry and time.monotonic() - entry["loaded_at"] < self.cache_seconds:
+            return entry
+
+        loaded = self._load_latest([location_id]).get(location_id)
+        if loaded is None:
+            return entry
+        with self._lock:
+            self._cache[location_id] = loaded
+        return loaded
+
+    def _load_latest(self, location_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+        """Load the newest model version for the given (or all) locations"""
+        conn = None
+        cursor = None
+        try:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT ON (location_id) location_id, version, params, trained_at, fitted_at
+                FROM forecast_models
+                WHERE %s::int[] IS NULL OR location_id = ANY(%s::int[])
+                ORDER BY location_id, version DESC
+            """, (location_ids, location_ids))
+
+            entries = {}
+            for location_id, version, params, trained_at, fitted_at in cursor.fetchall():
+                try:
+                    models = {m: SeasonalForecaster.from_params(p) for m, p in params.items()}
+                except (KeyError, ValueError) as e:
+                    print(f"Skipping forecast model v{version} for location {location_id}: {e}")
+                    continue
+                entries[location_id] = self._entry(models, version, trained_at, fitted_at)
+            return entries
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def _entry(models: Dict[str, SeasonalForecaster], version: int,
+               trained_at: Optional[datetime], fitted_at: Optional[datetime]) -> Dict:
+        return {"models": models, "version": version, "trained_at": trained_at,
+                "fitted_at": fitted_at, "loaded_at": time.monotonic(), "forecasts": {}}
+
+    # ---- training ------------------------------------------------------
+
+    def train_all(self, full: bool = False, location_ids: Optional[List[int]] = None) -> Dict[str, int]:
+        """
+        Bring every location's models up to date
+
+        Locations without a model, or whose last full fit is older than
+        FORECAST_FULL_RETRAIN_HOURS, are refit from scratch in the process pool.
+        The rest fold in only the hours observed since their last update.
+
+        Args:
+            full: Refit every location from scratch
+            location_ids: Restrict training to these locations (default all)
+
+        Returns:
+            Counts of fully trained, incrementally updated and unchanged locations
+        """
+        summary = {"trained": 0, "updated": 0, "unchanged": 0}
+        conn = None
+        cursor = None
+        try:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id FROM user_locations
+                WHERE %s::int[] IS NULL OR id = ANY(%s::int[])
+                ORDER BY id
+            """, (location_ids, location_ids))
+            location_ids = [row[0] for row in cursor.fetchall()]
+            if not location_ids:
+                return summary
+
+            current = self._load_latest(location_ids)
+
+            now = datetime.now()
+            needs_fit = [
+                loc for loc in location_ids
+                if full or loc not in current or current[loc]["fitted_at"] is None
+                or now - current[loc]["fitted_at"] > self.full_retrain_after
+            ]
+            fitted = self._fit_locations(cursor, needs_fit, now)
+
+            for location_id, models in fitted.items():
+                self._save(cursor, location_id, models, fitted_at=now, full_fit=True)
+                summary["trained"] += 1
+
+            for location_id in location_ids:
+                if location_id in fitted or location_id not in current:
+                    continue
+                models = current[location_id]["models"]
+                since = min((m.last_hour for m in models.values() if m.last_hour is not None), default=None)
+                start = _from_epoch_hour(since + 1) if since is not None else now - timedelta(days=self.training_days)
+                series = self._fetch_series(cursor, location_id, start, now)
+                applied = sum(models[m].update(*series[m]) for m in models if m in series)
+                if applied:
+                    self._save(cursor, location_id, models, current[location_id]["fitted_at"], full_fit=False)
+                    summary["updated"] += 1
+                else:
+                    summary["unchanged"] += 1
+
+            conn.commit()
+            return summary
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def _fit_locations(self, cursor, location_ids: List[int], now: datetime) -> Dict[int, Dict[str, SeasonalForecaster]]:
+        """Fit locations from scratch, spreading the work over the process pool"""
+        if not location_ids:
+            return {}
+
+        start = now - timedelta(days=self.training_days)
+        series_by_location = {
+            loc: self._fetch_series(cursor, loc, start, now) for loc in location_ids
+        }
+        series_by_location = {loc: s for loc, s in series_by_location.items() if s}
+
+        try:
+            executor = self._get_executor()
+            futures = {loc: executor.submit(fit_models, s) for loc, s in series_by_location.items()}
+            params = {loc: future.result() for loc, future in futures.items()}
+        except Exception as e:
+            # A broken or unavailable pool should not stop models from being trained
+            print(f"Forecast training pool unavailable, fitting inline: {e}")
+            self.shutdown()
+            params = {loc: fit_models(s) for loc, s in series_by_location.items()}
+
+        return {
+            loc: {metric: SeasonalForecaster.from_params(p) for metric, p in metric_params.items()}
+            for loc, metric_params in params.items()
+        }
+
+    def _fetch_series(self, cursor, location_id: int, start: datetime, end: datetime) -> Dict[str, tuple]:
+        """Hourly (epoch_hours, values) arrays per metric, latest collected row per hour"""
+        cursor.execute("""
+            SELECT (EXTRACT(EPOCH FROM timestamp) / 3600)::bigint,
+                   temperature::float8, humidity::float8, precipitation::float8, wind_speed::float8
+            FROM (
+                SELECT DISTINCT ON (timestamp) timestamp, temperature, humidity, precipitation, wind_speed
+                FROM weather_data
+                WHERE location_id = %s AND timestamp >= %s AND timestamp <= %s
+                ORDER BY timestamp, created_at DESC
+            ) latest
+            ORDER BY 1
+        """, (location_id, start, end))
+        rows = cursor.fetchall()
+        if not rows:
+            return {}
+
+        data = np.array(rows, dtype=float)
+        epoch_hours = data[:, 0].astype(np.int64)
+        return {metric: (epoch_hours, data[:, i + 1]) for i, metric in enumerate(self.METRICS)}
+
+    def _save(self, cursor, location_id: int, models: Dict[str, SeasonalForecaster],
+              fitted_at: Optional[datetime], full_fit: bool):
+        """Store a new model version, prune old ones and refresh the cache"""
+        last_hours = [m.last_hour for m in models.values() if m.last_hour is not None]
+        last_timestamp = _from_epoch_hour(max(last_hours)) if last_hours else None
+        n_obs = max((m.n_obs for m in models.values()), default=0)
+
+        cursor.execute("""
+            INSERT INTO forecast_models
+                (location_id, version, model_type, params, n_obs, last_timestamp, full_fit, fitted_at)
+            SELECT %s, COALESCE(MAX(version), 0) + 1, %s, %s, %s, %s, %s, %s
+            FROM forecast_models WHERE location_id = %s
+            RETURNING version, trained_at
+        """, (location_id, MODEL_TYPE, Json({m: model.to_params() for m, model in models.items()}),
+              n_obs, last_timestamp, full_fit, fitted_at, location_id))
+        version, trained_at = cursor.fetchone()
+
+        cursor.execute("""
+            DELETE FROM forecast_models
+            WHERE location_id = %s AND version <= %s
+        """, (location_id, version - self.versions_kept))
+
+        with self._lock:
+            self._cache[location_id] = self._entry(models, version, trained_at, fitted_at)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: the scheduler runs in a thread, and forking a threaded process is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def shutdown(self):
+        """Stop the training process pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global forecasting service instance
+forecasting_service = ForecastingService()
@@ -0,0 +1,226 @@
+"""
+Insights Service for HomeNetAI
+Rule-based weather and energy insights for all of a user's locations, evaluated in one batch
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+
+from config import config
+from database.database import HomeNetDatabase
+from services.alert_rules import SEVERITY_ORDER, AlertRule, RuleEngine, WeatherBatch
+
+# Insight card type shown by the frontend for each rule severity
+INSIGHT_TYPES = {"critical": "warning", "warning": "warning", "info": "info", "recommendation": "tip"}
+
+# Readings are stored in °F, mph and inches. forecast[...] holds daily rows,
+# so window (0, 1) is today and (1, 2) is tomorrow.
+INSIGHT_RULES = (
+    AlertRule(
+        id="high_temperature", type="temperature", severity="warning",
+        metric="temperature", op=">", threshold=95,
+        title="High Temperature Alert",
+        message="Temperature is {value:.0f}°F. Consider staying hydrated and using cooling systems."
+    ),
+    AlertRule(
+        id="freezing", type="temperature", severity="warning",
+        metric="temperature", op="<", threshold=32,
+        title="Freezing Temperature Alert",
+        message="Temperature is {value:.0f}°F. Protect pipes and ensure heating is adequate."
+    ),
+    AlertRule(
+        id="cold", type="temperature", severity="info",
+        metric="temperature", op="<", threshold=50, suppressed_by=("freezing",),
+        title="Cold Weather",
+        message="Temperature is {value:.0f}°F. Dress warmly if going outside."
+    ),
+    AlertRule(
+        id="rain", type="precipitation", severity="info",
+        metric="weather_code", op=">=", threshold=61,
+        title="Rain Expected",
+        message="Don't forget your umbrella! Rain is in the forecast."
+    ),
+    AlertRule(
+        id="high_wind", type="wind", severity="warning",
+        metric="wind_speed", op=">", threshold=30,
+        title="High Wind Alert",
+        message="Wind speed is {value:.0f} mph. Secure outdoor items and be cautious."
+    ),
+    AlertRule(
+        id="freezing_nights", type="temperature", severity="warning",
+        metric="temp_min", aggregation="min", window=(1, 4), op="<", threshold=32,
+        suppressed_by=("freezing",),
+        title="Freezing Nights Ahead",
+        message="Lows down to {value:.0f}°F in the next few days. Protect pipes and outdoor plants."
+    ),
+    AlertRule(
+        id="warm_tomorrow", type="energy", severity="recommendation",
+        metric="temp_max", aggregation="max", window=(1, 2), op=">", threshold=80,
+        title="Energy Saving Tip",
+        message="Tomorrow will be warm ({value:.0f}°F). Consider pre-cooling your home during off-peak hours."
+    ),
+    AlertRule(
+        id="cold_tomorrow", type="energy", severity="recommendation",
+        metric="temp_max", aggregation="max", window=(1, 2), op="<", threshold=40,
+        title="Heating Tip",
+        message="Tomorrow will be cold ({value:.0f}°F). Consider programming your thermostat to save energy."
+    ),
+)
+
+
+class InsightsService:
+    """
+    Evaluates INSIGHT_RULES over every location of a user at once
+
+    Current readings and daily forecasts for all locations are loaded with two
+    set-based queries into (locations x days) arrays and run through the same
+    vectorized RuleEngine as the alerts. Results are cached per user against
+    their context snapshot, which is invalidated when new weather is ingested
+    or their locations change, so repeat requests cost a dict lookup.
+    """
+
+    FORECAST_DAYS = 7
+    CURRENT_METRICS = ["temperature", "wind_speed", "weather_code"]
+    FORECAST_METRICS = ["temp_max", "temp_min", "precipitation_sum", "precipitation_probability_max", "wind_speed_max"]
+
+    def __init__(self, max_users: int = config.CONTEXT_CACHE_SIZE):
+        self.db = HomeNetDatabase()
+        self.engine = RuleEngine(INSIGHT_RULES)
+        self.max_users = max_users
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_insights(self, user_id: int, snapshot) -> List[Dict[str, str]]:
+        """
+        Insights for all of a user's locations, most severe first
+
+        Args:
+            user_id: User ID
+            snapshot: The user's ContextSnapshot; cached insights are reused
+                while it is the current snapshot
+
+        Returns:
+            List of insight objects with type, title, and message
+        """
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached and cached[0] is snapshot:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        try:
+            insights = self.evaluate(snapshot.context.get("locations") or [])
+        except Exception as e:
+            print(f"Error generating insights: {e}")
+            return [{
+                "type": "error",
+                "title": "Insights Unavailable",
+                "message": "Unable to generate insights at this time."
+            }]
+
+        with self._lock:
+            self._cache[user_id] = (snapshot, insights)
+            self._cache.move_to_end(user_id)
+            if len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+        return insights
+
+    def evaluate(self, locations: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Run the rules over the given locations and rank the insights by severity"""
+        names = {location["id"]: location.get("name", "Unknown") for location in locations}
+        results = self.engine.evaluate(self._load_batch(list(names)))
+
+        ranked = []
+        for position, (location_id, alerts) in enumerate(results.items()):
+            for alert in alerts:
+                message = alert["message"]
+                if len(names) > 1:
+                    message = f"{names[location_id]}: {message}"
+                ranked.append((SEVERITY_ORDER.get(alert["severity"], 999), position, {
+                    "type": INSIGHT_TYPES.get(alert["severity"], "info"),
+                    "title": alert["title"],
+                    "message": message
+                }))
+        ranked.sort(key=lambda item: item[:2])
+        insights = [insight for _, _, insight in ranked]
+
+        # Add a general insight if no specific insights
+        if not insights:
+            insights.append({
+                "type": "info",
+                "title": "All Systems Normal",
+                "message": "Your home and weather conditions are looking good!"
+            })
+        return insights
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _load_batch(self, location_ids: List[int]) -> WeatherBatch:
+        """Build arrays of the latest reading and the daily forecast for every location"""
+        index = {location_id: i for i, location_id in enumerate(location_ids)}
+        n = len(location_ids)
+        current = {m: np.full(n, np.nan) for m in self.CURRENT_METRICS}
+        forecast = {m: np.full((n, self.FORECAST_DAYS), np.nan) for m in self.FORECAST_METRICS}
+        if not location_ids:
+            return WeatherBatch(location_ids, current, forecast)
+
+        conn = None
+        cursor = None
+        try:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                SELECT DISTINCT ON (location_id) location_id,
+                       {", ".join(f"{m}::float8" for m in self.CURRENT_METRICS)}
+                FROM weather_data
+                WHERE location_id = ANY(%s) AND timestamp <= LOCALTIMESTAMP
+                ORDER BY location_id, timestamp DESC, created_at DESC
+            """, (location_ids,))
+            rows = cursor.fetchall()
+            if rows:
+                rows_idx = np.array([index[row[0]] for row in rows])
+                values = np.array([row[1:] for row in rows], dtype=float)
+                for j, metric in enumerate(self.CURRENT_METRICS):
+                    current[metric][rows_idx] = values[:, j]
+
+            cursor.execute(f"""
+                SELECT location_id, (date - CURRENT_DATE) AS day,
+                       {", ".join(f"{m}::float8" for m in self.FORECAST_METRICS)}
+                FROM daily_weather
+                WHERE location_id = ANY(%s)
+                    AND date >= CURRENT_DATE
+                    AND date < CURRENT_DATE + %s
+            """, (location_ids, self.FORECAST_DAYS))
+            rows = cursor.fetchall()
+            if rows:
+                rows_idx = np.array([index[row[0]] for row in rows])
+                days = np.array([row[1] for row in rows])
+                values = np.array([row[2:] for row in rows], dtype=float)
+                for j, metric in enumerate(self.FORECAST_METRICS):
+                    forecast[metric][rows_idx, days] = values[:, j]
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+        return WeatherBatch(location_ids, current, forecast)
+
+
+# Global insights service
+insights_service = InsightsService()
@@ -0,0 +1,326 @@
+"""
+Prompt Builder for HomeNetAI
+Renders a user's context into a compact, token-budgeted system prompt
+"""
+
+import re
+from collections import Counter, OrderedDict, deque
+from datetime import date
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from config import config
+
+BASE_PROMPT = """You are HomeNetAI Assistant, an intelligent AI helper for a smart home and weather monitoring system.
+
+Your role is to:
+- Provide insights about weather patterns and forecasts
+- Help users understand their home's energy usage and device status
+- Suggest optimizations for energy efficiency
+- Alert users to important weather conditions
+- Answer questions about their locations and devices
+- Be friendly, helpful, and concise
+
+Always provide accurate information based on the user's data when available.
+Units: temperature °F, wind mph, precipitation inches."""
+
+WEATHER_CODES = {
+    0: "Clear sky",
+    1: "Mainly clear",
+    2: "Partly cloudy",
+    3: "Overcast",
+    45: "Foggy",
+    48: "Depositing rime fog",
+    51: "Light drizzle",
+    53: "Moderate drizzle",
+    55: "Dense drizzle",
+    61: "Slight rain",
+    63: "Moderate rain",
+    65: "Heavy rain",
+    71: "Slight snow",
+    73: "Moderate snow",
+    75: "Heavy snow",
+    77: "Snow grains",
+    80: "Slight rain showers",
+    81: "Moderate rain showers",
+    82: "Violent rain showers",
+    85: "Slight snow showers",
+    86: "Heavy snow showers",
+    95: "Thunderstorm",
+    96: "Thunderstorm with slight hail",
+    99: "Thunderstorm with heavy hail"
+}
+
+WEATHER_KEYWORDS = {
+    "weather", "temperature", "temp", "cold", "hot", "warm", "cool", "freezing", "rain", "snow",
+    "wind", "windy", "humid", "humidity", "sunny", "cloud", "cloudy", "storm", "umbrella", "jacket",
+    "outside", "degree", "precipitation",
+}
+FORECAST_KEYWORDS = WEATHER_KEYWORDS | {
+    "forecast", "tomorrow", "week", "weekend", "tonight", "later", "next", "high", "low",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+}
+DEVICE_KEYWORDS = {"device", "home", "house", "energy", "power", "on", "off", "running", "room", "many"}
+
+# Names listed per room and type before collapsing to "+N"
+MAX_NAMES_PER_GROUP = 8
+
+# A question word found in only one block outweighs any block's default rank;
+# words shared by n blocks count 1/n
+KEYWORD_WEIGHT = 10.0
+
+# Rendered prompts kept per context for different block selections
+MAX_SELECTIONS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Gemini-style tokenizers (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def weather_code_to_text(code: Optional[int]) -> str:
+    """Convert WMO weather code to human-readable text"""
+    if code is None:
+        return "Unknown"
+    return WEATHER_CODES.get(code, f"Weather code {code}")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words with a plural "s" dropped: "Kitchen lights" -> ["kitchen", "light"]"""
+    words = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if len(word) > 1:
+            words.append(word)
+    return words
+
+
+def keywords(text: str) -> FrozenSet[str]:
+    """Distinct tokenize() words"""
+    return frozenset(tokenize(text))
+
+
+def _num(value: Optional[float], digits: int = 0) -> str:
+    return "?" if value is None else f"{value:.{digits}f}"
+
+
+class PromptBlock:
+    """One section of rendered context with its size and what it is about"""
+
+    def __init__(self, text: str, rank: float, words: Iterable[str]):
+        self.text = text
+        self.rank = rank
+        self.tokens = estimate_tokens(text) + 1
+        self.keywords = keywords(" ".join(words))
+
+
+class RenderedContext:
+    """
+    A user's context rendered into blocks, once per context snapshot
+
+    Prompts built from it are memoized by the selected blocks, so asking
+    again costs a dict lookup.
+    """
+
+    def __init__(self, blocks: List[PromptBlock], budget: int):
+        self.blocks = blocks
+        self.budget = budget
+        self.base_tokens = estimate_tokens(BASE_PROMPT)
+        self.total_tokens = self.base_tokens + sum(block.tokens for block in blocks)
+        self.fits = self.total_tokens <= budget
+        self.block_frequency = Counter(word for block in blocks for word in block.keywords)
+        self._prompts: "OrderedDict[Tuple[int, ...], str]" = OrderedDict()
+
+    def score(self, index: int, asked: FrozenSet[str]) -> float:
+        """Block's default rank plus the question words it matches, rarer words counting more"""
+        block = self.blocks[index]
+        return block.rank + KEYWORD_WEIGHT * sum(1.0 / self.block_frequency[w] for w in asked & block.keywords)
+
+    def prompt(self, selected: Tuple[int, ...]) -> str:
+        prompt = self._prompts.get(selected)
+        if prompt is None:
+            prompt = BASE_PROMPT
+            if selected:
+                prompt += "\n\n" + "\n".join(self.blocks[index].text for index in selected)
+            self._prompts[selected] = prompt
+            if len(self._prompts) > MAX_SELECTIONS:
+                self._prompts.popitem(last=False)
+        return prompt
+
+
+class PromptBuilder:
+    """
+    Compact, token-budgeted system prompts
+
+    Context is rendered as short lines and tables: current weather on one
+    line, the forecast as a table, and devices grouped by room with per-type
+    on/total counts instead of a sentence per device. When everything fits in
+    AI_PROMPT_TOKEN_BUDGET the prompt is identical for every question (so
+    the chat model built for it is reused); otherwise blocks are ranked by
+    overlap with the question and added until the budget is spent.
+    """
+
+    def __init__(self, budget: int = config.AI_PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self._request_tokens = deque(maxlen=1000)
+        self.renders = 0
+        self.builds = 0
+        self.truncated = 0
+        self.dropped_blocks = 0
+
+    def render(self, context: Optional[Dict[str, Any]]) -> RenderedContext:
+        """Render a context dict into blocks (call once per context snapshot)"""
+        self.renders += 1
+        context = context or {}
+        blocks: List[PromptBlock] = []
+        locations = context.get("locations") or []
+        place = locations[0].get("name", "Unknown") if locations else "your location"
+
+        if context.get("current_weather"):
+            blocks.append(self._current_weather(place, context["current_weather"]))
+        forecast = context.get("forecast") or []
+        if forecast:
+            blocks.append(self._forecast(f"Forecast for {place}", forecast[:3], 3.0))
+        if len(forecast) > 3:
+            blocks.append(self._forecast("Later", forecast[3:], 0.5))
+        if locations:
+            blocks.append(self._locations(locations))
+        devices = context.get("devices") or []
+        if devices:
+            blocks.extend(self._devices(devices))
+
+        return RenderedContext(blocks, self.budget)
+
+    def build(self, rendered: RenderedContext, question: Optional[str] = None) -> str:
+        """
+        System prompt for a question, within the token budget
+
+        Args:
+            rendered: Output of render() for the user's context
+            question: The user's message; picks the blocks kept when the
+                context does not fit
+
+        Returns:
+            System prompt string
+        """
+        self.builds += 1
+        if rendered.fits:
+            return rendered.prompt(tuple(range(len(rendered.blocks))))
+
+        asked = keywords(question or "")
+        order = sorted(range(len(rendered.blocks)), key=lambda i: -rendered.score(i, asked))
+        remaining = rendered.budget - rendered.base_tokens
+        selected = []
+        for index in order:
+            if rendered.blocks[index].tokens <= remaining:
+                selected.append(index)
+                remaining -= rendered.blocks[index].tokens
+
+        self.truncated += 1
+        self.dropped_blocks += len(rendered.blocks) - len(selected)
+        # Keep blocks in their rendered order so the same selection gives the same prompt
+        return rendered.prompt(tuple(sorted(selected)))
+
+    def record(self, tokens: int):
+        """Record the estimated input size (system prompt, history and message) of one model call"""
+        self._request_tokens.append(tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = sorted(self._request_tokens)
+        return {
+            "budget_tokens": self.budget,
+            "renders": self.renders,
+            "builds": self.builds,
+            "truncated": self.truncated,
+            "dropped_blocks": self.dropped_blocks,
+            "request_tokens": {
+                "avg": round(sum(sizes) / len(sizes), 1) if sizes else 0.0,
+                "p95": sizes[min(len(sizes) - 1, int(len(sizes) * 0.95))] if sizes else 0,
+                "max": sizes[-1] if sizes else 0,
+            },
+        }
+
+    def _current_weather(self, place: str, weather: Dict[str, Any]) -> PromptBlock:
+        conditions = weather_code_to_text(weather.get("weather_code"))
+        text = (
+            f"Now at {place}: {_num(weather.get('temperature'))}°F "
+            f"(feels {_num(weather.get('apparent_temperature'))}), {conditions}, "
+            f"humidity {_num(weather.get('humidity'))}%, wind {_num(weather.get('wind_speed'))} mph, "
+            f"precip {_num(weather.get('precipitation'), 2)} in, clouds {_num(weather.get('cloud_cover'))}%"
+        )
+        return PromptBlock(text, 4.0,
+                           WEATHER_KEYWORDS | {"now", "current", "today", "right", place, conditions})
+
+    def _forecast(self, title: str, days: List[Dict[str, Any]], rank: float) -> PromptBlock:
+        lines = [f"{title} (day: high/low, precip, rain chance, max wind):"]
+        for day in days:
+            label = day.get("date") or "?"
+            try:
+                label = date.fromisoformat(label).strftime("%a %m-%d")
+            except ValueError:
+                pass
+            lines.append(
+                f"{label}: {_num(day.get('temp_max'))}/{_num(day.get('temp_min'))}, "
+                f"{_num(day.get('precipitation_sum'), 2)}, "
+                f"{_num(day.get('precipitation_probability_max'))}%, {_num(day.get('wind_speed_max'))}"
+            )
+        return PromptBlock("\n".join(lines), rank, FORECAST_KEYWORDS | {title})
+
+    def _locations(self, locations: List[Dict[str, Any]]) -> PromptBlock:
+        entries = [
+            f"{loc.get('name', 'Unknown')} ({_num(loc.get('latitude'), 2)}, {_num(loc.get('longitude'), 2)})"
+            for loc in locations
+        ]
+        names = [loc.get("name", "") for loc in locations]
+        return PromptBlock("Locations: " + "; ".join(entries), 1.0,
+                           ["location", "where", "city", "place"] + names)
+
+    def _devices(self, devices: List[Dict[str, Any]]) -> List[PromptBlock]:
+        """A summary block of counts per type, then one block per room"""
+        by_type: Dict[str, List[int]] = {}
+        rooms: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for device in devices:
+            device_type = device.get("type") or "other"
+            counts = by_type.setdefault(device_type, [0, 0])
+            counts[0] += device.get("status") == "on"
+            counts[1] += 1
+            room = device.get("room") or "Unassigned"
+            rooms.setdefault(room, {}).setdefault(device_type, []).append(device)
+
+        on_count = sum(on for on, _ in by_type.values())
+        summary = (
+            f"Devices: {len(devices)} total, {on_count} on; by type (on/total): "
+            + ", ".join(f"{t} {on}/{total}" for t, (on, total) in sorted(by_type.items()))
+            + "\nBy room (* = on):"
+        )
+        blocks = [PromptBlock(summary, 2.5, DEVICE_KEYWORDS | set(by_type))]
+
+        for position, room in enumerate(sorted(rooms)):
+            groups = []
+            words = {room}
+            for device_type, members in sorted(rooms[room].items()):
+                on = sum(1 for d in members if d.get("status") == "on")
+                names = [self._device_label(d) for d in members[:MAX_NAMES_PER_GROUP]]
+                if len(members) > MAX_NAMES_PER_GROUP:
+                    names.append(f"+{len(members) - MAX_NAMES_PER_GROUP}")
+                groups.append(f"{device_type} {on}/{len(members)} ({', '.join(names)})")
+                words.add(device_type)
+                words.update(d.get("name") or "" for d in members)
+            # Earlier rooms win ties so truncation is deterministic
+            rank = 2.0 - position / (len(rooms) + 1)
+            blocks.append(PromptBlock(f"- {room}: " + "; ".join(groups), rank,
+                                      DEVICE_KEYWORDS | words))
+        return blocks
+
+    @staticmethod
+    def _device_label(device: Dict[str, Any]) -> str:
+        label = device.get("name") or "Unknown"
+        if device.get("status") == "on":
+            label += "*"
+        if device.get("value") is not None:
+            label += f" {_num(device['value'])}"
+        return label
+
+
+# Global prompt builder
+prompt_builder = PromptBuilder()
@@ -0,0 +1,154 @@
+"""
+Pub/Sub for HomeNetAI
+Carries scheduler events (new weather, new alerts) to the API's push connections
+"""
+
+import json
+import select
+import threading
+from typing import Any, Callable, Dict, List
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from config import config
+
+Subscriber = Callable[[str, Dict[str, Any]], None]
+
+# Single NOTIFY channel; the logical channel travels in the payload so one
+# LISTEN per API process covers every user
+NOTIFY_CHANNEL = "homenet_events"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7900
+
+
+class MemoryBackend:
+    """Delivers messages synchronously to subscribers in the same process"""
+
+    def __init__(self):
+        self._subscribers: List[Subscriber] = []
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(channel, message)
+            except Exception as e:
+                print(f"Pub/sub subscriber error: {e}")
+
+    def subscribe(self, callback: Subscriber):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def close(self):
+        with self._lock:
+            self._subscribers.clear()
+
+
+class PostgresBackend(MemoryBackend):
+    """
+    Delivers messages across processes with Postgres LISTEN/NOTIFY
+
+    Publishing uses a short-lived connection; each subscribing process keeps
+    one listening connection on a daemon thread and hands notifications to its
+    local subscribers.
+    """
+
+    def __init__(self, connection_string: str = None):
+        super().__init__()
+        self.connection_string = connection_string or config.DATABASE_URL
+        self._listener = None
+        self._running = False
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        payload = json.dumps({"channel": channel, "message": message}, default=str)
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            print(f"Pub/sub message on {channel} too large for NOTIFY ({len(payload)} bytes), dropped")
+            return
+        conn = psycopg2.connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, payload))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    def subscribe(self, callback: Subscriber):
+        super().subscribe(callback)
+        with self._lock:
+            if self._listener is None:
+                self._running = True
+                self._listener = threading.Thread(target=self._listen, name="pubsub-listener", daemon=True)
+                self._listener.start()
+
+    def close(self):
+        self._running = False
+        super().close()
+
+    def _listen(self):
+        while self._running:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.connection_string)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                while self._running:
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            data = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        MemoryBackend.publish(self, data["channel"], data["message"])
+            except Exception as e:
+                print(f"Pub/sub listener error: {e}")
+                threading.Event().wait(5.0)
+            finally:
+                if conn:
+                    conn.close()
+
+
+class PubSub:
+    """Publish JSON-serializable messages to named channels (e.g. user:42)"""
+
+    BACKENDS = {"memory": MemoryBackend, "postgres": PostgresBackend}
+
+    def __init__(self, backend=None):
+        if backend is None:
+            if config.PUBSUB_BACKEND not in self.BACKENDS:
+                raise ValueError(f"Unknown PUBSUB_BACKEND: {config.PUBSUB_BACKEND}")
+            backend = self.BACKENDS[config.PUBSUB_BACKEND]()
+        self.backend = backend
+        self.published = 0
+        self.failed = 0
+
+    def publish(self, channel: str, message: Dict[str, Any]) -> bool:
+        """Publish a message; errors are logged rather than raised to the publisher"""
+        try:
+            self.backend.publish(channel, message)
+            self.published += 1
+            return True
+        except Exception as e:
+            self.failed += 1
+            print(f"Pub/sub publish error on {channel}: {e}")
+            return False
+
+    def subscribe(self, callback: Subscriber):
+        """Receive every message as callback(channel, message), possibly on another thread"""
+        self.backend.subscribe(callback)
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+# Global pub/sub instance
+pubsub = PubSub()
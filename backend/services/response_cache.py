@@ -0,0 +1,157 @@
+"""
+AI Response Cache for HomeNetAI
+Reuses answers to the same question asked against the same (quantized) context
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import config
+
+# Words that do not change what is being asked
+FILLER_WORDS = {
+    "a", "an", "the", "please", "hey", "hi", "hello", "just", "um", "uh", "ok", "okay", "thanks", "thank",
+}
+
+# Rounding applied to weather values before hashing, so readings that differ
+# by less than a step share cache entries
+QUANTIZE_STEPS = {
+    "temperature": 2.0,
+    "apparent_temperature": 2.0,
+    "humidity": 5.0,
+    "precipitation": 0.1,
+    "wind_speed": 2.0,
+    "wind_direction": 45.0,
+    "cloud_cover": 10.0,
+    "temp_max": 2.0,
+    "temp_min": 2.0,
+    "precipitation_sum": 0.1,
+    "precipitation_probability_max": 10.0,
+    "wind_speed_max": 2.0,
+    "latitude": 0.1,
+    "longitude": 0.1,
+}
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, strip punctuation and filler words: "Hey, will it rain today??" -> "will it rain today" """
+    words = re.sub(r"[^\w\s]", " ", text.lower()).split()
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+def _quantize(value: Any, key: str = "") -> Any:
+    if isinstance(value, dict):
+        # Timestamps and database ids don't change the answer
+        return {k: _quantize(v, k) for k, v in value.items() if k not in ("timestamp", "id")}
+    if isinstance(value, list):
+        return [_quantize(v, key) for v in value]
+    if isinstance(value, float) and key in QUANTIZE_STEPS:
+        step = QUANTIZE_STEPS[key]
+        return round(round(value / step) * step, 2)
+    return value
+
+
+def context_fingerprint(context: Optional[Dict[str, Any]]) -> str:
+    """Stable hash of the quantized context"""
+    encoded = json.dumps(_quantize(context or {}), sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+class ResponseCache:
+    """
+    LRU of AI answers keyed by normalized question + context fingerprint
+
+    Entries live for AI_CACHE_SECONDS (default: one weather collection
+    interval), and new weather readings change the fingerprint anyway.
+    Concurrent misses for the same key share one upstream call.
+    """
+
+    def __init__(self, max_entries: int = config.AI_CACHE_SIZE, ttl_seconds: int = config.AI_CACHE_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(question: str, context: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Cache key, or None when the question normalizes to nothing"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        return f"{context_fingerprint(context)}:{normalized}"
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def lookup(self, key: str) -> Optional[str]:
+        """get() that counts towards the hit rate (for callers not using get_or_compute)"""
+        cached = self.get(key)
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def put(self, key: str, response: str):
+        self._entries[key] = (response, time.time() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the cached answer, or compute it once for all concurrent callers
+
+        The computation runs as its own task, so it still completes (and is
+        cached) if the caller that started it disconnects. Exceptions reach
+        every waiting caller and are not cached.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Global response cache
+response_cache = ResponseCache()
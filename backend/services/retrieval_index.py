@@ -0,0 +1,394 @@
+"""
+Retrieval Index for HomeNetAI
+Per-user BM25 index over daily weather history, forecasts, alerts and devices,
+so the AI assistant gets only the snippets relevant to a question
+"""
+
+import heapq
+import math
+import queue
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from config import config
+from database.database import HomeNetDatabase
+from services.prompt_builder import tokenize
+from services.pubsub import pubsub
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def day_term(day: date) -> str:
+    """Index term for a calendar day, so relative dates in questions can match"""
+    return f"d{day:%Y%m%d}"
+
+
+def _day_label(day: date) -> str:
+    return f"{day:%a %Y-%m-%d}"
+
+
+def _day_terms(day: date) -> List[str]:
+    return [day_term(day), f"{day:%A}".lower(), f"{day:%B}".lower()]
+
+
+def _num(value: Any, digits: int = 0) -> str:
+    return "?" if value is None else f"{float(value):.{digits}f}"
+
+
+def expand_query(question: str, today: date) -> FrozenSet[str]:
+    """
+    Question words plus day terms for relative dates
+
+    "yesterday", "today", "tomorrow", "N days ago", "last week" and
+    "this/next week" become the matching day_term()s.
+    """
+    terms = set(tokenize(question))
+    text = question.lower()
+    offsets = set()
+    if "yesterday" in terms:
+        offsets.add(-1)
+    if "today" in terms or "now" in terms:
+        offsets.add(0)
+    if "tomorrow" in terms:
+        offsets.add(1)
+    for days in re.findall(r"(\d+) days? ago", text):
+        offsets.add(-int(days))
+    if re.search(r"\b(last|past|previous) (week|7 days)\b", text):
+        offsets.update(range(-7, 0))
+    elif re.search(r"\b(this|next|coming) week\b", text):
+        offsets.update(range(0, 7))
+    terms.update(day_term(today + timedelta(days=offset)) for offset in offsets)
+    return frozenset(terms)
+
+
+class UserIndex:
+    """
+    Inverted index over one user's snippets
+
+    Documents are keyed ("day:<location>:<date>", "alert:<location>:<id>",
+    ...) and replaced in place, so refreshing only touches what changed.
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.documents: Dict[str, tuple] = {}  # key -> (text, term counts, length)
+        self.postings: Dict[str, set] = {}
+        self.total_length = 0
+        self.locations: Dict[int, str] = {}
+        self.history_since: Dict[int, date] = {}
+        self.alerts_since = datetime.min
+        self.devices_since = datetime.min
+        self.lock = threading.Lock()
+
+    def put(self, key: str, text: str, extra_terms: Iterable[str] = ()):
+        self.remove(key)
+        counts = Counter(tokenize(text))
+        counts.update(extra_terms)
+        length = sum(counts.values())
+        self.documents[key] = (text, counts, length)
+        self.total_length += length
+        for term in counts:
+            self.postings.setdefault(term, set()).add(key)
+
+    def remove(self, key: str):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        _, counts, length = document
+        self.total_length -= length
+        for term in counts:
+            keys = self.postings.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[term]
+
+    def remove_prefix(self, prefix: str):
+        for key in [key for key in self.documents if key.startswith(prefix)]:
+            self.remove(key)
+
+    def search(self, terms: Iterable[str], k: int) -> List[str]:
+        """Texts of the k documents scoring highest under BM25 (only documents matching a term)"""
+        count = len(self.documents)
+        if not count:
+            return []
+        average_length = self.total_length / count
+        scores: Dict[str, float] = {}
+        for term in terms:
+            keys = self.postings.get(term)
+            if not keys:
+                continue
+            idf = math.log(1 + (count - len(keys) + 0.5) / (len(keys) + 0.5))
+            for key in keys:
+                _, counts, length = self.documents[key]
+                tf = counts[term]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+        return [self.documents[key][0] for key, _ in best]
+
+
+class RetrievalIndex:
+    """
+    Per-user retrieval indexes, kept in an LRU and refreshed in the background
+
+    A user's index is built on their first question (covering the last
+    RETRIEVAL_HISTORY_DAYS days for every location). After that a worker
+    thread refreshes it incrementally whenever the scheduler ingests weather
+    or alerts for the user or their devices/locations change: only days since
+    the last refresh, alerts and devices updated since the last refresh, and
+    the (small) forecast are re-read.
+    """
+
+    def __init__(self, max_users: int = config.RETRIEVAL_INDEX_USERS,
+                 history_days: int = config.RETRIEVAL_HISTORY_DAYS,
+                 top_k: int = config.RETRIEVAL_TOP_K):
+        self.db = HomeNetDatabase()
+        self.max_users = max_users
+        self.history_days = history_days
+        self.top_k = top_k
+        self._indexes: "OrderedDict[int, UserIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: "queue.Queue[int]" = queue.Queue()
+        self._queued = set()
+        self._worker = None
+        self._subscribed = False
+        self._search_times = deque(maxlen=1000)
+        self.builds = 0
+        self.refreshes = 0
+        self.searches = 0
+
+    def search(self, user_id: int, question: str, k: Optional[int] = None) -> List[str]:
+        """
+        Snippets relevant to a question, best first
+
+        Args:
+            user_id: User ID
+            question: The user's message
+            k: Number of snippets (default RETRIEVAL_TOP_K)
+
+        Returns:
+            Up to k snippet strings (building the index first if needed)
+        """
+        index = self._get_index(user_id)
+        started = time.monotonic()
+        terms = expand_query(question, date.today())
+        with index.lock:
+            results = index.search(terms, k or self.top_k)
+        self._search_times.append((time.monotonic() - started) * 1000)
+        self.searches += 1
+        return results
+
+    def schedule_refresh(self, user_id: int):
+        """Queue a background refresh of a user's index (no-op if it isn't loaded)"""
+        with self._lock:
+            if user_id not in self._indexes or user_id in self._queued:
+                return
+            self._queued.add(user_id)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="retrieval-index", daemon=True)
+                self._worker.start()
+        self._pending.put(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        times = sorted(self._search_times)
+        return {
+            "users": len(indexes),
+            "documents": sum(len(index.documents) for index in indexes),
+            "builds": self.builds,
+            "refreshes": self.refreshes,
+            "searches": self.searches,
+            "pending": self._pending.qsize(),
+            "search_ms_p95": round(times[min(len(times) - 1, int(len(times) * 0.95))], 2) if times else 0.0,
+        }
+
+    def _get_index(self, user_id: int) -> UserIndex:
+        self._ensure_subscribed()
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+
+        index = UserIndex(user_id)
+        self._refresh(index)
+        self.builds += 1
+        with self._lock:
+            index = self._indexes.setdefault(user_id, index)
+            self._indexes.move_to_end(user_id)
+            if len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _ensure_subscribed(self):
+        if not self._subscribed:
+            self._subscribed = True
+            pubsub.subscribe(self._on_message)
+
+    def _on_message(self, channel: str, message: Dict[str, Any]):
+        kind, _, user_id = channel.partition(":")
+        if kind == "context" or (kind == "user" and message.get("type") in ("weather", "alert")):
+            self.schedule_refresh(int(user_id))
+
+    def _work(self):
+        while True:
+            user_id = self._pending.get()
+            with self._lock:
+                self._queued.discard(user_id)
+                index = self._indexes.get(user_id)
+            if index is None:
+                continue
+            try:
+                self._refresh(index)
+                self.refreshes += 1
+            except Exception as e:
+                print(f"Error refreshing retrieval index for user {user_id}: {e}")
+
+    def _refresh(self, index: UserIndex):
+        """Read everything that changed since the index's last refresh, on one connection"""
+        conn = None
+        cursor = None
+        today = date.today()
+        try:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT id, name FROM user_locations WHERE user_id = %s", (index.user_id,))
+            locations = {row[0]: row[1] for row in cursor.fetchall()}
+            with index.lock:
+                for location_id in set(index.locations) - set(locations):
+                    for kind in ("day", "forecast", "alert"):
+                        index.remove_prefix(f"{kind}:{location_id}:")
+                    index.history_since.pop(location_id, None)
+                index.locations = locations
+
+            if locations:
+                self._refresh_weather(cursor, index, today)
+
+            alert_rows = []
+            active_alert_ids = set()
+            if locations:
+                cursor.execute("""
+                    SELECT id FROM alerts
+                    WHERE user_id = %s AND NOT dismissed AND expires_at > LOCALTIMESTAMP AND fired_at >= %s
+                """, (index.user_id, today - timedelta(days=self.history_days)))
+                active_alert_ids = {row[0] for row in cursor.fetchall()}
+                cursor.execute("""
+                    SELECT id, location_id, severity, title, message, fired_at,
+                           dismissed OR expires_at <= LOCALTIMESTAMP, updated_at
+                    FROM alerts
+                    WHERE user_id = %s AND updated_at > %s AND fired_at >= %s
+                    ORDER BY updated_at
+                """, (index.user_id, index.alerts_since, today - timedelta(days=self.history_days)))
+                alert_rows = cursor.fetchall()
+
+            cursor.execute("SELECT id FROM devices WHERE user_id = %s", (index.user_id,))
+            device_ids = {row[0] for row in cursor.fetchall()}
+            cursor.execute("""
+                SELECT id, name, type, status, room, value, updated_at
+                FROM devices
+                WHERE user_id = %s AND updated_at > %s
+                ORDER BY updated_at
+            """, (index.user_id, index.devices_since))
+            device_rows = cursor.fetchall()
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+        with index.lock:
+            # Expired alerts are purged without a new updated_at, so drop any alert no longer active
+            for key in [key for key in index.documents if key.startswith("alert:")]:
+                if int(key.split(":")[2]) not in active_alert_ids:
+                    index.remove(key)
+            for alert_id, location_id, severity, title, message, fired_at, inactive, updated_at in alert_rows:
+                key = f"alert:{location_id}:{alert_id}"
+                index.alerts_since = max(index.alerts_since, updated_at)
+                if inactive:
+                    index.remove(key)
+                    continue
+                place = locations.get(location_id, "Unknown")
+                index.put(key, f"Alert at {place} ({severity}, {fired_at:%a %Y-%m-%d %H:%M}): {title} - {message}",
+                          ["alert", "warning"] + _day_terms(fired_at.date()))
+
+            for key in [key for key in index.documents if key.startswith("device:")]:
+                if int(key.split(":")[1]) not in device_ids:
+                    index.remove(key)
+            for device_id, name, device_type, status, room, value, updated_at in device_rows:
+                index.devices_since = max(index.devices_since, updated_at)
+                text = f"Device {name} ({device_type}) in {room or 'no room'}: {status}"
+                if value is not None:
+                    text += f", value {_num(value)}"
+                text += f", last changed {updated_at:%a %Y-%m-%d %H:%M}"
+                index.put(f"device:{device_id}", text, ["device"] + _day_terms(updated_at.date()))
+
+    def _refresh_weather(self, cursor, index: UserIndex, today: date):
+        """Daily observed summaries since each location's last refresh, and the current forecast"""
+        location_ids = list(index.locations)
+        default_since = today - timedelta(days=self.history_days)
+        since = min(index.history_since.get(location_id, default_since) for location_id in location_ids)
+
+        # Only the most recently collected row per hour counts (forecast hours
+        # are re-inserted every cycle); days whose raw rows were dropped come
+        # from weather_rollups
+        cursor.execute("""
+            SELECT location_id, timestamp::date, AVG(temperature), MIN(temperature), MAX(temperature),
+                   AVG(humidity), SUM(precipitation), AVG(wind_speed), MAX(wind_speed)
+            FROM (
+                SELECT DISTINCT ON (location_id, timestamp) *
+                FROM weather_data
+                WHERE location_id = ANY(%s) AND timestamp >= %s AND timestamp <= LOCALTIMESTAMP
+                ORDER BY location_id, timestamp, created_at DESC
+            ) latest
+            GROUP BY location_id, timestamp::date
+            UNION ALL
+            SELECT location_id, date, temp_avg, temp_min, temp_max,
+                   humidity_avg, precipitation_sum, wind_speed_avg, wind_speed_max
+            FROM weather_rollups
+            WHERE location_id = ANY(%s) AND date >= %s
+        """, (location_ids, since, location_ids, since))
+        history = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT location_id, date, temp_max, temp_min, precipitation_sum,
+                   precipitation_probability_max, wind_speed_max
+            FROM daily_weather
+            WHERE location_id = ANY(%s) AND date >= CURRENT_DATE
+        """, (location_ids,))
+        forecast = cursor.fetchall()
+
+        with index.lock:
+            for location_id, day, temp_avg, temp_min, temp_max, humidity, precipitation, wind_avg, wind_max in history:
+                place = index.locations[location_id]
+                index.put(
+                    f"day:{location_id}:{day}",
+                    f"{place} {_day_label(day)} observed: avg {_num(temp_avg)}°F "
+                    f"(low {_num(temp_min)}, high {_num(temp_max)}), humidity {_num(humidity)}%, "
+                    f"precip {_num(precipitation, 2)} in, wind avg {_num(wind_avg)} max {_num(wind_max)} mph",
+                    ["weather", "history"] + _day_terms(day)
+                )
+            index.remove_prefix("forecast:")
+            for location_id, day, temp_max, temp_min, precipitation, chance, wind_max in forecast:
+                place = index.locations[location_id]
+                index.put(
+                    f"forecast:{location_id}:{day}",
+                    f"{place} forecast {_day_label(day)}: high {_num(temp_max)}°F, low {_num(temp_min)}°F, "
+                    f"precip {_num(precipitation, 2)} in ({_num(chance)}% chance), wind up to {_num(wind_max)} mph",
+                    ["weather"] + _day_terms(day)
+                )
+            # Today is still being observed, so it is re-read next time
+            for location_id in location_ids:
+                index.history_since[location_id] = today
+
+
+# Global retrieval index
+retrieval_index = RetrievalIndex()
@@ -19,7 +19,7 @@ class SettingsService:
             WHERE user_id = %s
         """
         
-        result = self.db.execute_query(query, (user_id,))
+        result = self.db.execute_query(query, (user_id,), name="get_user_preferences")
         
         if result:
             prefs = result[0]
@@ -55,7 +55,7 @@ class SettingsService:
         
         result = self.db.execute_query(query, (
             user_id, 'imperial', 'light', True, True, True, True, True, False
-        ))
+        ), name="create_default_preferences")
         
         if result:
             prefs = result[0]
@@ -121,7 +121,7 @@ class SettingsService:
                       email_notifications, updated_at
         """
         
-        result = self.db.execute_query(query, tuple(values))
+        result = self.db.execute_query(query, tuple(values), name="update_user_preferences")
         
         if result:
             prefs = result[0]
@@ -145,17 +145,23 @@ class SettingsService:
         try:
             # Delete user (cascade will delete locations, weather data, preferences)
             query = "DELETE FROM users WHERE id = %s"
-            self.db.execute_query(query, (user_id,))
+            self.db.execute_query(query, (user_id,), name="delete_user")
             return True
         except Exception as e:
             print(f"Error deleting user data: {e}")
             return False
     
+    def get_password_hash(self, user_id: int) -> Optional[str]:
+        """Get the stored password hash of a user (None if the user is gone)"""
+        result = self.db.execute_query("SELECT password_hash FROM users WHERE id = %s", (user_id,),
+                                       name="get_password_hash")
+        return result[0]['password_hash'] if result else None
+    
     def update_password(self, user_id: int, new_password_hash: str) -> bool:
         """Update user password"""
         try:
             query = "UPDATE users SET password_hash = %s WHERE id = %s"
-            self.db.execute_query(query, (new_password_hash, user_id))
+            self.db.execute_query(query, (new_password_hash, user_id), name="update_password")
             return True
         except Exception as e:
             print(f"Error updating password: {e}")
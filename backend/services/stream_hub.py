@@ -0,0 +1,122 @@
+"""
+Stream Hub for HomeNetAI
+Fans pub/sub events out to each user's open WebSocket/SSE connections as deltas
+"""
+
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+from config import config
+from services.pubsub import pubsub
+
+
+class StreamConnection:
+    """
+    One client connection: a bounded queue of pending events
+
+    If the client falls behind and the queue fills up, the backlog is replaced
+    by a single "resync" event telling it to refetch over REST, so a slow or
+    stalled client never holds more than STREAM_QUEUE_SIZE events.
+    """
+
+    def __init__(self, user_id: int, maxsize: int = config.STREAM_QUEUE_SIZE):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=maxsize)
+        self.overflows = 0
+
+    def offer(self, event: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+    async def next_event(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait for the next event, or None after timeout (time for a heartbeat)"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class StreamHub:
+    """
+    Routes pub/sub messages on user:<id> channels to that user's connections
+
+    Weather messages carry the full current reading; the hub remembers the
+    last reading per location and forwards only the fields that changed, so
+    clients receive nothing when a collection brings no new data.
+    """
+
+    def __init__(self, max_connections: int = config.STREAM_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.connections: Dict[int, Set[StreamConnection]] = {}
+        self.connection_count = 0
+        self.events_sent = 0
+        self._last_weather: Dict[int, Dict[str, Any]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def connect(self, user_id: int) -> Optional[StreamConnection]:
+        """
+        Register a connection for a user (call from the event loop)
+
+        Returns:
+            The new connection, or None when the per-worker limit is reached
+        """
+        if self.connection_count >= self.max_connections:
+            return None
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            pubsub.subscribe(self._on_message)
+
+        connection = StreamConnection(user_id)
+        self.connections.setdefault(user_id, set()).add(connection)
+        self.connection_count += 1
+        return connection
+
+    def disconnect(self, connection: StreamConnection):
+        connections = self.connections.get(connection.user_id)
+        if connections and connection in connections:
+            connections.discard(connection)
+            self.connection_count -= 1
+            if not connections:
+                del self.connections[connection.user_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": self.connection_count,
+            "users": len(self.connections),
+            "events_sent": self.events_sent,
+            "overflows": sum(c.overflows for conns in self.connections.values() for c in conns),
+        }
+
+    def _on_message(self, channel: str, message: Dict[str, Any]):
+        # Called on the publisher's or pub/sub listener's thread
+        if channel.startswith("user:") and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch, int(channel[5:]), message)
+
+    def _dispatch(self, user_id: int, message: Dict[str, Any]):
+        if message.get("type") == "weather":
+            message = self._weather_delta(message)
+            if message is None:
+                return
+
+        for connection in self.connections.get(user_id, ()):
+            connection.offer(message)
+            self.events_sent += 1
+
+    def _weather_delta(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        location_id = message["location_id"]
+        current = message.get("current") or {}
+        previous = self._last_weather.get(location_id, {})
+        changed = {key: value for key, value in current.items() if previous.get(key) != value}
+        self._last_weather[location_id] = current
+        if not changed:
+            return None
+        return {"type": "weather", "location_id": location_id, "changes": changed}
+
+
+# Global stream hub
+stream_hub = StreamHub()
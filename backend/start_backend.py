@@ -43,7 +43,8 @@ def start_backend_server():
         host="127.0.0.1",  # Use 127.0.0.1 for Windows compatibility
         port=config.PORT,
         reload=True,  # Auto-reload on code changes
-        log_level="info"
+        log_level="info",
+        access_log=False  # RequestLogMiddleware logs every request
     )
 
 if __name__ == "__main__":
@@ -7,14 +7,19 @@ import asyncio
 import aiohttp
 import sys
 import os
+import time
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 # Add backend to path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from database.database import HomeNetDatabase
+from services.forecasting_service import forecasting_service
+from services.alerts_service import alerts_service
+from services.pubsub import pubsub, user_channel
 from weather.weather_api import get_weather_data
+from observability.metrics import record_scheduler_cycle
 from config import config
 
 class WeatherScheduler:
@@ -22,6 +27,7 @@ class WeatherScheduler:
         self.db = HomeNetDatabase(db_connection_string)
         self.collection_interval = config.COLLECTION_INTERVAL_MINUTES
         self.running = False
+        self.last_maintenance = None
         
     async def collect_weather_for_location(self, session: aiohttp.ClientSession, location: Dict[str, Any]) -> bool:
         """Collect weather data for a single location"""
@@ -38,6 +44,13 @@ class WeatherScheduler:
                 location['user_id']
             )
             
+            # Push the reading to the owner's open streams (the API sends only changed fields)
+            pubsub.publish(user_channel(location['user_id']), {
+                'type': 'weather',
+                'location_id': location['id'],
+                'current': weather_data.get('current_weather', {})
+            })
+            
             print(f"Collected weather for {location['name']} at {datetime.now().strftime('%H:%M:%S')}")
             return True
             
@@ -45,8 +58,8 @@ class WeatherScheduler:
             print(f"Error collecting weather for {location['name']}: {e}")
             return False
     
-    async def collect_all_weather_data(self):
-        """Collect weather data for all user locations"""
+    async def collect_all_weather_data(self) -> Optional[Dict[str, int]]:
+        """Collect weather data for all user locations; returns collected/failed counts, None on error"""
         print(f"\nStarting weather data collection at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
         try:
@@ -76,7 +89,7 @@ class WeatherScheduler:
             
             if not locations:
                 print("No user locations found. Skipping collection.")
-                return
+                return {'collected': 0, 'failed': 0}
             
             print(f"Found {len(locations)} locations to collect weather for")
             
@@ -93,9 +106,75 @@ class WeatherScheduler:
                 
                 successful = sum(1 for result in results if result is True)
                 print(f"Successfully collected weather for {successful}/{len(locations)} locations")
+                return {'collected': successful, 'failed': len(locations) - successful}
                 
         except Exception as e:
             print(f"Error in weather collection: {e}")
+            return None
+    
+    def run_partition_maintenance(self) -> bool:
+        """Run weather_data partition maintenance at most once per day"""
+        today = datetime.now().date()
+        if self.last_maintenance == today:
+            return True
+        
+        try:
+            summary = self.db.maintain_weather_partitions()
+            self.last_maintenance = today
+            if summary:
+                print(f"Partition maintenance: created {len(summary['created'])}, "
+                      f"compacted {len(summary['compacted'])}, dropped {len(summary['dropped'])}")
+            return True
+        except Exception as e:
+            print(f"Error in partition maintenance: {e}")
+            return False
+    
+    def run_alert_materialization(self) -> bool:
+        """Evaluate alert rules for every location and queue new alerts for delivery"""
+        try:
+            result = alerts_service.materialize_and_deliver()
+            print(f"Alerts: evaluated {result['evaluated']} locations, "
+                  f"{result['active']} active, {len(result['new'])} new, {result['queued']} queued for delivery")
+            return True
+        except Exception as e:
+            print(f"Error materializing alerts: {e}")
+            return False
+    
+    def run_forecast_training(self) -> bool:
+        """Train new forecast models and fold freshly collected hours into existing ones"""
+        try:
+            summary = forecasting_service.train_all()
+            print(f"Forecast models: trained {summary['trained']}, updated {summary['updated']}, "
+                  f"unchanged {summary['unchanged']}")
+            return True
+        except Exception as e:
+            print(f"Error training forecast models: {e}")
+            return False
+    
+    async def run_cycle(self):
+        """Run every stage once, recording per-stage and total durations"""
+        stages = {}
+        cycle_start = time.perf_counter()
+        
+        start = time.perf_counter()
+        counts = await self.collect_all_weather_data()
+        stages['collect'] = time.perf_counter() - start
+        ok = counts is not None
+        
+        for stage, run in (('alerts', self.run_alert_materialization),
+                           ('partitions', self.run_partition_maintenance),
+                           ('forecasts', self.run_forecast_training)):
+            start = time.perf_counter()
+            ok = run() and ok
+            stages[stage] = time.perf_counter() - start
+        
+        record_scheduler_cycle({
+            'seconds': time.perf_counter() - cycle_start,
+            'stages': stages,
+            'ok': ok,
+            'collected': counts['collected'] if counts else 0,
+            'failed': counts['failed'] if counts else 0
+        })
     
     async def run_scheduler(self):
         """Run the weather data scheduler"""
@@ -107,7 +186,7 @@ class WeatherScheduler:
         
         try:
             while self.running:
-                await self.collect_all_weather_data()
+                await self.run_cycle()
                 
                 # Wait for next collection
                 print(f"Next collection in {self.collection_interval} minutes...")
@@ -119,6 +198,7 @@ class WeatherScheduler:
             print(f"Scheduler error: {e}")
         finally:
             self.running = False
+            forecasting_service.shutdown()
     
     def stop(self):
         """Stop the scheduler"""
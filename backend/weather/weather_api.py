@@ -6,6 +6,8 @@ Provides functions to fetch weather data from Open-Meteo API
 import requests
 from typing import Dict, Any, Optional
 
+from observability.metrics import upstream_call
+
 def get_weather_data(latitude: float, longitude: float) -> Dict[str, Any]:
     """Get weather data for coordinates"""
     # Validate coordinates
@@ -28,12 +30,13 @@ def get_weather_data(latitude: float, longitude: float) -> Dict[str, Any]:
     }
     
     try:
-        response = requests.get(
-            "https://api.open-meteo.com/v1/forecast", 
-            params=params,
-            timeout=30  # 30 second timeout
-        )
-        response.raise_for_status()
+        with upstream_call("open_meteo"):
+            response = requests.get(
+                "https://api.open-meteo.com/v1/forecast", 
+                params=params,
+                timeout=30  # 30 second timeout
+            )
+            response.raise_for_status()
         return response.json()
     except requests.exceptions.Timeout:
         raise requests.RequestException("Weather API request timed out")
@@ -54,12 +57,13 @@ def search_location(query: str) -> Dict[str, Any]:
     }
     
     try:
-        response = requests.get(
-            "https://geocoding-api.open-meteo.com/v1/search", 
-            params=params,
-            timeout=30  # 30 second timeout
-        )
-        response.raise_for_status()
+        with upstream_call("open_meteo_geocoding"):
+            response = requests.get(
+                "https://geocoding-api.open-meteo.com/v1/search", 
+                params=params,
+                timeout=30  # 30 second timeout
+            )
+            response.raise_for_status()
         return response.json()
     except requests.exceptions.Timeout:
         raise requests.RequestException("Geocoding API request timed out")
@@ -25,11 +25,38 @@ class Config:
     
     # API
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+    # Verified JWTs remembered (until they expire) so repeat requests skip decoding
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    
+    # Password hashing - scrypt cost (N must be a power of two; raising it rehashes
+    # passwords on their next login), worker processes, and hashes in progress at once
+    PASSWORD_SCRYPT_N: int = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+    PASSWORD_SCRYPT_R: int = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+    PASSWORD_SCRYPT_P: int = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_QUEUE: int = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+    
+    # Login throttling - attempts allowed per username and per client IP within the
+    # sliding window, kept in "memory" (per process) or "postgres" (shared by workers)
+    LOGIN_RATE_LIMIT_BACKEND: str = os.getenv("LOGIN_RATE_LIMIT_BACKEND", "memory")
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS: int = int(os.getenv("LOGIN_RATE_LIMIT_WINDOW_SECONDS", "300"))
+    LOGIN_RATE_LIMIT_PER_USERNAME: int = int(os.getenv("LOGIN_RATE_LIMIT_PER_USERNAME", "10"))
+    LOGIN_RATE_LIMIT_PER_IP: int = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "50"))
+    LOGIN_RATE_LIMIT_KEYS: int = int(os.getenv("LOGIN_RATE_LIMIT_KEYS", "100000"))
     
     # Server
     HOST: str = os.getenv("HOST", "127.0.0.1")  # Use 127.0.0.1 for Windows compatibility
     PORT: int = int(os.getenv("PORT", "8000"))
     
+    # Request logging - JSON records written by a background thread; successful
+    # requests on the LOG_SAMPLE_RATES route prefixes ("prefix:rate,...") are sampled,
+    # errors and requests slower than LOG_SLOW_REQUEST_MS are always logged
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "/health:0.01,/metrics:0.1,/stream/stats:0.1,/proxy/pico:0.1")
+    LOG_SLOW_REQUEST_MS: float = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+    
     # CORS - Allowed origins for API access
     # Allow all localhost ports for development
     CORS_ORIGINS: list = ["*"]  # Allow all origins in development
@@ -37,6 +64,45 @@ class Config:
     # Weather Collection
     COLLECTION_INTERVAL_MINUTES: int = int(os.getenv("COLLECTION_INTERVAL_MINUTES", "30"))
     
+    # Materialized alerts stay active this long after the rule last fired
+    # (default: two collection cycles), and are purged this long after expiring
+    ALERT_TTL_MINUTES: int = int(os.getenv("ALERT_TTL_MINUTES", str(2 * COLLECTION_INTERVAL_MINUTES)))
+    ALERT_RETENTION_DAYS: int = int(os.getenv("ALERT_RETENTION_DAYS", "7"))
+    ALERT_QUEUE_SIZE: int = int(os.getenv("ALERT_QUEUE_SIZE", "10000"))
+    
+    # Weather data retention - raw monthly partitions older than this are rolled
+    # up into weather_rollups and dropped (keep >= 365 for year-long analytics)
+    WEATHER_RETENTION_DAYS: int = int(os.getenv("WEATHER_RETENTION_DAYS", "400"))
+    WEATHER_PARTITIONS_AHEAD: int = int(os.getenv("WEATHER_PARTITIONS_AHEAD", "2"))
+    
+    # Forecast models - trained per location in a process pool after each
+    # collection, refit from scratch once they are older than the full-retrain age
+    FORECAST_TRAINING_DAYS: int = int(os.getenv("FORECAST_TRAINING_DAYS", "90"))
+    FORECAST_FULL_RETRAIN_HOURS: int = int(os.getenv("FORECAST_FULL_RETRAIN_HOURS", "168"))
+    FORECAST_TRAINING_WORKERS: int = int(os.getenv("FORECAST_TRAINING_WORKERS", "2"))
+    FORECAST_MODEL_VERSIONS: int = int(os.getenv("FORECAST_MODEL_VERSIONS", "5"))
+    FORECAST_CACHE_SECONDS: int = int(os.getenv("FORECAST_CACHE_SECONDS", "300"))
+    
+    # Real-time push - "postgres" (LISTEN/NOTIFY, works when the scheduler runs in
+    # another process) or "memory" (scheduler and API in the same process)
+    PUBSUB_BACKEND: str = os.getenv("PUBSUB_BACKEND", "postgres")
+    STREAM_QUEUE_SIZE: int = int(os.getenv("STREAM_QUEUE_SIZE", "32"))
+    STREAM_MAX_CONNECTIONS: int = int(os.getenv("STREAM_MAX_CONNECTIONS", "10000"))
+    STREAM_HEARTBEAT_SECONDS: int = int(os.getenv("STREAM_HEARTBEAT_SECONDS", "25"))
+    
+    # AI context cache - per-user snapshots are invalidated by device, location and
+    # weather events; the TTL only bounds staleness if an event is missed
+    CONTEXT_CACHE_SIZE: int = int(os.getenv("CONTEXT_CACHE_SIZE", "1000"))
+    CONTEXT_CACHE_SECONDS: int = int(os.getenv("CONTEXT_CACHE_SECONDS", "3600"))
+    
+    # AI chat conversations - hot conversations stay in memory; once more than
+    # CONVERSATION_MAX_MESSAGES turns are unsummarized, all but the last
+    # CONVERSATION_KEEP_MESSAGES are folded into a rolling summary
+    CONVERSATION_CACHE_SIZE: int = int(os.getenv("CONVERSATION_CACHE_SIZE", "500"))
+    CONVERSATION_MAX_MESSAGES: int = int(os.getenv("CONVERSATION_MAX_MESSAGES", "12"))
+    CONVERSATION_KEEP_MESSAGES: int = int(os.getenv("CONVERSATION_KEEP_MESSAGES", "6"))
+    CONVERSATION_SUMMARY_CHARS: int = int(os.getenv("CONVERSATION_SUMMARY_CHARS", "2000"))
+    
     # Unsplash (optional - for location images)
     UNSPLASH_ACCESS_KEY: str = os.getenv("UNSPLASH_ACCESS_KEY", "")
     
@@ -45,6 +111,34 @@ class Config:
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")  # Updated to available model
     GEMINI_TEMPERATURE: float = float(os.getenv("GEMINI_TEMPERATURE", "0.7"))
+    
+    # Local fake model instead of Gemini (development and benchmarks, no API key needed)
+    AI_FAKE_MODEL: bool = os.getenv("AI_FAKE_MODEL", "false").lower() == "true"
+    
+    # Gemini call scheduling - concurrent calls, quota as a token bucket, waiting
+    # requests, and retries with exponential backoff on 429/quota errors
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+    AI_REQUESTS_PER_MINUTE: int = int(os.getenv("AI_REQUESTS_PER_MINUTE", "60"))
+    AI_RATE_BURST: int = int(os.getenv("AI_RATE_BURST", "10"))
+    AI_QUEUE_SIZE: int = int(os.getenv("AI_QUEUE_SIZE", "200"))
+    AI_MAX_RETRIES: int = int(os.getenv("AI_MAX_RETRIES", "3"))
+    AI_RETRY_BASE_SECONDS: float = float(os.getenv("AI_RETRY_BASE_SECONDS", "1.0"))
+    
+    # Streaming chat - chunks buffered per stream before the model read blocks
+    AI_STREAM_BUFFER: int = int(os.getenv("AI_STREAM_BUFFER", "8"))
+    
+    # Cached answers to standalone questions, kept for one collection interval by default
+    AI_CACHE_SIZE: int = int(os.getenv("AI_CACHE_SIZE", "2000"))
+    AI_CACHE_SECONDS: int = int(os.getenv("AI_CACHE_SECONDS", str(COLLECTION_INTERVAL_MINUTES * 60)))
+    
+    # Estimated tokens allowed for the chat system prompt (instructions plus user context)
+    AI_PROMPT_TOKEN_BUDGET: int = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "600"))
+    
+    # Per-user retrieval index over weather history, forecasts, alerts and devices -
+    # users kept in memory, days of history indexed, snippets added to each question
+    RETRIEVAL_INDEX_USERS: int = int(os.getenv("RETRIEVAL_INDEX_USERS", "500"))
+    RETRIEVAL_HISTORY_DAYS: int = int(os.getenv("RETRIEVAL_HISTORY_DAYS", "30"))
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "5"))
 
 # Global config instance
 config = Config()
\ No newline at end of file
@@ -2,11 +2,16 @@ package httpHandler
 
 import (
 	"crypto/sha256"
+	"crypto/subtle"
+	"encoding/base64"
 	"encoding/hex"
 	"iot-server/entities"
 	"net/http"
+	"strconv"
+	"strings"
 
 	"github.com/gin-gonic/gin"
+	"golang.org/x/crypto/scrypt"
 	"gorm.io/gorm"
 )
 
@@ -29,10 +34,25 @@ type LoginResponse struct {
 	Success  bool   `json:"success"`
 }
 
-// hashPassword creates SHA-256 hash of password (matching Python backend)
-func hashPassword(password string) string {
+// verifyPassword checks a password against a hash written by the Python backend:
+// "scrypt$n$r$p$salt$key" (base64 without padding) or a legacy SHA-256 hex digest
+func verifyPassword(password, stored string) bool {
+	parts := strings.Split(stored, "$")
+	if len(parts) == 6 && parts[0] == "scrypt" {
+		n, errN := strconv.Atoi(parts[1])
+		r, errR := strconv.Atoi(parts[2])
+		p, errP := strconv.Atoi(parts[3])
+		salt, errS := base64.RawStdEncoding.DecodeString(parts[4])
+		key, errK := base64.RawStdEncoding.DecodeString(parts[5])
+		if errN != nil || errR != nil || errP != nil || errS != nil || errK != nil {
+			return false
+		}
+		derived, err := scrypt.Key([]byte(password), salt, n, r, p, len(key))
+		return err == nil && subtle.ConstantTimeCompare(derived, key) == 1
+	}
+
 	hash := sha256.Sum256([]byte(password))
-	return hex.EncodeToString(hash[:])
+	return subtle.ConstantTimeCompare([]byte(hex.EncodeToString(hash[:])), []byte(stored)) == 1
 }
 
 // Login authenticates user and returns user_id
@@ -53,8 +73,7 @@ func (h *LoginHandler) Login(c *gin.Context) {
 	}
 
 	// Verify password hash
-	hashedPassword := hashPassword(req.Password)
-	if user.PasswordHash != hashedPassword {
+	if !verifyPassword(req.Password, user.PasswordHash) {
 		c.JSON(http.StatusUnauthorized, gin.H{"error": "Invalid username or password"})
 		return
 	}